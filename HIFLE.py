@@ -1,40 +1,325 @@
 # streamlit_app.py
 import streamlit as st
-import pandas as pd
-import random
-import time
 import os
 from datetime import datetime
-from PIL import Image, ImageDraw
 import io
 import base64
-from streamlit_autorefresh import st_autorefresh
+import lazy_imports
+import shape_cache
+import clock
+import memory_engine
+import shape_geometry
+import sprite_atlas
+import theme
+import result_store
+import result_writer
+import rerun_profiler
+import session_checkpoint
+import session_reaper
+import variant_assignment
+import trial_events
+import trial_plans
+from countdown import countdown_event, memory_countdown
+from symbol_grid import symbol_grid
+
+# pandas und PIL erst bei Bedarf laden (siehe lazy_imports.py)
+pd = lazy_imports.lazy("pandas")
+Image = lazy_imports.lazy("PIL.Image")
+ImageDraw = lazy_imports.lazy("PIL.ImageDraw")
 
 # -----------------------
 # Konfiguration / Symbole
 # -----------------------
-SHAPES = [
-    "Kreis_f", "Quadrat_f", "Raute_f", "Stern_f",
-    "PfeilOben", "PfeilUnten", "PfeilLinks", "PfeilRechts",
-    "Dreieck_f", "Doppelpfeil_H", "Doppelpfeil_V",
-    "Kreis_h", "Quadrat_h", "Dreieck_h", "Stern_h", "Raute_h"
-]
+# Symbole, Farben und Testgrößen gemeinsam für alle Frontends (siehe memory_engine.py)
+SHAPES = memory_engine.SHAPES
+COLORS = memory_engine.COLORS
+TEST_SIZES = memory_engine.TEST_SIZES
+MEMORY_GRACE_SECONDS = 5  # so lange wartet der Server nach Ablauf auf die Meldung des Browser-Countdowns
+FEEDBACK_SECONDS = float(os.environ.get("MEMORYTEST_FEEDBACK_SECONDS", "2"))  # Ergebnisanzeige nach jedem Test
+FEEDBACK_REFRESH_SECONDS = 0.25  # Prüfintervall des Feedback-Fragments
+RENDER_MODE = os.environ.get("MEMORYTEST_RENDER_MODE", "image")  # "image" oder "sprites" (siehe sprite_atlas.py)
+INPUT_GRID = os.environ.get("MEMORYTEST_INPUT_GRID", "columns")  # "columns" oder "composite" (siehe symbol_grid.py)
 
-COLORS = [
-    "red", "blue", "green", "orange",
-    "purple", "brown", "cyan",
-    "magenta", "gold", "darkgreen", "darkblue",
-    "red", "blue", "gold", "magenta", "green"
+# Zustand, der bei jedem Phasenwechsel als Checkpoint gespeichert wird (siehe session_checkpoint.py)
+CHECKPOINT_KEYS = [
+    'page', 'participant_data', 'test_state', 'questionnaire_answers', 'questionnaire_text',
+    'q_responses_a', 'q_responses_b', 'saved_path'
 ]
-
-TEST_SIZES = [3, 4, 5, 6, 7]
-MEMORY_LIMIT_SECONDS = 30  # 30 Sekunden
+RESULTS_BACKEND = os.environ.get("MEMORYTEST_BACKEND", "jsonl")  # "jsonl", "sqlite" (siehe result_store.py) oder "excel"
 
 # UI styling
 ACCENT = "#4B7CDA"
 ACCENT_LIGHT = "#e8f0ff"
 SECONDARY = "#28a745"
 
+# Stylesheet der App (wird von theme.py minifiziert und statisch ausgeliefert)
+APP_CSS = f"""
+<style>
+/* Hauptstile */
+.main {{
+    padding: 2rem;
+}}
+
+/* Buttons */
+.stButton > button {{
+    background-color: {ACCENT};
+    color: white;
+    font-weight: 600;
+    border-radius: 8px;
+    border: none;
+    padding: 12px 24px;
+    transition: all 0.3s ease;
+    font-size: 16px;
+}}
+
+.stButton > button:hover {{
+    background-color: #3a6bc5;
+    transform: translateY(-2px);
+    box-shadow: 0 4px 12px rgba(0,0,0,0.15);
+}}
+
+.primary-button {{
+    background-color: {SECONDARY} !important;
+}}
+
+.primary-button:hover {{
+    background-color: #218838 !important;
+}}
+
+/* Titel */
+.main-title {{
+    font-size: 42px;
+    font-weight: 800;
+    color: {ACCENT};
+    text-align: center;
+    margin-bottom: 30px;
+    padding-bottom: 20px;
+    border-bottom: 3px solid {ACCENT};
+    background: linear-gradient(135deg, {ACCENT}, #28a745);
+    -webkit-background-clip: text;
+    -webkit-text-fill-color: transparent;
+    background-clip: text;
+}}
+
+.section-title {{
+    font-size: 28px;
+    font-weight: 700;
+    color: #333;
+    margin-top: 40px;
+    margin-bottom: 25px;
+    padding-left: 15px;
+    border-left: 5px solid {ACCENT};
+}}
+
+.subsection-title {{
+    font-size: 22px;
+    font-weight: 600;
+    color: #444;
+    margin-top: 30px;
+    margin-bottom: 20px;
+}}
+
+/* Boxen und Container */
+.info-card {{
+    background: linear-gradient(145deg, #f8f9fa, #ffffff);
+    padding: 30px;
+    border-radius: 16px;
+    margin-bottom: 30px;
+    border: 1px solid #e0e0e0;
+    box-shadow: 0 6px 20px rgba(0,0,0,0.08);
+    transition: transform 0.3s ease;
+}}
+
+.info-card:hover {{
+    transform: translateY(-5px);
+    box-shadow: 0 12px 30px rgba(0,0,0,0.12);
+}}
+
+.question-card {{
+    background: white;
+    padding: 25px;
+    border-radius: 12px;
+    margin-bottom: 25px;
+    border: 1px solid #e8e8e8;
+    box-shadow: 0 4px 12px rgba(0,0,0,0.05);
+}}
+
+/* Symbol Container */
+.symbol-grid {{
+    display: flex;
+    justify-content: center;
+    flex-wrap: wrap;
+    gap: 20px;
+    margin: 30px 0;
+}}
+
+.symbol-container {{
+    display: flex;
+    flex-direction: column;
+    align-items: center;
+    padding: 20px;
+    border-radius: 12px;
+    border: 2px solid transparent;
+    background: white;
+    transition: all 0.3s ease;
+    box-shadow: 0 4px 8px rgba(0,0,0,0.05);
+}}
+
+.symbol-container:hover {{
+    border-color: {ACCENT};
+    background-color: {ACCENT_LIGHT};
+    transform: scale(1.05);
+    box-shadow: 0 6px 15px rgba(72, 124, 218, 0.15);
+}}
+
+.symbol-container.selected {{
+    border-color: {SECONDARY};
+    background-color: #e8f5e9;
+    box-shadow: 0 6px 15px rgba(40, 167, 69, 0.2);
+}}
+
+.symbol-number {{
+    font-size: 20px;
+    font-weight: bold;
+    color: {ACCENT};
+    margin-bottom: 10px;
+}}
+
+/* Timer */
+.timer-container {{
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    padding: 25px;
+    border-radius: 16px;
+    margin: 30px 0;
+    text-align: center;
+    color: white;
+    box-shadow: 0 8px 25px rgba(102, 126, 234, 0.4);
+}}
+
+.timer-text {{
+    font-size: 32px;
+    font-weight: 700;
+    margin-bottom: 10px;
+}}
+
+.timer-label {{
+    font-size: 18px;
+    opacity: 0.9;
+}}
+
+/* Radio Buttons */
+.radio-scale-container {{
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    margin: 25px 0;
+    gap: 5px;
+}}
+
+.radio-label-left {{
+    font-size: 16px;
+    color: #666;
+    text-align: right;
+    min-width: 150px;
+    padding-right: 20px;
+    font-weight: 500;
+}}
+
+.radio-label-right {{
+    font-size: 16px;
+    color: #666;
+    text-align: left;
+    min-width: 150px;
+    padding-left: 20px;
+    font-weight: 500;
+}}
+
+.radio-option {{
+    display: flex;
+    flex-direction: column;
+    align-items: center;
+    padding: 10px 5px;
+}}
+
+.radio-number {{
+    font-size: 18px;
+    font-weight: 600;
+    color: #333;
+    margin-bottom: 5px;
+}}
+
+/* Eingabefelder */
+.stTextInput input, .stTextArea textarea {{
+    border-radius: 10px !important;
+    border: 2px solid #ddd !important;
+    padding: 12px !important;
+    font-size: 16px !important;
+}}
+
+.stTextInput input:focus, .stTextArea textarea:focus {{
+    border-color: {ACCENT} !important;
+    box-shadow: 0 0 0 3px rgba(72, 124, 218, 0.2) !important;
+}}
+
+/* Progress Bar */
+.stProgress > div > div > div {{
+    background: linear-gradient(90deg, {ACCENT}, {SECONDARY});
+}}
+
+/* Ergebnisse Tabelle */
+.results-table-container {{
+    background: white;
+    border-radius: 12px;
+    padding: 25px;
+    margin: 30px 0;
+    box-shadow: 0 6px 20px rgba(0,0,0,0.08);
+    border: 1px solid #e8e8e8;
+}}
+
+.metric-card {{
+    background: linear-gradient(135deg, #f8f9fa, #ffffff);
+    padding: 20px;
+    border-radius: 12px;
+    text-align: center;
+    border: 1px solid #e0e0e0;
+}}
+
+/* Responsive Anpassungen */
+@media (max-width: 768px) {{
+    .main-title {{
+        font-size: 32px;
+    }}
+
+    .section-title {{
+        font-size: 24px;
+    }}
+
+    .symbol-container {{
+        padding: 15px;
+    }}
+}}
+
+/* Custom Scrollbar */
+::-webkit-scrollbar {{
+    width: 10px;
+}}
+
+::-webkit-scrollbar-track {{
+    background: #f1f1f1;
+    border-radius: 5px;
+}}
+
+::-webkit-scrollbar-thumb {{
+    background: {ACCENT};
+    border-radius: 5px;
+}}
+
+::-webkit-scrollbar-thumb:hover {{
+    background: #3a6bc5;
+}}
+</style>
+"""
+
 # -----------------------
 # Hilfsfunktionen
 # -----------------------
@@ -71,76 +356,24 @@ def create_shape_image(shape, color, size=80, variant="color", selected=False):
         offset = ((bg_size - size) // 2, (bg_size - size) // 2)
         bg_img.paste(img, offset, img)
         img = bg_img
+        draw = bg_draw
         size = bg_size
         line_width = 4 if is_hollow else 3
     else:
         line_width = 3 if is_hollow else 2
     
-    # Koordinaten skalieren
-    def scale(coords):
-        return [coord * size / 100 for coord in coords]
-    
-    # --- Kreis ---
-    if shape.startswith("Kreis"):
-        bbox = [size*0.1, size*0.1, size*0.9, size*0.9]
-        draw.ellipse(bbox, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Quadrat ---
-    elif shape.startswith("Quadrat"):
-        bbox = [size*0.12, size*0.12, size*0.88, size*0.88]
-        draw.rectangle(bbox, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Raute ---
-    elif shape.startswith("Raute"):
-        coords = scale([50, 8, 88, 50, 50, 92, 12, 50])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Stern ---
-    elif shape.startswith("Stern"):
-        coords = scale([50, 12, 58, 34, 80, 34, 62, 50, 68, 74, 50, 60, 32, 74, 38, 50, 20, 34, 42, 34])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Dreieck ---
-    elif shape.startswith("Dreieck"):
-        coords = scale([50, 10, 90, 80, 10, 80])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Pfeil Oben ---
-    elif shape == "PfeilOben":
-        coords = scale([50, 10, 78, 50, 62, 50, 62, 90, 38, 90, 38, 50, 22, 50])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Pfeil Unten ---
-    elif shape == "PfeilUnten":
-        coords = scale([50, 90, 78, 50, 62, 50, 62, 10, 38, 10, 38, 50, 22, 50])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Pfeil Links ---
-    elif shape == "PfeilLinks":
-        coords = scale([10, 50, 50, 10, 50, 30, 90, 30, 90, 70, 50, 70, 50, 90])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Pfeil Rechts ---
-    elif shape == "PfeilRechts":
-        coords = scale([90, 50, 50, 10, 50, 30, 10, 30, 10, 70, 50, 70, 50, 90])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Doppelpfeil horizontal ---
-    elif shape == "Doppelpfeil_H":
-        draw.line(scale([18, 50, 82, 50]), fill=outline_color, width=line_width)
-        draw.polygon(scale([18, 50, 30, 40, 30, 60]), fill=outline_color, outline=outline_color)
-        draw.polygon(scale([82, 50, 70, 40, 70, 60]), fill=outline_color, outline=outline_color)
-    
-    # --- Doppelpfeil vertikal ---
-    elif shape == "Doppelpfeil_V":
-        draw.line(scale([50, 18, 50, 82]), fill=outline_color, width=line_width)
-        draw.polygon(scale([50, 18, 40, 30, 60, 30]), fill=outline_color, outline=outline_color)
-        draw.polygon(scale([50, 82, 40, 70, 60, 70]), fill=outline_color, outline=outline_color)
-    
-    # Fallback zu Kreis
-    else:
-        bbox = [size*0.1, size*0.1, size*0.9, size*0.9]
-        draw.ellipse(bbox, fill=fill_color, outline=outline_color, width=line_width)
+    # Geometrie aus der gemeinsamen Tabelle, je Größe skaliert und gecacht
+    for kind, coords in shape_geometry.scaled(shape, size):
+        if kind == "ellipse":
+            draw.ellipse(coords, fill=fill_color, outline=outline_color, width=line_width)
+        elif kind == "rect":
+            draw.rectangle(coords, fill=fill_color, outline=outline_color, width=line_width)
+        elif kind == "polygon":
+            draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
+        elif kind == "line":
+            draw.line(coords, fill=outline_color, width=line_width)
+        elif kind == "head":
+            draw.polygon(coords, fill=outline_color, outline=outline_color)
     
     return img
 
@@ -150,6 +383,25 @@ def image_to_base64(img):
     img.save(buffered, format="PNG")
     return base64.b64encode(buffered.getvalue()).decode()
 
+def cached_shape_png(shape, color, size=80, variant="color", selected=False):
+    """Liefert das Symbol als PNG-Bytes aus dem prozessweiten Bild-Cache"""
+    cache = shape_cache.get_cache("HIFLE", create_shape_image)
+    return cache.get_png(shape, color, size=size, variant=variant, selected=selected)
+
+def warm_shape_cache():
+    """Zeichnet die Symbole des Eingaberasters vorab in den Bild-Cache"""
+    for variant in ("color", "bw"):
+        for shape, color in zip(SHAPES, COLORS):
+            cached_shape_png(shape, color, size=90, variant=variant)
+
+def show_shape(shape, color, size=80, variant="color", selected=False):
+    """Zeigt ein Symbol an: im Sprite-Modus als Verweis in den Atlas, sonst als Bild aus dem Cache"""
+    if RENDER_MODE == "sprites" and sprite_atlas.available():
+        state = "selected" if selected else "normal"
+        st.markdown(sprite_atlas.sprite_html(shape, variant, state, size), unsafe_allow_html=True)
+    else:
+        st.image(cached_shape_png(shape, color, size=size, variant=variant, selected=selected), use_column_width=True)
+
 # -----------------------
 # Streamlit App
 # -----------------------
@@ -162,280 +414,29 @@ def main():
         initial_sidebar_state="collapsed"
     )
     
-    # CSS für modernes Aussehen
-    st.markdown(f"""
-    <style>
-    /* Hauptstile */
-    .main {{
-        padding: 2rem;
-    }}
-    
-    /* Buttons */
-    .stButton > button {{
-        background-color: {ACCENT};
-        color: white;
-        font-weight: 600;
-        border-radius: 8px;
-        border: none;
-        padding: 12px 24px;
-        transition: all 0.3s ease;
-        font-size: 16px;
-    }}
-    
-    .stButton > button:hover {{
-        background-color: #3a6bc5;
-        transform: translateY(-2px);
-        box-shadow: 0 4px 12px rgba(0,0,0,0.15);
-    }}
-    
-    .primary-button {{
-        background-color: {SECONDARY} !important;
-    }}
-    
-    .primary-button:hover {{
-        background-color: #218838 !important;
-    }}
-    
-    /* Titel */
-    .main-title {{
-        font-size: 42px;
-        font-weight: 800;
-        color: {ACCENT};
-        text-align: center;
-        margin-bottom: 30px;
-        padding-bottom: 20px;
-        border-bottom: 3px solid {ACCENT};
-        background: linear-gradient(135deg, {ACCENT}, #28a745);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        background-clip: text;
-    }}
-    
-    .section-title {{
-        font-size: 28px;
-        font-weight: 700;
-        color: #333;
-        margin-top: 40px;
-        margin-bottom: 25px;
-        padding-left: 15px;
-        border-left: 5px solid {ACCENT};
-    }}
-    
-    .subsection-title {{
-        font-size: 22px;
-        font-weight: 600;
-        color: #444;
-        margin-top: 30px;
-        margin-bottom: 20px;
-    }}
-    
-    /* Boxen und Container */
-    .info-card {{
-        background: linear-gradient(145deg, #f8f9fa, #ffffff);
-        padding: 30px;
-        border-radius: 16px;
-        margin-bottom: 30px;
-        border: 1px solid #e0e0e0;
-        box-shadow: 0 6px 20px rgba(0,0,0,0.08);
-        transition: transform 0.3s ease;
-    }}
-    
-    .info-card:hover {{
-        transform: translateY(-5px);
-        box-shadow: 0 12px 30px rgba(0,0,0,0.12);
-    }}
-    
-    .question-card {{
-        background: white;
-        padding: 25px;
-        border-radius: 12px;
-        margin-bottom: 25px;
-        border: 1px solid #e8e8e8;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.05);
-    }}
-    
-    /* Symbol Container */
-    .symbol-grid {{
-        display: flex;
-        justify-content: center;
-        flex-wrap: wrap;
-        gap: 20px;
-        margin: 30px 0;
-    }}
-    
-    .symbol-container {{
-        display: flex;
-        flex-direction: column;
-        align-items: center;
-        padding: 20px;
-        border-radius: 12px;
-        border: 2px solid transparent;
-        background: white;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 8px rgba(0,0,0,0.05);
-    }}
+    # CSS für modernes Aussehen: einmal als statische Datei kompiliert, pro Rerun nur ein <link> (siehe theme.py)
+    st.markdown(theme.stylesheet_tag("HIFLE", APP_CSS), unsafe_allow_html=True)
     
-    .symbol-container:hover {{
-        border-color: {ACCENT};
-        background-color: {ACCENT_LIGHT};
-        transform: scale(1.05);
-        box-shadow: 0 6px 15px rgba(72, 124, 218, 0.15);
-    }}
+    # Sprite-Stylesheet (nur ein kleiner <link>, der Atlas wird vom Browser gecacht)
+    if RENDER_MODE == "sprites" and sprite_atlas.available():
+        st.markdown(sprite_atlas.stylesheet_link(), unsafe_allow_html=True)
     
-    .symbol-container.selected {{
-        border-color: {SECONDARY};
-        background-color: #e8f5e9;
-        box-shadow: 0 6px 15px rgba(40, 167, 69, 0.2);
-    }}
-    
-    .symbol-number {{
-        font-size: 20px;
-        font-weight: bold;
-        color: {ACCENT};
-        margin-bottom: 10px;
-    }}
-    
-    /* Timer */
-    .timer-container {{
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 25px;
-        border-radius: 16px;
-        margin: 30px 0;
-        text-align: center;
-        color: white;
-        box-shadow: 0 8px 25px rgba(102, 126, 234, 0.4);
-    }}
-    
-    .timer-text {{
-        font-size: 32px;
-        font-weight: 700;
-        margin-bottom: 10px;
-    }}
-    
-    .timer-label {{
-        font-size: 18px;
-        opacity: 0.9;
-    }}
-    
-    /* Radio Buttons */
-    .radio-scale-container {{
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        margin: 25px 0;
-        gap: 5px;
-    }}
-    
-    .radio-label-left {{
-        font-size: 16px;
-        color: #666;
-        text-align: right;
-        min-width: 150px;
-        padding-right: 20px;
-        font-weight: 500;
-    }}
-    
-    .radio-label-right {{
-        font-size: 16px;
-        color: #666;
-        text-align: left;
-        min-width: 150px;
-        padding-left: 20px;
-        font-weight: 500;
-    }}
-    
-    .radio-option {{
-        display: flex;
-        flex-direction: column;
-        align-items: center;
-        padding: 10px 5px;
-    }}
-    
-    .radio-number {{
-        font-size: 18px;
-        font-weight: 600;
-        color: #333;
-        margin-bottom: 5px;
-    }}
-    
-    /* Eingabefelder */
-    .stTextInput input, .stTextArea textarea {{
-        border-radius: 10px !important;
-        border: 2px solid #ddd !important;
-        padding: 12px !important;
-        font-size: 16px !important;
-    }}
-    
-    .stTextInput input:focus, .stTextArea textarea:focus {{
-        border-color: {ACCENT} !important;
-        box-shadow: 0 0 0 3px rgba(72, 124, 218, 0.2) !important;
-    }}
-    
-    /* Progress Bar */
-    .stProgress > div > div > div {{
-        background: linear-gradient(90deg, {ACCENT}, {SECONDARY});
-    }}
-    
-    /* Ergebnisse Tabelle */
-    .results-table-container {{
-        background: white;
-        border-radius: 12px;
-        padding: 25px;
-        margin: 30px 0;
-        box-shadow: 0 6px 20px rgba(0,0,0,0.08);
-        border: 1px solid #e8e8e8;
-    }}
-    
-    .metric-card {{
-        background: linear-gradient(135deg, #f8f9fa, #ffffff);
-        padding: 20px;
-        border-radius: 12px;
-        text-align: center;
-        border: 1px solid #e0e0e0;
-    }}
-    
-    /* Responsive Anpassungen */
-    @media (max-width: 768px) {{
-        .main-title {{
-            font-size: 32px;
-        }}
-        
-        .section-title {{
-            font-size: 24px;
-        }}
-        
-        .symbol-container {{
-            padding: 15px;
-        }}
-    }}
-    
-    /* Custom Scrollbar */
-    ::-webkit-scrollbar {{
-        width: 10px;
-    }}
-    
-    ::-webkit-scrollbar-track {{
-        background: #f1f1f1;
-        border-radius: 5px;
-    }}
-    
-    ::-webkit-scrollbar-thumb {{
-        background: {ACCENT};
-        border-radius: 5px;
-    }}
-    
-    ::-webkit-scrollbar-thumb:hover {{
-        background: #3a6bc5;
-    }}
-    </style>
-    """, unsafe_allow_html=True)
+    # nach einem Reload den Stand zum Resume-Token in der URL wiederherstellen
+    session_checkpoint.resume("HIFLE")
     
     # Session State initialisieren
     init_session_state()
     
-    # Auto-Refresh für Timer
-    if st.session_state.get('timer_active', False):
-        st_autorefresh(interval=100, limit=None, key="timer_refresh")
+    # PIL, pandas und das Eingaberaster im Hintergrund vorladen (einmal je Serverprozess)
+    lazy_imports.warm_up("HIFLE", ["PIL.Image", "PIL.ImageDraw", "pandas"], then=warm_shape_cache)
+    
+    # Phasenwechsel seit dem letzten Lauf? Dann Checkpoint für einen Reload schreiben
+    session_checkpoint.save_on_transition(
+        "HIFLE", CHECKPOINT_KEYS, session_checkpoint.test_marker(st.session_state.page, st.session_state.test_state)
+    )
+    
+    # Größe und Leerlauf dieser Session beobachten; verlassene Tests räumt session_reaper auf
+    session_reaper.track("HIFLE", CHECKPOINT_KEYS, rerun_profiler.test_phase(st.session_state.test_state), partial_record)
     
     # Seitensteuerung
     page_handlers = {
@@ -449,10 +450,12 @@ def main():
     }
     
     current_page = st.session_state.get('page', 'start')
-    if current_page in page_handlers:
-        page_handlers[current_page]()
-    else:
-        show_start_page()
+    # mit MEMORYTEST_PROFILE=1 Laufzeit, Elemente und Bildbytes je Seite protokollieren (rerun_profiler.py)
+    with rerun_profiler.profile_rerun("HIFLE", current_page, rerun_profiler.test_phase(st.session_state.test_state)):
+        if current_page in page_handlers:
+            page_handlers[current_page]()
+        else:
+            show_start_page()
 
 def init_session_state():
     """Initialisiert den Session State"""
@@ -461,6 +464,7 @@ def init_session_state():
         'participant_data': {},
         'test_state': {
             'variant': None,
+            'plan': None,
             'current_test': 0,
             'sequence': [],
             'user_selections': [],
@@ -468,6 +472,8 @@ def init_session_state():
             'merk_times': [],
             'response_times': [],
             'correct_counts': [],
+            'client_timing': [],
+            'event_logs': [],
             'test_started': False,
             'memory_phase': False,
             'input_phase': False,
@@ -593,10 +599,13 @@ def show_start_page():
                     'gender': gender_code
                 }
                 
-                # Zufällige Testvariante wählen
-                variant = random.choice(["color", "bw"])
+                # Testvariante blockweise je Altersband und Geschlecht zuteilen (variant_assignment.py)
+                variant = variant_assignment.assign_variant(
+                    session_checkpoint.session_token(), participant_id, int(age), gender_code)
                 st.session_state.test_state = {
                     'variant': variant,
+                    # positionsbalancierte Sequenzen aller Tests (trial_plans.py)
+                    'plan': trial_plans.assign_plan(session_checkpoint.session_token(), participant_id),
                     'current_test': 0,
                     'sequence': [],
                     'user_selections': [],
@@ -604,6 +613,8 @@ def show_start_page():
                     'merk_times': [],
                     'response_times': [],
                     'correct_counts': [],
+                    'client_timing': [],
+                    'event_logs': [],
                     'test_started': False,
                     'memory_phase': False,
                     'input_phase': False,
@@ -694,6 +705,11 @@ def show_test_page():
     test_state = st.session_state.test_state
     current_test = test_state['current_test']
     
+    # Rückmeldung zum letzten Test, bis die Anzeigedauer um ist
+    if test_state.get('feedback'):
+        show_feedback()
+        return
+    
     # Prüfen ob alle Tests abgeschlossen
     if current_test >= len(TEST_SIZES):
         st.session_state.page = 'questionnaire_intro'
@@ -713,26 +729,18 @@ def show_test_page():
     progress = current_test / len(TEST_SIZES)
     st.progress(progress, text=f"Fortschritt: {current_test}/{len(TEST_SIZES)} Tests")
     
-    # Timer für Memory Phase
+    # Merkphase beendet? Zuerst die Meldung des Countdowns im Browser (mit seinen Zeitstempeln);
+    # sie kommt bei Ablauf immer nach der Frist auf dem Server
     if test_state['memory_phase'] and test_state.get('timer_start'):
-        elapsed = time.time() - test_state['timer_start']
-        remaining = max(0, MEMORY_LIMIT_SECONDS - elapsed)
+        event = countdown_event(*countdown_ids(test_state))
+        if event:
+            end_memory_phase(event)
+            return
         
-        if remaining <= 0:
+        # Rückfall, falls sich der Browser nicht meldet (z.B. Tab im Hintergrund)
+        if clock.now() - test_state['timer_start'] >= memory_engine.MEMORY_LIMIT_SECONDS + MEMORY_GRACE_SECONDS:
             end_memory_phase()
             return
-        
-        # Timer anzeigen
-        st.markdown(f"""
-        <div class="timer-container">
-            <div class="timer-text">⏱️ {int(remaining)} Sekunden</div>
-            <div class="timer-label">verbleibende Merkzeit</div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Fortschrittsbalken
-        progress_percent = 1 - (remaining / MEMORY_LIMIT_SECONDS)
-        st.progress(progress_percent)
     
     # Statusanzeige
     if test_state['memory_phase']:
@@ -743,16 +751,15 @@ def show_test_page():
 def start_test():
     test_state = st.session_state.test_state
     current_test = test_state['current_test']
-    size = TEST_SIZES[current_test]
     
-    # Neue Sequenz generieren
-    test_state['sequence'] = random.sample(SHAPES, size)
+    # Sequenz aus dem Testplan der Teilnahme (trial_plans.py)
+    test_state['sequence'] = trial_plans.sequence(test_state.get('plan'), current_test)
     test_state['user_selections'] = []
     test_state['memory_phase'] = True
     test_state['input_phase'] = False
     test_state['test_started'] = True
-    test_state['timer_start'] = time.time()
-    test_state['timer_end'] = test_state['timer_start'] + MEMORY_LIMIT_SECONDS
+    test_state['timer_start'] = clock.now()
+    test_state['timer_end'] = test_state['timer_start'] + memory_engine.MEMORY_LIMIT_SECONDS
     
     # Timer aktivieren
     st.session_state.timer_active = True
@@ -781,45 +788,69 @@ def show_memory_phase(size):
     cols = st.columns(len(sequence))
     for i, shape in enumerate(sequence):
         with cols[i]:
-            color = COLORS[SHAPES.index(shape)]
-            img = create_shape_image(shape, color, size=140, variant=variant)
+            color = memory_engine.color_of(shape)
             
             st.markdown(f"""
             <div class="symbol-container">
                 <div class="symbol-number">Position {i+1}</div>
             """, unsafe_allow_html=True)
             
-            st.image(img, use_column_width=True)
+            show_shape(shape, color, size=140, variant=variant)
             
             st.markdown("</div>", unsafe_allow_html=True)
     
     st.markdown('</div>', unsafe_allow_html=True)
     
-    # Buttons
-    col1, col2, col3 = st.columns([2, 1, 2])
-    
-    with col2:
-        if st.button("✅ Weiter zur Eingabe", type="primary", use_container_width=True):
-            end_memory_phase()
+    # Countdown, Fortschrittsbalken und Weiter-Button laufen im Browser;
+    # der Server wird nur bei Ablauf oder Klick benachrichtigt (ausgewertet in show_test_page)
+    trial_id, key = countdown_ids(test_state)
+    remaining = memory_engine.remaining_time(test_state['timer_start'], clock.now())
+    memory_countdown(
+        trial_id,
+        remaining,
+        memory_engine.MEMORY_LIMIT_SECONDS,
+        button_label="✅ Weiter zur Eingabe",
+        key=key
+    )
 
-def end_memory_phase():
+def countdown_ids(test_state):
+    # Durchgangs-ID und Widget-Key des Countdowns im laufenden Test
+    return f"{test_state['current_test']}-{test_state['timer_start']}", f"countdown_{test_state['current_test']}"
+
+def end_memory_phase(client_event=None):
     test_state = st.session_state.test_state
     
     # Merkzeit berechnen
     if test_state.get('timer_start'):
-        merk_time = round(min(time.time() - test_state['timer_start'], MEMORY_LIMIT_SECONDS), 3)
+        merk_time = memory_engine.merk_time(test_state['timer_start'], clock.now())
         test_state['merk_times'].append(merk_time)
     
+    # Einblenden und Ende der Merkphase laut Browser (nur mit dem Countdown)
+    if client_event:
+        memory_engine.record_memory(
+            memory_engine.client_timing(test_state['client_timing'], test_state['current_test']),
+            client_event.get('onset_ms'), client_event.get('t_ms')
+        )
+    
     # Zur Eingabephase wechseln
     test_state['memory_phase'] = False
     test_state['input_phase'] = True
-    test_state['response_start'] = time.time()
+    test_state['response_start'] = clock.now()
+    trial_events.start(test_state['event_logs'], test_state['current_test'], test_state['response_start'])
     
     # Timer deaktivieren
     st.session_state.timer_active = False
     
     st.rerun()
 
+def log_event(kind, shape=None):
+    # Klick ins Ereignisprotokoll des laufenden Tests (trial_events)
+    test_state = st.session_state.test_state
+    logs = test_state['event_logs']
+    if test_state['current_test'] < len(logs):
+        shape_index = memory_engine.SHAPE_INDEX[shape] if shape else 0
+        trial_events.record(logs[test_state['current_test']], kind, clock.now(), shape_index)
+
 def show_input_phase(size):
     test_state = st.session_state.test_state
     variant = test_state['variant']
@@ -838,7 +869,7 @@ def show_input_phase(size):
     
     # Timer für Eingabephase
     if test_state.get('response_start'):
-        elapsed = time.time() - test_state['response_start']
+        elapsed = clock.now() - test_state['response_start']
         col1, col2, col3 = st.columns(3)
         with col2:
             st.metric("⏱️ Eingabezeit", f"{elapsed:.1f} Sekunden")
@@ -846,61 +877,76 @@ def show_input_phase(size):
     # Alle verfügbaren Symbole anzeigen
     st.markdown("### Verfügbare Symbole")
     
-    # Erste Reihe
-    cols1 = st.columns(8)
-    for i in range(8):
-        with cols1[i]:
-            shape = SHAPES[i]
-            color = COLORS[i]
-            is_selected = shape in user_selections
-            img = create_shape_image(shape, color, size=90, variant=variant, selected=is_selected)
+    if INPUT_GRID == "composite":
+        # ganzes Raster als ein Element; der Klick kommt als Symbol-Index zurück
+        index = symbol_grid(
+            SHAPES, COLORS, variant, user_selections,
+            f"{test_state['current_test']}-{test_state.get('response_start')}",
+            key="symbol_grid",
+            timing=memory_engine.client_timing(test_state['client_timing'], test_state['current_test'])
+        )
+        if index is not None:
+            shape = SHAPES[index]
+            if shape not in user_selections and len(user_selections) < size:
+                test_state['user_selections'].append(shape)
+                log_event(trial_events.SELECT, shape)
+                st.rerun()
+    else:
+        # Erste Reihe
+        cols1 = st.columns(8)
+        for i in range(8):
+            with cols1[i]:
+                shape = SHAPES[i]
+                color = COLORS[i]
+                is_selected = shape in user_selections
             
-            # Symbol anzeigen
-            st.markdown(f'<div class="symbol-container {"selected" if is_selected else ""}">', unsafe_allow_html=True)
+                # Symbol anzeigen
+                st.markdown(f'<div class="symbol-container {"selected" if is_selected else ""}">', unsafe_allow_html=True)
             
-            # Button nur wenn nicht ausgewählt
-            if not is_selected:
-                if st.button("", key=f"shape1_{i}", help=shape):
-                    if len(user_selections) < size:
-                        test_state['user_selections'].append(shape)
-                        st.rerun()
+                # Button nur wenn nicht ausgewählt
+                if not is_selected:
+                    if st.button("", key=f"shape1_{i}", help=shape):
+                        if len(user_selections) < size:
+                            test_state['user_selections'].append(shape)
+                            log_event(trial_events.SELECT, shape)
+                            st.rerun()
             
-            st.image(img, use_column_width=True)
+                show_shape(shape, color, size=90, variant=variant, selected=is_selected)
             
-            # Symbol Status
-            if is_selected:
-                position = user_selections.index(shape) + 1
-                st.markdown(f'<div style="color: {SECONDARY}; font-weight: bold;">✓ Position {position}</div>', unsafe_allow_html=True)
+                # Symbol Status
+                if is_selected:
+                    position = user_selections.index(shape) + 1
+                    st.markdown(f'<div style="color: {SECONDARY}; font-weight: bold;">✓ Position {position}</div>', unsafe_allow_html=True)
             
-            st.markdown("</div>", unsafe_allow_html=True)
+                st.markdown("</div>", unsafe_allow_html=True)
     
-    # Zweite Reihe
-    cols2 = st.columns(8)
-    for i in range(8, 16):
-        with cols2[i-8]:
-            shape = SHAPES[i]
-            color = COLORS[i]
-            is_selected = shape in user_selections
-            img = create_shape_image(shape, color, size=90, variant=variant, selected=is_selected)
+        # Zweite Reihe
+        cols2 = st.columns(8)
+        for i in range(8, 16):
+            with cols2[i-8]:
+                shape = SHAPES[i]
+                color = COLORS[i]
+                is_selected = shape in user_selections
             
-            # Symbol anzeigen
-            st.markdown(f'<div class="symbol-container {"selected" if is_selected else ""}">', unsafe_allow_html=True)
+                # Symbol anzeigen
+                st.markdown(f'<div class="symbol-container {"selected" if is_selected else ""}">', unsafe_allow_html=True)
             
-            # Button nur wenn nicht ausgewählt
-            if not is_selected:
-                if st.button("", key=f"shape2_{i}", help=shape):
-                    if len(user_selections) < size:
-                        test_state['user_selections'].append(shape)
-                        st.rerun()
+                # Button nur wenn nicht ausgewählt
+                if not is_selected:
+                    if st.button("", key=f"shape2_{i}", help=shape):
+                        if len(user_selections) < size:
+                            test_state['user_selections'].append(shape)
+                            log_event(trial_events.SELECT, shape)
+                            st.rerun()
             
-            st.image(img, use_column_width=True)
+                show_shape(shape, color, size=90, variant=variant, selected=is_selected)
             
-            # Symbol Status
-            if is_selected:
-                position = user_selections.index(shape) + 1
-                st.markdown(f'<div style="color: {SECONDARY}; font-weight: bold;">✓ Position {position}</div>', unsafe_allow_html=True)
+                # Symbol Status
+                if is_selected:
+                    position = user_selections.index(shape) + 1
+                    st.markdown(f'<div style="color: {SECONDARY}; font-weight: bold;">✓ Position {position}</div>', unsafe_allow_html=True)
             
-            st.markdown("</div>", unsafe_allow_html=True)
+                st.markdown("</div>", unsafe_allow_html=True)
     
     # Ausgewählte Reihenfolge anzeigen
     if user_selections:
@@ -909,8 +955,7 @@ def show_input_phase(size):
         selected_cols = st.columns(len(user_selections))
         for i, shape in enumerate(user_selections):
             with selected_cols[i]:
-                color = COLORS[SHAPES.index(shape)]
-                img = create_shape_image(shape, color, size=100, variant=variant, selected=True)
+                color = memory_engine.color_of(shape)
                 
                 st.markdown(f"""
                 <div style="text-align: center; padding: 15px; background: #f8f9fa; border-radius: 10px;">
@@ -919,7 +964,7 @@ def show_input_phase(size):
                     </div>
                 """, unsafe_allow_html=True)
                 
-                st.image(img, use_column_width=True)
+                show_shape(shape, color, size=100, variant=variant, selected=True)
                 
                 # Korrektur anzeigen
                 if i < len(test_state['sequence']):
@@ -937,16 +982,19 @@ def show_input_phase(size):
     with col1:
         if st.button("🔄 Auswahl zurücksetzen", use_container_width=True):
             test_state['user_selections'] = []
+            log_event(trial_events.RESET)
             st.rerun()
     
     with col2:
         if st.button("⏭️ Test überspringen", use_container_width=True):
             test_state['user_selections'] = []
+            log_event(trial_events.SKIP)
             finish_test()
     
     with col3:
         if st.button("✅ Eingabe bestätigen", type="primary", use_container_width=True, disabled=len(user_selections) < size):
             if len(user_selections) == size:
+                log_event(trial_events.CONFIRM)
                 finish_test()
     
     # Automatische Überprüfung wenn alle ausgewählt
@@ -958,33 +1006,46 @@ def finish_test():
     
     # Reaktionszeit speichern
     if test_state.get('response_start'):
-        response_time = round(time.time() - test_state['response_start'], 3)
+        response_time = memory_engine.response_time(test_state['response_start'], clock.now())
         test_state['response_times'].append(response_time)
     
     # Korrekte Antworten zählen
-    correct = 0
-    min_length = min(len(test_state['user_selections']), len(test_state['sequence']))
-    for i in range(min_length):
-        if test_state['user_selections'][i] == test_state['sequence'][i]:
-            correct += 1
+    correct = memory_engine.score(test_state['user_selections'], test_state['sequence'])
     
     test_state['correct_counts'].append(correct)
     
-    # Feedback anzeigen
+    # Ergebnis für FEEDBACK_SECONDS anzeigen (show_feedback); der Server-Thread wartet dabei nicht
     size = TEST_SIZES[test_state['current_test']]
-    if correct == size:
-        st.success(f"🎉 Perfekt! Alle {correct} von {size} Symbolen korrekt!")
-    else:
-        st.info(f"Ergebnis: {correct} von {size} Symbolen korrekt ({correct/size*100:.0f}%)")
+    test_state['feedback'] = memory_engine.feedback_state(
+        test_state['current_test'], correct, size, clock.now(), FEEDBACK_SECONDS
+    )
+    test_state['input_phase'] = False
     
     # Zum nächsten Test
     test_state['current_test'] += 1
     test_state['test_started'] = False
     
-    # Kurze Pause
-    time.sleep(2)
     st.rerun()
 
+def show_feedback():
+    """Ergebnis des letzten Tests; weiter geht es per Fragment-Rerun statt sleep"""
+    feedback = st.session_state.test_state['feedback']
+    correct, size = feedback['correct'], feedback['size']
+    if correct == size:
+        st.success(f"🎉 Perfekt! Alle {correct} von {size} Symbolen korrekt!")
+    else:
+        st.info(f"Ergebnis: {correct} von {size} Symbolen korrekt ({correct/size*100:.0f}%)")
+    feedback_timer()
+
+@st.fragment(run_every=FEEDBACK_REFRESH_SECONDS)
+def feedback_timer():
+    # läuft alle FEEDBACK_REFRESH_SECONDS allein neu und stößt nach Ablauf einen kompletten Rerun an
+    test_state = st.session_state.test_state
+    feedback = test_state.get('feedback')
+    if feedback and memory_engine.feedback_remaining(feedback, clock.now()) <= 0:
+        test_state['feedback'] = None
+        st.rerun()
+
 def show_questionnaire_intro():
     st.markdown('<div class="main-title">📝 Fragebogen</div>', unsafe_allow_html=True)
     
@@ -1193,8 +1254,48 @@ def show_questionnaire_b():
                 else:
                     st.error("Bitte beantworten Sie alle Fragen, bevor Sie den Fragebogen abschließen.")
 
+def results_record(participant_data, test_state, questionnaire=None):
+    """Datensatz für result_store aus Teilnehmerdaten und test_state"""
+    return result_store.session_record(
+        "HIFLE",
+        participant_data,
+        test_state['variant'],
+        trials=result_store.trial_rows(
+            TEST_SIZES, test_state['merk_times'], test_state['response_times'], test_state['correct_counts'],
+            *memory_engine.client_results(test_state['client_timing']),
+            events=trial_events.encode_all(test_state['event_logs'])
+        ),
+        questionnaire=questionnaire,
+    )
+
+def partial_record(state):
+    """Teil-Datensatz einer verlassenen Session mit den bis dahin absolvierten Tests (session_reaper.py)"""
+    test_state = state.get('test_state')
+    if not test_state or not test_state.get('variant'):
+        return None
+    return results_record(state.get('participant_data', {}), test_state)
+
 def save_results():
-    """Speichert Ergebnisse in Excel-Datei"""
+    """Speichert Ergebnisse als ein Datensatz im Append-Only-Log bzw. in SQLite (Excel-Export über result_store.py)"""
+    if RESULTS_BACKEND == "excel":
+        return save_results_excel()
+    try:
+        record = results_record(
+            st.session_state.participant_data,
+            st.session_state.test_state,
+            questionnaire=result_store.questionnaire_row(
+                st.session_state.questionnaire_answers[:7], st.session_state.questionnaire_text
+            ),
+        )
+        st.session_state.saved_path = result_writer.save(RESULTS_BACKEND, record)
+        return True
+
+    except Exception as e:
+        st.error(f"Fehler beim Speichern: {str(e)}")
+        return False
+
+def save_results_excel():
+    """Speichert Ergebnisse direkt in die Excel-Datei (alter Weg, liest und schreibt die ganze Datei)"""
     try:
         # Test-Ergebnisse
         test_data = {
@@ -1223,6 +1324,12 @@ def save_results():
                 test_data[f"Test_{i+1}_Korrekt"] = [st.session_state.test_state['correct_counts'][i]]
             else:
                 test_data[f"Test_{i+1}_Korrekt"] = [""]
+
+            # Klickprotokoll (trial_events), kodiert wie in JSONL und SQLite
+            if i < len(st.session_state.test_state['event_logs']):
+                test_data[f"Test_{i+1}_Ereignisse"] = [trial_events.encode(st.session_state.test_state['event_logs'][i])]
+            else:
+                test_data[f"Test_{i+1}_Ereignisse"] = [""]
         
         # Fragebogen-Daten
         q_data = {
@@ -1277,8 +1384,6 @@ def save_results():
                     header=(startrow_q == 0),
                     startrow=startrow_q
                 )
-                
-                writer.save()
         else:
             with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
                 sheet_name = "FARBIG" if st.session_state.test_state['variant'] == "color" else "FARBLOS"
@@ -1442,6 +1547,8 @@ def show_thank_you_page():
             for key in list(st.session_state.keys()):
                 if key not in keys_to_keep:
                     del st.session_state[key]
+            # sonst lädt resume() über ?resume= wieder den abgeschlossenen Test
+            session_checkpoint.reset()
             st.rerun()
 
 # -----------------------
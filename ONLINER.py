@@ -1,33 +1,45 @@
 # streamlit_app.py
 import streamlit as st
-import pandas as pd
-import random
-import time
 import os
 from datetime import datetime
-from PIL import Image, ImageDraw
 import io
 import base64
+import lazy_imports
+import shape_cache
+import clock
+import memory_engine
+import shape_geometry
+import sprite_atlas
+import result_store
+import result_writer
+import rerun_profiler
+import session_checkpoint
+import session_reaper
+import variant_assignment
+import trial_events
+import trial_plans
+from symbol_grid import symbol_grid
+
+# pandas und PIL erst bei Bedarf laden (siehe lazy_imports.py)
+pd = lazy_imports.lazy("pandas")
+Image = lazy_imports.lazy("PIL.Image")
+ImageDraw = lazy_imports.lazy("PIL.ImageDraw")
 
 # -----------------------
 # Konfiguration / Symbole
 # -----------------------
-SHAPES = [
-    "Kreis_f", "Quadrat_f", "Raute_f", "Stern_f",
-    "PfeilOben", "PfeilUnten", "PfeilLinks", "PfeilRechts",
-    "Dreieck_f", "Doppelpfeil_H", "Doppelpfeil_V",
-    "Kreis_h", "Quadrat_h", "Dreieck_h", "Stern_h", "Raute_h"
-]
-
-COLORS = [
-    "red", "blue", "green", "orange",
-    "purple", "brown", "cyan",
-    "magenta", "gold", "darkgreen", "darkblue",
-    "red", "blue", "gold", "magenta", "green"
-]
+# Symbole, Farben und Testgrößen gemeinsam für alle Frontends (siehe memory_engine.py)
+SHAPES = memory_engine.SHAPES
+COLORS = memory_engine.COLORS
+TEST_SIZES = memory_engine.TEST_SIZES
+FEEDBACK_SECONDS = float(os.environ.get("MEMORYTEST_FEEDBACK_SECONDS", "0.5"))  # Ergebnisanzeige nach jedem Test
+FEEDBACK_REFRESH_SECONDS = 0.25  # Prüfintervall des Feedback-Fragments
+RENDER_MODE = os.environ.get("MEMORYTEST_RENDER_MODE", "image")  # "image" oder "sprites" (siehe sprite_atlas.py)
+INPUT_GRID = os.environ.get("MEMORYTEST_INPUT_GRID", "columns")  # "columns" oder "composite" (siehe symbol_grid.py)
 
-TEST_SIZES = [3, 4, 5, 6, 7]
-MEMORY_LIMIT_MS = 30000  # 30 Sekunden
+# Zustand, der bei jedem Phasenwechsel als Checkpoint gespeichert wird (siehe session_checkpoint.py)
+CHECKPOINT_KEYS = ['page', 'participant_data', 'test_state', 'questionnaire_answers', 'questionnaire_text']
+RESULTS_BACKEND = os.environ.get("MEMORYTEST_BACKEND", "excel")  # "excel", "jsonl" oder "sqlite" (siehe result_store.py)
 
 # UI styling
 ACCENT = "#4B7CDA"
@@ -58,71 +70,18 @@ def create_shape_image(shape, color, size=80, variant="color"):
     fill_color = (255, 255, 255) if is_hollow else outline_color
     line_width = 4 if is_hollow else 2
     
-    # Koordinaten skalieren
-    def scale(coords):
-        return [coord * size / 100 for coord in coords]
-    
-    # --- Kreis ---
-    if shape.startswith("Kreis"):
-        bbox = [size*0.1, size*0.1, size*0.9, size*0.9]
-        draw.ellipse(bbox, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Quadrat ---
-    elif shape.startswith("Quadrat"):
-        bbox = [size*0.12, size*0.12, size*0.88, size*0.88]
-        draw.rectangle(bbox, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Raute ---
-    elif shape.startswith("Raute"):
-        coords = scale([50, 8, 88, 50, 50, 92, 12, 50])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Stern ---
-    elif shape.startswith("Stern"):
-        coords = scale([50, 12, 58, 34, 80, 34, 62, 50, 68, 74, 50, 60, 32, 74, 38, 50, 20, 34, 42, 34])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Dreieck ---
-    elif shape.startswith("Dreieck"):
-        coords = scale([50, 10, 90, 80, 10, 80])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Pfeil Oben ---
-    elif shape == "PfeilOben":
-        coords = scale([50, 10, 78, 50, 62, 50, 62, 90, 38, 90, 38, 50, 22, 50])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Pfeil Unten ---
-    elif shape == "PfeilUnten":
-        coords = scale([50, 90, 78, 50, 62, 50, 62, 10, 38, 10, 38, 50, 22, 50])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Pfeil Links ---
-    elif shape == "PfeilLinks":
-        coords = scale([10, 50, 50, 10, 50, 30, 90, 30, 90, 70, 50, 70, 50, 90])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Pfeil Rechts ---
-    elif shape == "PfeilRechts":
-        coords = scale([90, 50, 50, 10, 50, 30, 10, 30, 10, 70, 50, 70, 50, 90])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Doppelpfeil horizontal ---
-    elif shape == "Doppelpfeil_H":
-        draw.line(scale([18, 50, 82, 50]), fill=outline_color, width=line_width)
-        draw.polygon(scale([18, 50, 30, 40, 30, 60]), fill=outline_color, outline=outline_color)
-        draw.polygon(scale([82, 50, 70, 40, 70, 60]), fill=outline_color, outline=outline_color)
-    
-    # --- Doppelpfeil vertikal ---
-    elif shape == "Doppelpfeil_V":
-        draw.line(scale([50, 18, 50, 82]), fill=outline_color, width=line_width)
-        draw.polygon(scale([50, 18, 40, 30, 60, 30]), fill=outline_color, outline=outline_color)
-        draw.polygon(scale([50, 82, 40, 70, 60, 70]), fill=outline_color, outline=outline_color)
-    
-    # Fallback zu Kreis
-    else:
-        bbox = [size*0.1, size*0.1, size*0.9, size*0.9]
-        draw.ellipse(bbox, fill=fill_color, outline=outline_color, width=line_width)
+    # Geometrie aus der gemeinsamen Tabelle, je Größe skaliert und gecacht
+    for kind, coords in shape_geometry.scaled(shape, size):
+        if kind == "ellipse":
+            draw.ellipse(coords, fill=fill_color, outline=outline_color, width=line_width)
+        elif kind == "rect":
+            draw.rectangle(coords, fill=fill_color, outline=outline_color, width=line_width)
+        elif kind == "polygon":
+            draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
+        elif kind == "line":
+            draw.line(coords, fill=outline_color, width=line_width)
+        elif kind == "head":
+            draw.polygon(coords, fill=outline_color, outline=outline_color)
     
     return img
 
@@ -132,10 +91,32 @@ def image_to_base64(img):
     img.save(buffered, format="PNG")
     return base64.b64encode(buffered.getvalue()).decode()
 
+def cached_shape_png(shape, color, size=80, variant="color", selected=False):
+    """Liefert das Symbol als PNG-Bytes aus dem prozessweiten Bild-Cache"""
+    cache = shape_cache.get_cache("ONLINER", create_shape_image)
+    return cache.get_png(shape, color, size=size, variant=variant, selected=selected)
+
+def warm_shape_cache():
+    """Zeichnet die Symbole des Eingaberasters vorab in den Bild-Cache"""
+    for variant in ("color", "bw"):
+        for shape, color in zip(SHAPES, COLORS):
+            cached_shape_png(shape, color, size=80, variant=variant)
+
+def show_shape(shape, color, size=80, variant="color", selected=False):
+    """Zeigt ein Symbol an: im Sprite-Modus als Verweis in den Atlas, sonst als Bild aus dem Cache"""
+    if RENDER_MODE == "sprites" and sprite_atlas.available():
+        state = "selected" if selected else "normal"
+        st.markdown(sprite_atlas.sprite_html(shape, variant, state, size), unsafe_allow_html=True)
+    else:
+        st.image(cached_shape_png(shape, color, size=size, variant=variant, selected=selected), use_column_width=True)
+
 # -----------------------
 # Streamlit App
 # -----------------------
 def main():
+    # nach einem Reload den Stand zum Resume-Token in der URL wiederherstellen
+    session_checkpoint.resume("ONLINER")
+    
     # Session State initialisieren
     if 'page' not in st.session_state:
         st.session_state.page = 'start'
@@ -144,6 +125,7 @@ def main():
     if 'test_state' not in st.session_state:
         st.session_state.test_state = {
             'variant': None,
+            'plan': None,
             'current_test': 0,
             'sequence': [],
             'user_selections': [],
@@ -151,6 +133,8 @@ def main():
             'merk_times': [],
             'response_times': [],
             'correct_counts': [],
+            'client_timing': [],
+            'event_logs': [],
             'test_started': False
         }
     if 'questionnaire_answers' not in st.session_state:
@@ -158,6 +142,9 @@ def main():
     if 'questionnaire_text' not in st.session_state:
         st.session_state.questionnaire_text = ""
     
+    # PIL, pandas und das Eingaberaster im Hintergrund vorladen (einmal je Serverprozess)
+    lazy_imports.warm_up("ONLINER", ["PIL.Image", "PIL.ImageDraw", "pandas"], then=warm_shape_cache)
+    
     # CSS für besseres Aussehen
     st.markdown(f"""
     <style>
@@ -188,21 +175,35 @@ def main():
     </style>
     """, unsafe_allow_html=True)
     
+    # Sprite-Stylesheet (nur ein kleiner <link>, der Atlas wird vom Browser gecacht)
+    if RENDER_MODE == "sprites" and sprite_atlas.available():
+        st.markdown(sprite_atlas.stylesheet_link(), unsafe_allow_html=True)
+    
+    # Phasenwechsel seit dem letzten Lauf? Dann Checkpoint für einen Reload schreiben
+    session_checkpoint.save_on_transition(
+        "ONLINER", CHECKPOINT_KEYS, session_checkpoint.test_marker(st.session_state.page, st.session_state.test_state)
+    )
+    
+    # Größe und Leerlauf dieser Session beobachten; verlassene Tests räumt session_reaper auf
+    session_reaper.track("ONLINER", CHECKPOINT_KEYS, rerun_profiler.test_phase(st.session_state.test_state), partial_record)
+    
     # Seitensteuerung
-    if st.session_state.page == 'start':
-        show_start_page()
-    elif st.session_state.page == 'instructions':
-        show_instructions_page()
-    elif st.session_state.page == 'test':
-        show_test_page()
-    elif st.session_state.page == 'questionnaire_intro':
-        show_questionnaire_intro()
-    elif st.session_state.page == 'questionnaire_a':
-        show_questionnaire_a()
-    elif st.session_state.page == 'questionnaire_b':
-        show_questionnaire_b()
-    elif st.session_state.page == 'thank_you':
-        show_thank_you_page()
+    # mit MEMORYTEST_PROFILE=1 Laufzeit, Elemente und Bildbytes je Seite protokollieren (rerun_profiler.py)
+    with rerun_profiler.profile_rerun("ONLINER", st.session_state.page, rerun_profiler.test_phase(st.session_state.test_state)):
+        if st.session_state.page == 'start':
+            show_start_page()
+        elif st.session_state.page == 'instructions':
+            show_instructions_page()
+        elif st.session_state.page == 'test':
+            show_test_page()
+        elif st.session_state.page == 'questionnaire_intro':
+            show_questionnaire_intro()
+        elif st.session_state.page == 'questionnaire_a':
+            show_questionnaire_a()
+        elif st.session_state.page == 'questionnaire_b':
+            show_questionnaire_b()
+        elif st.session_state.page == 'thank_you':
+            show_thank_you_page()
 
 # -----------------------
 # Seiten
@@ -253,12 +254,18 @@ def show_start_page():
                     'gender': gender
                 }
                 
-                # Zufällige Testvariante wählen
-                st.session_state.test_state['variant'] = random.choice(["color", "bw"])
+                # Testvariante blockweise je Altersband und Geschlecht zuteilen (variant_assignment.py)
+                st.session_state.test_state['variant'] = variant_assignment.assign_variant(
+                    session_checkpoint.session_token(), participant_id, int(age), gender)
+                # positionsbalancierte Sequenzen aller Tests (trial_plans.py)
+                st.session_state.test_state['plan'] = trial_plans.assign_plan(
+                    session_checkpoint.session_token(), participant_id)
                 st.session_state.test_state['current_test'] = 0
                 st.session_state.test_state['merk_times'] = []
                 st.session_state.test_state['response_times'] = []
                 st.session_state.test_state['correct_counts'] = []
+                st.session_state.test_state['client_timing'] = []
+                st.session_state.test_state['event_logs'] = []
                 st.session_state.test_state['test_started'] = False
                 
                 # Zur nächsten Seite
@@ -292,6 +299,11 @@ def show_test_page():
     test_state = st.session_state.test_state
     current_test = test_state['current_test']
     
+    # Rückmeldung zum letzten Test, bis die Anzeigedauer um ist
+    if test_state.get('feedback'):
+        show_feedback()
+        return
+    
     # Prüfen ob alle Tests abgeschlossen
     if current_test >= len(TEST_SIZES):
         st.session_state.page = 'questionnaire_intro'
@@ -323,12 +335,11 @@ def show_test_page():
 def start_test():
     test_state = st.session_state.test_state
     current_test = test_state['current_test']
-    size = TEST_SIZES[current_test]
     
-    # Neue Sequenz generieren
-    test_state['sequence'] = random.sample(SHAPES, size)
+    # Sequenz aus dem Testplan der Teilnahme (trial_plans.py)
+    test_state['sequence'] = trial_plans.sequence(test_state.get('plan'), current_test)
     test_state['user_selections'] = []
-    test_state['memory_start'] = time.time()
+    test_state['memory_start'] = clock.now()
     test_state['memory_phase'] = True
     test_state['input_phase'] = False
     test_state['test_started'] = True
@@ -346,16 +357,15 @@ def show_memory_phase(size):
     cols = st.columns(len(sequence))
     for i, shape in enumerate(sequence):
         with cols[i]:
-            color = COLORS[SHAPES.index(shape)]
-            img = create_shape_image(shape, color, size=100, variant=variant)
-            st.image(img, use_column_width=True)
+            color = memory_engine.color_of(shape)
+            show_shape(shape, color, size=100, variant=variant)
     
     # Timer und Fortschrittsbalken
-    elapsed = time.time() - test_state['memory_start']
-    remaining = max(0, MEMORY_LIMIT_MS/1000 - elapsed)
+    elapsed = clock.now() - test_state['memory_start']
+    remaining = max(0, memory_engine.MEMORY_LIMIT_SECONDS - elapsed)
     
     # Fortschrittsbalken
-    progress = min(1.0, elapsed / (MEMORY_LIMIT_MS/1000))
+    progress = min(1.0, elapsed / memory_engine.MEMORY_LIMIT_SECONDS)
     st.progress(progress, text=f"Verbleibende Zeit: {int(remaining)} Sekunden")
     
     col1, col2 = st.columns([3, 1])
@@ -368,23 +378,32 @@ def show_memory_phase(size):
             st.rerun()
     
     # Automatischer Übergang nach 30 Sekunden
-    if elapsed >= MEMORY_LIMIT_MS/1000:
+    if elapsed >= memory_engine.MEMORY_LIMIT_SECONDS:
         end_memory_phase()
 
 def end_memory_phase():
     test_state = st.session_state.test_state
     
     # Merkzeit berechnen und speichern
-    merk_time = round(min(time.time() - test_state['memory_start'], MEMORY_LIMIT_MS/1000), 3)
+    merk_time = memory_engine.merk_time(test_state['memory_start'], clock.now())
     test_state['merk_times'].append(merk_time)
     
     # Zur Eingabephase wechseln
     test_state['memory_phase'] = False
     test_state['input_phase'] = True
-    test_state['response_start'] = time.time()
+    test_state['response_start'] = clock.now()
+    trial_events.start(test_state['event_logs'], test_state['current_test'], test_state['response_start'])
     
     st.rerun()
 
+def log_event(kind, shape=None):
+    # Klick ins Ereignisprotokoll des laufenden Tests (trial_events)
+    test_state = st.session_state.test_state
+    logs = test_state['event_logs']
+    if test_state['current_test'] < len(logs):
+        shape_index = memory_engine.SHAPE_INDEX[shape] if shape else 0
+        trial_events.record(logs[test_state['current_test']], kind, clock.now(), shape_index)
+
 def show_input_phase(size):
     test_state = st.session_state.test_state
     variant = test_state['variant']
@@ -395,39 +414,54 @@ def show_input_phase(size):
     # Alle verfügbaren Symbole anzeigen (in 2 Reihen)
     st.markdown("**Verfügbare Symbole:**")
     
-    # Erste Reihe (erste 8 Symbole)
-    cols1 = st.columns(8)
-    for i in range(8):
-        with cols1[i]:
-            shape = SHAPES[i]
-            color = COLORS[i]
-            img = create_shape_image(shape, color, size=80, variant=variant)
+    if INPUT_GRID == "composite":
+        # ganzes Raster als ein Element; der Klick kommt als Symbol-Index zurück
+        index = symbol_grid(
+            SHAPES, COLORS, variant, user_selections,
+            f"{test_state['current_test']}-{test_state.get('response_start')}",
+            key="symbol_grid",
+            timing=memory_engine.client_timing(test_state['client_timing'], test_state['current_test'])
+        )
+        if index is not None:
+            shape = SHAPES[index]
+            if shape not in user_selections:
+                test_state['user_selections'].append(shape)
+                log_event(trial_events.SELECT, shape)
+                st.rerun()
+    else:
+        # Erste Reihe (erste 8 Symbole)
+        cols1 = st.columns(8)
+        for i in range(8):
+            with cols1[i]:
+                shape = SHAPES[i]
+                color = COLORS[i]
             
-            # Prüfen ob Symbol bereits ausgewählt wurde
-            disabled = shape in user_selections
+                # Prüfen ob Symbol bereits ausgewählt wurde
+                disabled = shape in user_selections
             
-            if st.button("", key=f"shape_{i}", disabled=disabled):
-                if shape not in user_selections:
-                    test_state['user_selections'].append(shape)
-                    st.rerun()
-            st.image(img, use_column_width=True)
-    
-    # Zweite Reihe (restliche 8 Symbole)
-    cols2 = st.columns(8)
-    for i in range(8, 16):
-        with cols2[i-8]:
-            shape = SHAPES[i]
-            color = COLORS[i]
-            img = create_shape_image(shape, color, size=80, variant=variant)
+                if st.button("", key=f"shape_{i}", disabled=disabled):
+                    if shape not in user_selections:
+                        test_state['user_selections'].append(shape)
+                        log_event(trial_events.SELECT, shape)
+                        st.rerun()
+                show_shape(shape, color, size=80, variant=variant)
+    
+        # Zweite Reihe (restliche 8 Symbole)
+        cols2 = st.columns(8)
+        for i in range(8, 16):
+            with cols2[i-8]:
+                shape = SHAPES[i]
+                color = COLORS[i]
             
-            # Prüfen ob Symbol bereits ausgewählt wurde
-            disabled = shape in user_selections
+                # Prüfen ob Symbol bereits ausgewählt wurde
+                disabled = shape in user_selections
             
-            if st.button("", key=f"shape_{i}", disabled=disabled):
-                if shape not in user_selections:
-                    test_state['user_selections'].append(shape)
-                    st.rerun()
-            st.image(img, use_column_width=True)
+                if st.button("", key=f"shape_{i}", disabled=disabled):
+                    if shape not in user_selections:
+                        test_state['user_selections'].append(shape)
+                        log_event(trial_events.SELECT, shape)
+                        st.rerun()
+                show_shape(shape, color, size=80, variant=variant)
     
     # Ausgewählte Symbole anzeigen
     if user_selections:
@@ -435,32 +469,52 @@ def show_input_phase(size):
         selected_cols = st.columns(len(user_selections))
         for i, shape in enumerate(user_selections):
             with selected_cols[i]:
-                color = COLORS[SHAPES.index(shape)]
-                img = create_shape_image(shape, color, size=60, variant=variant)
-                st.image(img, use_column_width=True)
+                color = memory_engine.color_of(shape)
+                show_shape(shape, color, size=60, variant=variant)
                 st.markdown(f"**{i+1}.**")
     
     # Reset-Button
     if st.button("Auswahl zurücksetzen"):
         test_state['user_selections'] = []
+        log_event(trial_events.RESET)
         st.rerun()
     
     # Prüfen ob alle Symbole ausgewählt wurden
     if len(user_selections) == size:
-        # Test beenden
-        response_time = round(time.time() - test_state['response_start'], 3)
+        # Test beenden; wie in HIFLE als Bestätigung protokolliert
+        log_event(trial_events.CONFIRM)
+        response_time = memory_engine.response_time(test_state['response_start'], clock.now())
         test_state['response_times'].append(response_time)
         
         # Korrekte Antworten zählen
-        correct = sum(1 for a, b in zip(user_selections, test_state['sequence']) if a == b)
+        correct = memory_engine.score(user_selections, test_state['sequence'])
         test_state['correct_counts'].append(correct)
         
+        # Kurze Pause vor dem nächsten Test (show_feedback), ohne den Server-Thread warten zu lassen
+        test_state['feedback'] = memory_engine.feedback_state(
+            test_state['current_test'], correct, size, clock.now(), FEEDBACK_SECONDS
+        )
+        test_state['input_phase'] = False
+        
         # Zum nächsten Test
         test_state['current_test'] += 1
         test_state['test_started'] = False
         
-        # Kurze Pause dann nächster Test
-        time.sleep(0.5)
+        st.rerun()
+
+def show_feedback():
+    """Ergebnis des letzten Tests; weiter geht es per Fragment-Rerun statt sleep"""
+    feedback = st.session_state.test_state['feedback']
+    st.info(f"Test {feedback['test'] + 1} von {len(TEST_SIZES)} abgeschlossen.")
+    feedback_timer()
+
+@st.fragment(run_every=FEEDBACK_REFRESH_SECONDS)
+def feedback_timer():
+    # läuft alle FEEDBACK_REFRESH_SECONDS allein neu und stößt nach Ablauf einen kompletten Rerun an
+    test_state = st.session_state.test_state
+    feedback = test_state.get('feedback')
+    if feedback and memory_engine.feedback_remaining(feedback, clock.now()) <= 0:
+        test_state['feedback'] = None
         st.rerun()
 
 def show_questionnaire_intro():
@@ -555,24 +609,18 @@ def show_questionnaire_b():
         "7. Ich kann mir die angezeigte Reihenfolge für eine lange Zeit merken."
     ]
     
+    answers = {}
     with st.form("questionnaire_b"):
         for i, question in enumerate(questions, start=4):
             st.markdown(f"**{question}**")
             
-            # Skala 1-7
-            cols = st.columns(7)
+            # Skala 1-7 (st.button ist in einem Formular nicht erlaubt; der Wert zählt beim Abschicken)
             values = list(range(1, 8))
-            
-            for idx, col in enumerate(cols):
-                with col:
-                    value = values[idx]
-                    if st.button(str(value), key=f"q{i}_{value}", use_container_width=True):
-                        st.session_state.questionnaire_answers[i] = value
-            
-            # Aktuellen Wert anzeigen
             current_value = st.session_state.questionnaire_answers[i]
-            if current_value > 0:
-                st.info(f"Aktuelle Auswahl: {current_value}")
+            answers[i] = st.radio(
+                question, values, index=current_value - 1 if current_value > 0 else 3,
+                key=f"q{i}", horizontal=True, label_visibility="collapsed"
+            )
             
             st.divider()
         
@@ -588,6 +636,8 @@ def show_questionnaire_b():
         with col2:
             if st.form_submit_button("Fragebogen abschicken"):
                 # Antworten speichern
+                for i, value in answers.items():
+                    st.session_state.questionnaire_answers[i] = value
                 st.session_state.questionnaire_text = free_text
                 
                 # Ergebnisse speichern (Excel-Datei)
@@ -597,7 +647,46 @@ def show_questionnaire_b():
                 st.session_state.page = 'thank_you'
                 st.rerun()
 
+def results_record(participant_data, test_state, questionnaire=None):
+    """Datensatz für result_store aus Teilnehmerdaten und test_state"""
+    return result_store.session_record(
+        "ONLINER",
+        participant_data,
+        test_state['variant'],
+        trials=result_store.trial_rows(
+            TEST_SIZES, test_state['merk_times'], test_state['response_times'], test_state['correct_counts'],
+            *memory_engine.client_results(test_state['client_timing']),
+            events=trial_events.encode_all(test_state['event_logs'])
+        ),
+        questionnaire=questionnaire,
+    )
+
+def partial_record(state):
+    """Teil-Datensatz einer verlassenen Session mit den bis dahin absolvierten Tests (session_reaper.py)"""
+    test_state = state.get('test_state')
+    if not test_state or not test_state.get('variant'):
+        return None
+    return results_record(state.get('participant_data', {}), test_state)
+
 def save_results():
+    """Speichert Ergebnisse in Excel-Datei bzw. im konfigurierten Store (result_store.py)"""
+    if RESULTS_BACKEND == "excel":
+        return save_results_excel()
+    try:
+        record = results_record(
+            st.session_state.participant_data,
+            st.session_state.test_state,
+            questionnaire=result_store.questionnaire_row(
+                st.session_state.questionnaire_answers[:7], st.session_state.questionnaire_text
+            ),
+        )
+        result_writer.save(RESULTS_BACKEND, record)
+        return True
+    except Exception as e:
+        st.error(f"Fehler beim Speichern: {e}")
+        return False
+
+def save_results_excel():
     """Speichert Ergebnisse in Excel-Datei"""
     try:
         # Test-Ergebnisse
@@ -620,6 +709,10 @@ def save_results():
                 test_data[f"{prefix}_Reaktionszeit"] = [st.session_state.test_state['response_times'][i]]
             if i < len(st.session_state.test_state['correct_counts']):
                 test_data[f"{prefix}_Korrekt"] = [st.session_state.test_state['correct_counts'][i]]
+
+            # Klickprotokoll (trial_events), kodiert wie in JSONL und SQLite
+            if i < len(st.session_state.test_state['event_logs']):
+                test_data[f"{prefix}_Ereignisse"] = [trial_events.encode(st.session_state.test_state['event_logs'][i])]
         
         # Fragebogen-Daten
         q_data = {
@@ -700,6 +793,8 @@ def show_thank_you_page():
         # Session State zurücksetzen
         for key in list(st.session_state.keys()):
             del st.session_state[key]
+        # sonst lädt resume() über ?resume= wieder den abgeschlossenen Test
+        session_checkpoint.reset()
         st.rerun()
 
 # -----------------------
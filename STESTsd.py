@@ -1,37 +1,172 @@
 # streamlit_app.py
 import streamlit as st
-import pandas as pd
-import random
-import time
 import os
 from datetime import datetime
-from PIL import Image, ImageDraw
 import io
 import base64
+import lazy_imports
+import shape_cache
+import clock
+import memory_engine
+import shape_geometry
+import sprite_atlas
+import theme
+import result_store
+import result_writer
+import rerun_profiler
+import session_checkpoint
+import session_reaper
+import variant_assignment
+import trial_events
+import trial_plans
+from symbol_grid import symbol_grid
+
+# pandas und PIL erst bei Bedarf laden (siehe lazy_imports.py)
+pd = lazy_imports.lazy("pandas")
+Image = lazy_imports.lazy("PIL.Image")
+ImageDraw = lazy_imports.lazy("PIL.ImageDraw")
 
 # -----------------------
 # Konfiguration / Symbole
 # -----------------------
-SHAPES = [
-    "Kreis_f", "Quadrat_f", "Raute_f", "Stern_f",
-    "PfeilOben", "PfeilUnten", "PfeilLinks", "PfeilRechts",
-    "Dreieck_f", "Doppelpfeil_H", "Doppelpfeil_V",
-    "Kreis_h", "Quadrat_h", "Dreieck_h", "Stern_h", "Raute_h"
-]
+# Symbole, Farben und Testgrößen gemeinsam für alle Frontends (siehe memory_engine.py)
+SHAPES = memory_engine.SHAPES
+COLORS = memory_engine.COLORS
+TEST_SIZES = memory_engine.TEST_SIZES
+FEEDBACK_SECONDS = float(os.environ.get("MEMORYTEST_FEEDBACK_SECONDS", "1.5"))  # Ergebnisanzeige nach jedem Test
+FEEDBACK_REFRESH_SECONDS = 0.25  # Prüfintervall des Feedback-Fragments
+RENDER_MODE = os.environ.get("MEMORYTEST_RENDER_MODE", "image")  # "image" oder "sprites" (siehe sprite_atlas.py)
+INPUT_GRID = os.environ.get("MEMORYTEST_INPUT_GRID", "columns")  # "columns" oder "composite" (siehe symbol_grid.py)
 
-COLORS = [
-    "red", "blue", "green", "orange",
-    "purple", "brown", "cyan",
-    "magenta", "gold", "darkgreen", "darkblue",
-    "red", "blue", "gold", "magenta", "green"
+# Zustand, der bei jedem Phasenwechsel als Checkpoint gespeichert wird (siehe session_checkpoint.py)
+CHECKPOINT_KEYS = [
+    'page', 'participant_data', 'test_state', 'questionnaire_answers', 'questionnaire_text',
+    'q_responses_a', 'q_responses_b', 'saved_path'
 ]
-
-TEST_SIZES = [3, 4, 5, 6, 7]
-MEMORY_LIMIT_MS = 30000  # 30 Sekunden
+RESULTS_BACKEND = os.environ.get("MEMORYTEST_BACKEND", "excel")  # "excel", "jsonl" oder "sqlite" (siehe result_store.py)
 
 # UI styling
 ACCENT = "#4B7CDA"
 
+# Stylesheet der App (wird von theme.py minifiziert und statisch ausgeliefert)
+APP_CSS = f"""
+<style>
+.stButton>button {{
+    background-color: {ACCENT};
+    color: white;
+    font-weight: bold;
+    border-radius: 5px;
+    border: none;
+    padding: 10px 20px;
+}}
+.stButton>button:hover {{
+    background-color: #3a6bc5;
+}}
+.title {{
+    font-size: 32px;
+    font-weight: bold;
+    color: {ACCENT};
+    text-align: center;
+    margin-bottom: 30px;
+    padding-bottom: 15px;
+    border-bottom: 2px solid {ACCENT};
+}}
+.section {{
+    font-size: 24px;
+    font-weight: bold;
+    margin-top: 30px;
+    margin-bottom: 20px;
+    color: #333;
+}}
+.subsection {{
+    font-size: 20px;
+    font-weight: bold;
+    margin-top: 25px;
+    margin-bottom: 15px;
+    color: #444;
+}}
+.info-box {{
+    background-color: #f8f9fa;
+    padding: 25px;
+    border-radius: 10px;
+    margin-bottom: 25px;
+    border-left: 5px solid {ACCENT};
+    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+}}
+.question-box {{
+    background-color: white;
+    padding: 20px;
+    border-radius: 8px;
+    margin-bottom: 20px;
+    border: 1px solid #e0e0e0;
+    box-shadow: 0 1px 3px rgba(0,0,0,0.05);
+}}
+.shape-container {{
+    display: flex;
+    justify-content: center;
+    align-items: center;
+    margin: 10px;
+    padding: 15px;
+    border-radius: 10px;
+    border: 2px solid transparent;
+    transition: all 0.3s ease;
+}}
+.shape-container:hover {{
+    border-color: {ACCENT};
+    background-color: #f0f5ff;
+}}
+.shape-container.selected {{
+    border-color: {ACCENT};
+    background-color: #e6f0ff;
+}}
+.timer-box {{
+    background-color: #e8f4f8;
+    padding: 15px;
+    border-radius: 8px;
+    margin: 20px 0;
+    text-align: center;
+    border: 2px solid #b8d8e8;
+}}
+.radio-container {{
+    display: flex;
+    justify-content: center;
+    align-items: center;
+    margin: 15px 0;
+    padding: 10px;
+}}
+.radio-label {{
+    font-size: 14px;
+    color: #666;
+    text-align: center;
+    margin: 0 10px;
+    min-width: 100px;
+}}
+.stTextArea textarea {{
+    border-radius: 8px;
+    border: 2px solid #e0e0e0;
+}}
+.stTextArea textarea:focus {{
+    border-color: {ACCENT};
+    box-shadow: 0 0 0 1px {ACCENT};
+}}
+.stTextInput input {{
+    border-radius: 8px;
+    border: 2px solid #e0e0e0;
+}}
+.stTextInput input:focus {{
+    border-color: {ACCENT};
+    box-shadow: 0 0 0 1px {ACCENT};
+}}
+.results-table {{
+    background-color: white;
+    border-radius: 10px;
+    padding: 20px;
+    box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+    margin: 20px 0;
+}}
+</style>
+"""
+
 # -----------------------
 # Hilfsfunktionen
 # -----------------------
@@ -58,215 +193,85 @@ def create_shape_image(shape, color, size=80, variant="color"):
     fill_color = (255, 255, 255) if is_hollow else outline_color
     line_width = 4 if is_hollow else 2
     
-    # Koordinaten skalieren
-    def scale(coords):
-        return [coord * size / 100 for coord in coords]
-    
-    # --- Kreis ---
-    if shape.startswith("Kreis"):
-        bbox = [size*0.1, size*0.1, size*0.9, size*0.9]
-        draw.ellipse(bbox, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Quadrat ---
-    elif shape.startswith("Quadrat"):
-        bbox = [size*0.12, size*0.12, size*0.88, size*0.88]
-        draw.rectangle(bbox, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Raute ---
-    elif shape.startswith("Raute"):
-        coords = scale([50, 8, 88, 50, 50, 92, 12, 50])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Stern ---
-    elif shape.startswith("Stern"):
-        coords = scale([50, 12, 58, 34, 80, 34, 62, 50, 68, 74, 50, 60, 32, 74, 38, 50, 20, 34, 42, 34])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Dreieck ---
-    elif shape.startswith("Dreieck"):
-        coords = scale([50, 10, 90, 80, 10, 80])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Pfeil Oben ---
-    elif shape == "PfeilOben":
-        coords = scale([50, 10, 78, 50, 62, 50, 62, 90, 38, 90, 38, 50, 22, 50])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Pfeil Unten ---
-    elif shape == "PfeilUnten":
-        coords = scale([50, 90, 78, 50, 62, 50, 62, 10, 38, 10, 38, 50, 22, 50])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Pfeil Links ---
-    elif shape == "PfeilLinks":
-        coords = scale([10, 50, 50, 10, 50, 30, 90, 30, 90, 70, 50, 70, 50, 90])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Pfeil Rechts ---
-    elif shape == "PfeilRechts":
-        coords = scale([90, 50, 50, 10, 50, 30, 10, 30, 10, 70, 50, 70, 50, 90])
-        draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
-    
-    # --- Doppelpfeil horizontal ---
-    elif shape == "Doppelpfeil_H":
-        draw.line(scale([18, 50, 82, 50]), fill=outline_color, width=line_width)
-        draw.polygon(scale([18, 50, 30, 40, 30, 60]), fill=outline_color, outline=outline_color)
-        draw.polygon(scale([82, 50, 70, 40, 70, 60]), fill=outline_color, outline=outline_color)
-    
-    # --- Doppelpfeil vertikal ---
-    elif shape == "Doppelpfeil_V":
-        draw.line(scale([50, 18, 50, 82]), fill=outline_color, width=line_width)
-        draw.polygon(scale([50, 18, 40, 30, 60, 30]), fill=outline_color, outline=outline_color)
-        draw.polygon(scale([50, 82, 40, 70, 60, 70]), fill=outline_color, outline=outline_color)
-    
-    # Fallback zu Kreis
-    else:
-        bbox = [size*0.1, size*0.1, size*0.9, size*0.9]
-        draw.ellipse(bbox, fill=fill_color, outline=outline_color, width=line_width)
+    # Geometrie aus der gemeinsamen Tabelle, je Größe skaliert und gecacht
+    for kind, coords in shape_geometry.scaled(shape, size):
+        if kind == "ellipse":
+            draw.ellipse(coords, fill=fill_color, outline=outline_color, width=line_width)
+        elif kind == "rect":
+            draw.rectangle(coords, fill=fill_color, outline=outline_color, width=line_width)
+        elif kind == "polygon":
+            draw.polygon(coords, fill=fill_color, outline=outline_color, width=line_width)
+        elif kind == "line":
+            draw.line(coords, fill=outline_color, width=line_width)
+        elif kind == "head":
+            draw.polygon(coords, fill=outline_color, outline=outline_color)
     
     return img
 
+def cached_shape_png(shape, color, size=80, variant="color", selected=False):
+    """Liefert das Symbol als PNG-Bytes aus dem prozessweiten Bild-Cache"""
+    cache = shape_cache.get_cache("STESTsd", create_shape_image)
+    return cache.get_png(shape, color, size=size, variant=variant, selected=selected)
+
+def warm_shape_cache():
+    """Zeichnet die Symbole des Eingaberasters vorab in den Bild-Cache"""
+    for variant in ("color", "bw"):
+        for shape, color in zip(SHAPES, COLORS):
+            cached_shape_png(shape, color, size=80, variant=variant)
+
+def show_shape(shape, color, size=80, variant="color", selected=False):
+    """Zeigt ein Symbol an: im Sprite-Modus als Verweis in den Atlas, sonst als Bild aus dem Cache"""
+    if RENDER_MODE == "sprites" and sprite_atlas.available():
+        state = "selected" if selected else "normal"
+        st.markdown(sprite_atlas.sprite_html(shape, variant, state, size), unsafe_allow_html=True)
+    else:
+        st.image(cached_shape_png(shape, color, size=size, variant=variant, selected=selected), use_column_width=True)
+
 # -----------------------
 # Streamlit App
 # -----------------------
 def main():
-    # CSS für besseres Aussehen
-    st.markdown(f"""
-    <style>
-    .stButton>button {{
-        background-color: {ACCENT};
-        color: white;
-        font-weight: bold;
-        border-radius: 5px;
-        border: none;
-        padding: 10px 20px;
-    }}
-    .stButton>button:hover {{
-        background-color: #3a6bc5;
-    }}
-    .title {{
-        font-size: 32px;
-        font-weight: bold;
-        color: {ACCENT};
-        text-align: center;
-        margin-bottom: 30px;
-        padding-bottom: 15px;
-        border-bottom: 2px solid {ACCENT};
-    }}
-    .section {{
-        font-size: 24px;
-        font-weight: bold;
-        margin-top: 30px;
-        margin-bottom: 20px;
-        color: #333;
-    }}
-    .subsection {{
-        font-size: 20px;
-        font-weight: bold;
-        margin-top: 25px;
-        margin-bottom: 15px;
-        color: #444;
-    }}
-    .info-box {{
-        background-color: #f8f9fa;
-        padding: 25px;
-        border-radius: 10px;
-        margin-bottom: 25px;
-        border-left: 5px solid {ACCENT};
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }}
-    .question-box {{
-        background-color: white;
-        padding: 20px;
-        border-radius: 8px;
-        margin-bottom: 20px;
-        border: 1px solid #e0e0e0;
-        box-shadow: 0 1px 3px rgba(0,0,0,0.05);
-    }}
-    .shape-container {{
-        display: flex;
-        justify-content: center;
-        align-items: center;
-        margin: 10px;
-        padding: 15px;
-        border-radius: 10px;
-        border: 2px solid transparent;
-        transition: all 0.3s ease;
-    }}
-    .shape-container:hover {{
-        border-color: {ACCENT};
-        background-color: #f0f5ff;
-    }}
-    .shape-container.selected {{
-        border-color: {ACCENT};
-        background-color: #e6f0ff;
-    }}
-    .timer-box {{
-        background-color: #e8f4f8;
-        padding: 15px;
-        border-radius: 8px;
-        margin: 20px 0;
-        text-align: center;
-        border: 2px solid #b8d8e8;
-    }}
-    .radio-container {{
-        display: flex;
-        justify-content: center;
-        align-items: center;
-        margin: 15px 0;
-        padding: 10px;
-    }}
-    .radio-label {{
-        font-size: 14px;
-        color: #666;
-        text-align: center;
-        margin: 0 10px;
-        min-width: 100px;
-    }}
-    .stTextArea textarea {{
-        border-radius: 8px;
-        border: 2px solid #e0e0e0;
-    }}
-    .stTextArea textarea:focus {{
-        border-color: {ACCENT};
-        box-shadow: 0 0 0 1px {ACCENT};
-    }}
-    .stTextInput input {{
-        border-radius: 8px;
-        border: 2px solid #e0e0e0;
-    }}
-    .stTextInput input:focus {{
-        border-color: {ACCENT};
-        box-shadow: 0 0 0 1px {ACCENT};
-    }}
-    .results-table {{
-        background-color: white;
-        border-radius: 10px;
-        padding: 20px;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-        margin: 20px 0;
-    }}
-    </style>
-    """, unsafe_allow_html=True)
+    # CSS für besseres Aussehen: einmal als statische Datei kompiliert, pro Rerun nur ein <link> (siehe theme.py)
+    st.markdown(theme.stylesheet_tag("STESTsd", APP_CSS), unsafe_allow_html=True)
+    
+    # Sprite-Stylesheet (nur ein kleiner <link>, der Atlas wird vom Browser gecacht)
+    if RENDER_MODE == "sprites" and sprite_atlas.available():
+        st.markdown(sprite_atlas.stylesheet_link(), unsafe_allow_html=True)
+    
+    # nach einem Reload den Stand zum Resume-Token in der URL wiederherstellen
+    session_checkpoint.resume("STESTsd")
     
     # Session State initialisieren
     init_session_state()
     
+    # PIL, pandas und das Eingaberaster im Hintergrund vorladen (einmal je Serverprozess)
+    lazy_imports.warm_up("STESTsd", ["PIL.Image", "PIL.ImageDraw", "pandas"], then=warm_shape_cache)
+    
+    # Phasenwechsel seit dem letzten Lauf? Dann Checkpoint für einen Reload schreiben
+    session_checkpoint.save_on_transition(
+        "STESTsd", CHECKPOINT_KEYS, session_checkpoint.test_marker(st.session_state.page, st.session_state.test_state)
+    )
+    
+    # Größe und Leerlauf dieser Session beobachten; verlassene Tests räumt session_reaper auf
+    session_reaper.track("STESTsd", CHECKPOINT_KEYS, rerun_profiler.test_phase(st.session_state.test_state), partial_record)
+    
     # Seitensteuerung
-    if st.session_state.page == 'start':
-        show_start_page()
-    elif st.session_state.page == 'instructions':
-        show_instructions_page()
-    elif st.session_state.page == 'test':
-        show_test_page()
-    elif st.session_state.page == 'questionnaire_intro':
-        show_questionnaire_intro()
-    elif st.session_state.page == 'questionnaire_a':
-        show_questionnaire_a()
-    elif st.session_state.page == 'questionnaire_b':
-        show_questionnaire_b()
-    elif st.session_state.page == 'thank_you':
-        show_thank_you_page()
+    # mit MEMORYTEST_PROFILE=1 Laufzeit, Elemente und Bildbytes je Seite protokollieren (rerun_profiler.py)
+    with rerun_profiler.profile_rerun("STESTsd", st.session_state.page, rerun_profiler.test_phase(st.session_state.test_state)):
+        if st.session_state.page == 'start':
+            show_start_page()
+        elif st.session_state.page == 'instructions':
+            show_instructions_page()
+        elif st.session_state.page == 'test':
+            show_test_page()
+        elif st.session_state.page == 'questionnaire_intro':
+            show_questionnaire_intro()
+        elif st.session_state.page == 'questionnaire_a':
+            show_questionnaire_a()
+        elif st.session_state.page == 'questionnaire_b':
+            show_questionnaire_b()
+        elif st.session_state.page == 'thank_you':
+            show_thank_you_page()
 
 def init_session_state():
     """Initialisiert den Session State"""
@@ -277,6 +282,7 @@ def init_session_state():
     if 'test_state' not in st.session_state:
         st.session_state.test_state = {
             'variant': None,
+            'plan': None,
             'current_test': 0,
             'sequence': [],
             'user_selections': [],
@@ -284,6 +290,8 @@ def init_session_state():
             'merk_times': [],
             'response_times': [],
             'correct_counts': [],
+            'client_timing': [],
+            'event_logs': [],
             'test_started': False,
             'memory_phase': False,
             'input_phase': False,
@@ -379,12 +387,18 @@ def show_start_page():
                     'gender': gender
                 }
                 
-                # Zufällige Testvariante wählen
-                st.session_state.test_state['variant'] = random.choice(["color", "bw"])
+                # Testvariante blockweise je Altersband und Geschlecht zuteilen (variant_assignment.py)
+                st.session_state.test_state['variant'] = variant_assignment.assign_variant(
+                    session_checkpoint.session_token(), participant_id, int(age), gender)
+                # positionsbalancierte Sequenzen aller Tests (trial_plans.py)
+                st.session_state.test_state['plan'] = trial_plans.assign_plan(
+                    session_checkpoint.session_token(), participant_id)
                 st.session_state.test_state['current_test'] = 0
                 st.session_state.test_state['merk_times'] = []
                 st.session_state.test_state['response_times'] = []
                 st.session_state.test_state['correct_counts'] = []
+                st.session_state.test_state['client_timing'] = []
+                st.session_state.test_state['event_logs'] = []
                 st.session_state.test_state['test_started'] = False
                 
                 # Zur nächsten Seite
@@ -424,6 +438,11 @@ def show_test_page():
     test_state = st.session_state.test_state
     current_test = test_state['current_test']
     
+    # Rückmeldung zum letzten Test, bis die Anzeigedauer um ist
+    if test_state.get('feedback'):
+        show_feedback()
+        return
+    
     # Prüfen ob alle Tests abgeschlossen
     if current_test >= len(TEST_SIZES):
         st.session_state.page = 'questionnaire_intro'
@@ -457,16 +476,15 @@ def show_test_page():
 def start_test():
     test_state = st.session_state.test_state
     current_test = test_state['current_test']
-    size = TEST_SIZES[current_test]
     
-    # Neue Sequenz generieren
-    test_state['sequence'] = random.sample(SHAPES, size)
+    # Sequenz aus dem Testplan der Teilnahme (trial_plans.py)
+    test_state['sequence'] = trial_plans.sequence(test_state.get('plan'), current_test)
     test_state['user_selections'] = []
-    test_state['memory_start'] = time.time()
+    test_state['memory_start'] = clock.now()
     test_state['memory_phase'] = True
     test_state['input_phase'] = False
     test_state['test_started'] = True
-    test_state['timer_start'] = time.time()
+    test_state['timer_start'] = clock.now()
     
     st.rerun()
 
@@ -479,8 +497,8 @@ def show_memory_phase(size):
     
     # Timer-Anzeige
     if 'timer_start' in test_state:
-        elapsed = time.time() - test_state['timer_start']
-        remaining = max(0, MEMORY_LIMIT_MS/1000 - elapsed)
+        elapsed = clock.now() - test_state['timer_start']
+        remaining = max(0, memory_engine.MEMORY_LIMIT_SECONDS - elapsed)
         
         st.markdown(f"""
         <div class="timer-box">
@@ -489,7 +507,7 @@ def show_memory_phase(size):
         """, unsafe_allow_html=True)
         
         # Fortschrittsbalken
-        progress = min(1.0, elapsed / (MEMORY_LIMIT_MS/1000))
+        progress = min(1.0, elapsed / memory_engine.MEMORY_LIMIT_SECONDS)
         st.progress(progress)
     
     # Symbole anzeigen mit schöner Darstellung
@@ -498,9 +516,8 @@ def show_memory_phase(size):
     cols = st.columns(len(sequence))
     for i, shape in enumerate(sequence):
         with cols[i]:
-            color = COLORS[SHAPES.index(shape)]
-            img = create_shape_image(shape, color, size=120, variant=variant)
-            st.image(img, use_column_width=True)
+            color = memory_engine.color_of(shape)
+            show_shape(shape, color, size=120, variant=variant)
             st.markdown(f"<div style='text-align: center; font-weight: bold; margin-top: 5px;'>Position {i+1}</div>", unsafe_allow_html=True)
     
     st.markdown("</div>", unsafe_allow_html=True)
@@ -513,8 +530,8 @@ def show_memory_phase(size):
     
     # Automatischer Übergang nach 30 Sekunden
     if 'timer_start' in test_state:
-        elapsed = time.time() - test_state['timer_start']
-        if elapsed >= MEMORY_LIMIT_MS/1000:
+        elapsed = clock.now() - test_state['timer_start']
+        if elapsed >= memory_engine.MEMORY_LIMIT_SECONDS:
             end_memory_phase()
 
 def end_memory_phase():
@@ -522,16 +539,25 @@ def end_memory_phase():
     
     # Merkzeit berechnen und speichern
     if 'timer_start' in test_state:
-        merk_time = round(min(time.time() - test_state['timer_start'], MEMORY_LIMIT_MS/1000), 3)
+        merk_time = memory_engine.merk_time(test_state['timer_start'], clock.now())
         test_state['merk_times'].append(merk_time)
     
     # Zur Eingabephase wechseln
     test_state['memory_phase'] = False
     test_state['input_phase'] = True
-    test_state['response_start'] = time.time()
+    test_state['response_start'] = clock.now()
+    trial_events.start(test_state['event_logs'], test_state['current_test'], test_state['response_start'])
     
     st.rerun()
 
+def log_event(kind, shape=None):
+    # Klick ins Ereignisprotokoll des laufenden Tests (trial_events)
+    test_state = st.session_state.test_state
+    logs = test_state['event_logs']
+    if test_state['current_test'] < len(logs):
+        shape_index = memory_engine.SHAPE_INDEX[shape] if shape else 0
+        trial_events.record(logs[test_state['current_test']], kind, clock.now(), shape_index)
+
 def show_input_phase(size):
     test_state = st.session_state.test_state
     variant = test_state['variant']
@@ -541,79 +567,94 @@ def show_input_phase(size):
     
     # Timer für Eingabephase
     if 'response_start' in test_state:
-        elapsed = time.time() - test_state['response_start']
+        elapsed = clock.now() - test_state['response_start']
         st.markdown(f"<div style='text-align: center; color: #666; margin: 10px 0;'>Eingabezeit: {elapsed:.1f} Sekunden</div>", unsafe_allow_html=True)
     
     # Alle verfügbaren Symbole anzeigen (in 2 Reihen)
     st.markdown("### Verfügbare Symbole")
     
-    # Erste Reihe (erste 8 Symbole)
-    cols1 = st.columns(8)
-    for i in range(8):
-        with cols1[i]:
-            shape = SHAPES[i]
-            color = COLORS[i]
-            img = create_shape_image(shape, color, size=80, variant=variant)
+    if INPUT_GRID == "composite":
+        # ganzes Raster als ein Element; der Klick kommt als Symbol-Index zurück
+        index = symbol_grid(
+            SHAPES, COLORS, variant, user_selections,
+            f"{test_state['current_test']}-{test_state.get('response_start')}",
+            key="symbol_grid",
+            timing=memory_engine.client_timing(test_state['client_timing'], test_state['current_test'])
+        )
+        if index is not None:
+            shape = SHAPES[index]
+            if shape not in user_selections and len(user_selections) < size:
+                test_state['user_selections'].append(shape)
+                log_event(trial_events.SELECT, shape)
+                st.rerun()
+    else:
+        # Erste Reihe (erste 8 Symbole)
+        cols1 = st.columns(8)
+        for i in range(8):
+            with cols1[i]:
+                shape = SHAPES[i]
+                color = COLORS[i]
             
-            # Prüfen ob Symbol bereits ausgewählt wurde
-            is_selected = shape in user_selections
+                # Prüfen ob Symbol bereits ausgewählt wurde
+                is_selected = shape in user_selections
             
-            # Container für Symbol mit Hover-Effekt
-            container = st.container()
-            with container:
-                if is_selected:
-                    st.markdown(f"<div class='shape-container selected'>", unsafe_allow_html=True)
-                else:
-                    st.markdown(f"<div class='shape-container'>", unsafe_allow_html=True)
+                # Container für Symbol mit Hover-Effekt
+                container = st.container()
+                with container:
+                    if is_selected:
+                        st.markdown(f"<div class='shape-container selected'>", unsafe_allow_html=True)
+                    else:
+                        st.markdown(f"<div class='shape-container'>", unsafe_allow_html=True)
                 
-                # Button zum Auswählen
-                if not is_selected:
-                    if st.button("", key=f"shape_{i}", help=f"Symbol auswählen: {shape}"):
-                        if shape not in user_selections and len(user_selections) < size:
-                            test_state['user_selections'].append(shape)
-                            st.rerun()
+                    # Button zum Auswählen
+                    if not is_selected:
+                        if st.button("", key=f"shape_{i}", help=f"Symbol auswählen: {shape}"):
+                            if shape not in user_selections and len(user_selections) < size:
+                                test_state['user_selections'].append(shape)
+                                log_event(trial_events.SELECT, shape)
+                                st.rerun()
                 
-                # Symbolbild anzeigen
-                st.image(img, use_column_width=True)
+                    # Symbolbild anzeigen
+                    show_shape(shape, color, size=80, variant=variant)
                 
-                # Symbolname (nur für Debug)
-                # st.markdown(f"<div style='text-align: center; font-size: 10px; color: #888;'>{shape}</div>", unsafe_allow_html=True)
+                    # Symbolname (nur für Debug)
+                    # st.markdown(f"<div style='text-align: center; font-size: 10px; color: #888;'>{shape}</div>", unsafe_allow_html=True)
                 
-                st.markdown("</div>", unsafe_allow_html=True)
-    
-    # Zweite Reihe (restliche 8 Symbole)
-    cols2 = st.columns(8)
-    for i in range(8, 16):
-        with cols2[i-8]:
-            shape = SHAPES[i]
-            color = COLORS[i]
-            img = create_shape_image(shape, color, size=80, variant=variant)
+                    st.markdown("</div>", unsafe_allow_html=True)
+    
+        # Zweite Reihe (restliche 8 Symbole)
+        cols2 = st.columns(8)
+        for i in range(8, 16):
+            with cols2[i-8]:
+                shape = SHAPES[i]
+                color = COLORS[i]
             
-            # Prüfen ob Symbol bereits ausgewählt wurde
-            is_selected = shape in user_selections
+                # Prüfen ob Symbol bereits ausgewählt wurde
+                is_selected = shape in user_selections
             
-            # Container für Symbol mit Hover-Effekt
-            container = st.container()
-            with container:
-                if is_selected:
-                    st.markdown(f"<div class='shape-container selected'>", unsafe_allow_html=True)
-                else:
-                    st.markdown(f"<div class='shape-container'>", unsafe_allow_html=True)
+                # Container für Symbol mit Hover-Effekt
+                container = st.container()
+                with container:
+                    if is_selected:
+                        st.markdown(f"<div class='shape-container selected'>", unsafe_allow_html=True)
+                    else:
+                        st.markdown(f"<div class='shape-container'>", unsafe_allow_html=True)
                 
-                # Button zum Auswählen
-                if not is_selected:
-                    if st.button("", key=f"shape_{i}", help=f"Symbol auswählen: {shape}"):
-                        if shape not in user_selections and len(user_selections) < size:
-                            test_state['user_selections'].append(shape)
-                            st.rerun()
+                    # Button zum Auswählen
+                    if not is_selected:
+                        if st.button("", key=f"shape_{i}", help=f"Symbol auswählen: {shape}"):
+                            if shape not in user_selections and len(user_selections) < size:
+                                test_state['user_selections'].append(shape)
+                                log_event(trial_events.SELECT, shape)
+                                st.rerun()
                 
-                # Symbolbild anzeigen
-                st.image(img, use_column_width=True)
+                    # Symbolbild anzeigen
+                    show_shape(shape, color, size=80, variant=variant)
                 
-                # Symbolname (nur für Debug)
-                # st.markdown(f"<div style='text-align: center; font-size: 10px; color: #888;'>{shape}</div>", unsafe_allow_html=True)
+                    # Symbolname (nur für Debug)
+                    # st.markdown(f"<div style='text-align: center; font-size: 10px; color: #888;'>{shape}</div>", unsafe_allow_html=True)
                 
-                st.markdown("</div>", unsafe_allow_html=True)
+                    st.markdown("</div>", unsafe_allow_html=True)
     
     # Ausgewählte Symbole anzeigen
     if user_selections:
@@ -622,12 +663,11 @@ def show_input_phase(size):
         selected_cols = st.columns(len(user_selections))
         for i, shape in enumerate(user_selections):
             with selected_cols[i]:
-                color = COLORS[SHAPES.index(shape)]
-                img = create_shape_image(shape, color, size=80, variant=variant)
+                color = memory_engine.color_of(shape)
                 
                 st.markdown(f"<div style='text-align: center;'>", unsafe_allow_html=True)
                 st.markdown(f"<div style='font-weight: bold; color: {ACCENT}; font-size: 18px;'>Position {i+1}</div>", unsafe_allow_html=True)
-                st.image(img, use_column_width=True)
+                show_shape(shape, color, size=80, variant=variant)
                 
                 # Korrekte Position prüfen
                 if i < len(test_state['sequence']):
@@ -644,12 +684,14 @@ def show_input_phase(size):
     with col1:
         if st.button("🔄 Auswahl zurücksetzen"):
             test_state['user_selections'] = []
+            log_event(trial_events.RESET)
             st.rerun()
     
     with col2:
         if st.button("⏭️ Test überspringen"):
             # Leere Auswahl für übersprungenen Test
             test_state['user_selections'] = []
+            log_event(trial_events.SKIP)
             finish_test()
     
     with col3:
@@ -659,6 +701,7 @@ def show_input_phase(size):
     
     # Automatische Beendigung wenn alle Symbole ausgewählt
     if len(user_selections) == size:
+        log_event(trial_events.CONFIRM)
         finish_test()
 
 def finish_test():
@@ -666,30 +709,44 @@ def finish_test():
     
     # Reaktionszeit speichern
     if 'response_start' in test_state:
-        response_time = round(time.time() - test_state['response_start'], 3)
+        response_time = memory_engine.response_time(test_state['response_start'], clock.now())
         test_state['response_times'].append(response_time)
     
     # Korrekte Antworten zählen
-    correct = 0
-    for i in range(min(len(test_state['user_selections']), len(test_state['sequence']))):
-        if test_state['user_selections'][i] == test_state['sequence'][i]:
-            correct += 1
+    correct = memory_engine.score(test_state['user_selections'], test_state['sequence'])
     
     test_state['correct_counts'].append(correct)
     
+    # Erfolgsmeldung für FEEDBACK_SECONDS anzeigen (show_feedback); der Server-Thread wartet dabei nicht
+    test_state['feedback'] = memory_engine.feedback_state(
+        test_state['current_test'], correct, len(test_state['sequence']), clock.now(), FEEDBACK_SECONDS
+    )
+    test_state['input_phase'] = False
+    
     # Zum nächsten Test
     test_state['current_test'] += 1
     test_state['test_started'] = False
     
-    # Erfolgsmeldung anzeigen
-    if correct == len(test_state['sequence']):
+    st.rerun()
+
+def show_feedback():
+    """Ergebnis des letzten Tests; weiter geht es per Fragment-Rerun statt sleep"""
+    feedback = st.session_state.test_state['feedback']
+    correct, size = feedback['correct'], feedback['size']
+    if correct == size:
         st.success(f"🎉 Perfekt! Alle {correct} Symbole korrekt!")
     else:
-        st.info(f"Ergebnis: {correct} von {len(test_state['sequence'])} Symbolen korrekt")
-    
-    # Kurze Pause dann nächster Test
-    time.sleep(1.5)
-    st.rerun()
+        st.info(f"Ergebnis: {correct} von {size} Symbolen korrekt")
+    feedback_timer()
+
+@st.fragment(run_every=FEEDBACK_REFRESH_SECONDS)
+def feedback_timer():
+    # läuft alle FEEDBACK_REFRESH_SECONDS allein neu und stößt nach Ablauf einen kompletten Rerun an
+    test_state = st.session_state.test_state
+    feedback = test_state.get('feedback')
+    if feedback and memory_engine.feedback_remaining(feedback, clock.now()) <= 0:
+        test_state['feedback'] = None
+        st.rerun()
 
 def show_questionnaire_intro():
     st.markdown('<div class="title">Selbsteinschätzung (Fragebogen)</div>', unsafe_allow_html=True)
@@ -859,7 +916,46 @@ def show_questionnaire_b():
             st.session_state.page = 'thank_you'
             st.rerun()
 
+def results_record(participant_data, test_state, questionnaire=None):
+    """Datensatz für result_store aus Teilnehmerdaten und test_state"""
+    return result_store.session_record(
+        "STESTsd",
+        participant_data,
+        test_state['variant'],
+        trials=result_store.trial_rows(
+            TEST_SIZES, test_state['merk_times'], test_state['response_times'], test_state['correct_counts'],
+            *memory_engine.client_results(test_state['client_timing']),
+            events=trial_events.encode_all(test_state['event_logs'])
+        ),
+        questionnaire=questionnaire,
+    )
+
+def partial_record(state):
+    """Teil-Datensatz einer verlassenen Session mit den bis dahin absolvierten Tests (session_reaper.py)"""
+    test_state = state.get('test_state')
+    if not test_state or not test_state.get('variant'):
+        return None
+    return results_record(state.get('participant_data', {}), test_state)
+
 def save_results():
+    """Speichert Ergebnisse in Excel-Datei bzw. im konfigurierten Store (result_store.py)"""
+    if RESULTS_BACKEND == "excel":
+        return save_results_excel()
+    try:
+        record = results_record(
+            st.session_state.participant_data,
+            st.session_state.test_state,
+            questionnaire=result_store.questionnaire_row(
+                st.session_state.questionnaire_answers[:7], st.session_state.questionnaire_text
+            ),
+        )
+        st.session_state.saved_path = result_writer.save(RESULTS_BACKEND, record)
+        return True
+    except Exception as e:
+        st.error(f"Fehler beim Speichern: {e}")
+        return False
+
+def save_results_excel():
     """Speichert Ergebnisse in Excel-Datei"""
     try:
         # Test-Ergebnisse
@@ -882,6 +978,10 @@ def save_results():
                 test_data[f"Test_{i+1}_Reaktionszeit"] = [st.session_state.test_state['response_times'][i]]
             if i < len(st.session_state.test_state['correct_counts']):
                 test_data[f"Test_{i+1}_Korrekt"] = [st.session_state.test_state['correct_counts'][i]]
+
+            # Klickprotokoll (trial_events), kodiert wie in JSONL und SQLite
+            if i < len(st.session_state.test_state['event_logs']):
+                test_data[f"Test_{i+1}_Ereignisse"] = [trial_events.encode(st.session_state.test_state['event_logs'][i])]
         
         # Fragebogen-Daten
         q_data = {
@@ -1039,6 +1139,8 @@ def show_thank_you_page():
             # Session State zurücksetzen
             for key in list(st.session_state.keys()):
                 del st.session_state[key]
+            # sonst lädt resume() über ?resume= wieder den abgeschlossenen Test
+            session_checkpoint.reset()
             st.rerun()
 
 # -----------------------
@@ -0,0 +1,443 @@
+# benchmarks.py
+"""Micro-Benchmarks für Rendering, Auswertung und Speicherung.
+
+Misst die heißen Pfade der Apps und vergleicht mit einer gespeicherten
+Baseline, damit Verschlechterungen vor dem nächsten Deployment des
+Studienservers auffallen:
+
+    python benchmarks.py --save-baseline             # Baseline anlegen
+    python benchmarks.py                             # gegen Baseline vergleichen
+    python benchmarks.py --filter create_shape_image --json out.json
+
+Gemessen werden create_shape_image (90/100/140, mit und ohne Hervorhebung),
+image_to_base64, svg_for_shape, MemoryTestApp._draw_shape (Offscreen-Canvas,
+braucht ein Display), die Auswertung in finish_test sowie append_csv und
+save_results (excel/jsonl/sqlite) bei 10, 1.000 und 10.000 vorhandenen Zeilen.
+Fälle, deren Abhängigkeiten fehlen, werden als übersprungen gemeldet.
+
+Rückgabewert 1, wenn ein Fall um mehr als --threshold (Median) langsamer ist.
+"""
+import argparse
+import ast
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(APP_DIR, "benchmark_baseline.json")
+ROW_COUNTS = [10, 1000, 10000]
+REPEAT = 5
+MIN_TIME = 0.2  # Sekunden je Wiederholung (kleine Fälle laufen entsprechend oft)
+THRESHOLD = 0.20
+
+_cases = []
+
+
+class Skip(Exception):
+    pass
+
+
+def case(name):
+    """Registriert einen Benchmark; die Funktion liefert (call, cleanup) oder call"""
+    def register(factory):
+        _cases.append((name, factory))
+        return factory
+    return register
+
+
+# -----------------------
+# Hilfen
+# -----------------------
+def _import(module):
+    try:
+        return __import__(module)
+    except ImportError as e:
+        raise Skip(str(e))
+
+
+def _script_function(filename, name, namespace):
+    """Lädt eine einzelne Funktion aus einem Streamlit-Skript, ohne das Skript auszuführen"""
+    with open(os.path.join(APP_DIR, filename), encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename)
+    node = next(n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name == name)
+    code = compile(ast.Module(body=[node], type_ignores=[]), filename, "exec")
+    exec(code, namespace)
+    return namespace[name]
+
+
+def _hifle():
+    _import("PIL")
+    _import("streamlit")
+    import HIFLE
+    return HIFLE
+
+
+def measure(call, repeat=REPEAT, min_time=MIN_TIME):
+    """Zeit je Aufruf in Mikrosekunden (Schleifenzahl wird wie bei timeit kalibriert)"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            call()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            call()
+        timings.append((time.perf_counter() - start) / number)
+    return {
+        "median_us": round(statistics.median(timings) * 1e6, 3),
+        "min_us": round(min(timings) * 1e6, 3),
+        "mean_us": round(statistics.fmean(timings) * 1e6, 3),
+        "stdev_us": round(statistics.stdev(timings) * 1e6, 3) if len(timings) > 1 else 0.0,
+        "loops": number,
+        "repeat": repeat,
+    }
+
+
+# -----------------------
+# Rendering
+# -----------------------
+def _register_shape_images():
+    for size in (90, 100, 140):
+        for selected in (False, True):
+            def factory(size=size, selected=selected):
+                HIFLE = _hifle()
+                return lambda: HIFLE.create_shape_image("Stern_h", "gold", size=size, selected=selected)
+            case(f"create_shape_image[size={size},selected={selected}]")(factory)
+
+
+_register_shape_images()
+
+
+@case("image_to_base64[size=140]")
+def _image_to_base64():
+    HIFLE = _hifle()
+    img = HIFLE.create_shape_image("Stern_f", "magenta", size=140)
+    return lambda: HIFLE.image_to_base64(img)
+
+
+@case("svg_for_shape[stream]")
+def _svg_for_shape():
+    import shape_geometry
+    svg_for_shape = _script_function("stream.py", "svg_for_shape", {"shape_geometry": shape_geometry})
+    return lambda: svg_for_shape("Doppelpfeil_H", size_px=80, fill="red", stroke="red", gray=False)
+
+
+@case("MemoryTestApp._draw_shape[tk]")
+def _draw_shape():
+    tk = _import("tkinter")
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        raise Skip(f"kein Display: {e}")
+    root.withdraw()
+    import finaler_test_studie
+    canvas = tk.Canvas(root, width=100, height=100)
+    shapes = finaler_test_studie.SHAPES
+    state = {"i": 0}
+
+    def call():
+        shape = shapes[state["i"] % len(shapes)]
+        state["i"] += 1
+        finaler_test_studie.MemoryTestApp._draw_shape(None, canvas, shape, "red", "red", 2)
+        root.update_idletasks()
+
+    return call, root.destroy
+
+
+# -----------------------
+# Auswertung
+# -----------------------
+@case("finish_test[scoring]")
+def _finish_test():
+    import clock
+    import finaler_test_studie
+    shapes = finaler_test_studie.SHAPES
+    rng = random.Random(1)
+    sequence = rng.sample(shapes, 7)
+    app = types.SimpleNamespace(root=types.SimpleNamespace(after=lambda *a: None))
+
+    def call():
+        # erster Test, damit finish_test nicht speichert
+        app.response_times = []
+        app.correct_counts = []
+        app.current_test_index = 0
+        app.test_response_start = clock.now()
+        app.sequence = sequence
+        app.user_selections = sequence[:5] + sequence[6:4:-1]
+        app.start_test = None
+        finaler_test_studie.MemoryTestApp.finish_test(app)
+
+    return call
+
+
+@case("memory_engine.score_many[1000]")
+def _engine_score_many():
+    import memory_engine
+    rng = random.Random(1)
+    pairs = []
+    for _ in range(1000):
+        sequence = memory_engine.generate_sequence(rng.choice(memory_engine.TEST_SIZES), rng=rng)
+        pairs.append((rng.sample(sequence, len(sequence)), sequence))
+    return lambda: memory_engine.score_many(pairs)
+
+
+@case("trial_events.record")
+def _events_record():
+    import trial_events
+    log = trial_events.new_log(0.0)
+    # ein Klick im Eingabepfad; das Protokoll wächst über alle Wiederholungen
+    return lambda: trial_events.record(log, trial_events.SELECT, 1.25, 7)
+
+
+@case("trial_events.encode+decode[7 Klicks]")
+def _events_encode():
+    import trial_events
+    log = trial_events.new_log(0.0)
+    for i in range(7):
+        trial_events.record(log, trial_events.SELECT, 0.8 * (i + 1), i)
+    return lambda: trial_events.decode(trial_events.encode(log))
+
+
+@case("trial_plans.assign")
+def _plans_assign():
+    import trial_plans
+    workdir = tempfile.mkdtemp(prefix="memorytest_bench_")
+    store = trial_plans.PlanStore(os.path.join(workdir, "plans.db"))
+    store.pregenerate(store.batch_plans)
+    # Vergabe beim Start einer Teilnahme (ohne ID: nur Zähler und Ausschnitt aus dem Stapel)
+    return (lambda: store.assign(None)), (lambda: shutil.rmtree(workdir, ignore_errors=True))
+
+
+@case("trial_plans.generate_plans[16 Pläne]")
+def _plans_generate():
+    import trial_plans
+    rng = random.Random(1)
+    return lambda: trial_plans.generate_plans(1, rng=rng)
+
+
+# -----------------------
+# Speicherung
+# -----------------------
+def _sample_participant(i):
+    return {"id": f"AB{i:04d}", "age": 20 + i % 50, "gender": "MWD"[i % 3]}
+
+
+def _register_storage():
+    for rows in ROW_COUNTS:
+        case(f"append_csv[rows={rows}]")(lambda rows=rows: _append_csv(rows))
+        for backend in ("excel", "jsonl", "sqlite"):
+            case(f"save_results[{backend},rows={rows}]")(
+                lambda rows=rows, backend=backend: _save_results(backend, rows)
+            )
+
+
+def _append_csv(rows):
+    import csv
+    append_csv = _script_function("stream.py", "append_csv", {"os": os, "csv": csv})
+    workdir = tempfile.mkdtemp(prefix="memorytest_bench_")
+    path = os.path.join(workdir, "memorytest_results.csv")
+    header = ["participant_id", "age", "gender", "test_variant"] + [f"{s}_korrekt" for s in range(3, 8)]
+    row = ["AB1990", 30, "W", "color", 3, 4, 5, 6, 7]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows([row] * rows)
+    return (lambda: append_csv(path, row, header)), (lambda: shutil.rmtree(workdir, ignore_errors=True))
+
+
+def _sample_test_state(variant="color"):
+    """test_state nach fünf Tests, wie ihn HIFLE speichert (inklusive Browser-Zeiten und Klickprotokollen)"""
+    import memory_engine
+    import trial_events
+    test_state = {
+        "variant": variant, "merk_times": [12.5] * 5, "response_times": [8.25] * 5,
+        "correct_counts": [3, 4, 4, 5, 6], "client_timing": [], "event_logs": [],
+    }
+    for index, size in enumerate(memory_engine.TEST_SIZES):
+        timing = memory_engine.client_timing(test_state["client_timing"], index)
+        memory_engine.record_memory(timing, 1000.0, 13500.0)
+        log = trial_events.start(test_state["event_logs"], index, 0.0)
+        for i in range(size):
+            memory_engine.record_click(timing, 14000.0, 15000.0 + 1200.0 * i)
+            trial_events.record(log, trial_events.SELECT, 1.0 + 1.2 * i, i)
+        trial_events.record(log, trial_events.CONFIRM, 1.5 + 1.2 * size)
+    return test_state
+
+
+def _save_results(backend, rows):
+    import result_store
+    import result_writer
+    HIFLE = _hifle()
+    import streamlit as st
+
+    workdir = tempfile.mkdtemp(prefix="memorytest_bench_")
+    old_cwd = os.getcwd()
+    os.chdir(workdir)
+
+    def record(i):
+        return HIFLE.results_record(
+            _sample_participant(i), _sample_test_state("color" if i % 2 else "bw"),
+            questionnaire=result_store.questionnaire_row([4] * 7, ""),
+        )
+
+    # vorhandene Zeilen anlegen
+    if backend == "excel":
+        _import("pandas")
+        _import("openpyxl")
+        openpyxl = __import__("openpyxl")
+        wb = openpyxl.Workbook(write_only=True)
+        for sheet_name in (result_store.SHEET_COLOR, result_store.SHEET_BW, result_store.SHEET_QUESTION):
+            ws = wb.create_sheet(sheet_name)
+            sample = result_store.test_sheet_row(record(0)) if sheet_name != result_store.SHEET_QUESTION \
+                else result_store.questionnaire_sheet_row(record(0))
+            ws.append(list(sample))
+            for i in range(rows):
+                ws.append(list(sample.values()))
+        wb.save(result_store.EXCEL_FILENAME)
+    else:
+        result_store.get_store(backend).append_many([record(i) for i in range(rows)])
+
+    st.session_state.participant_data = _sample_participant(rows)
+    st.session_state.test_state = _sample_test_state()
+    st.session_state.questionnaire_answers = [4] * 7
+    st.session_state.questionnaire_text = ""
+
+    errors = []
+    old_error = st.error
+    st.error = errors.append  # save_results meldet Fehler über st.error
+
+    # derselbe Weg wie in der App, aber synchron in den Store
+    # (die Write-Behind-Queue kehrt sofort zurück und würde nur das Einreihen messen)
+    old_backend, old_write_behind = HIFLE.RESULTS_BACKEND, result_writer.WRITE_BEHIND
+    HIFLE.RESULTS_BACKEND = backend
+    result_writer.WRITE_BEHIND = False
+
+    def call():
+        if not HIFLE.save_results():
+            raise RuntimeError(errors[-1] if errors else "save_results fehlgeschlagen")
+
+    def cleanup():
+        HIFLE.RESULTS_BACKEND, result_writer.WRITE_BEHIND = old_backend, old_write_behind
+        st.error = old_error
+        os.chdir(old_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return call, cleanup
+
+
+_register_storage()
+
+
+# -----------------------
+# Ablauf
+# -----------------------
+def run(filter_text=None, repeat=REPEAT, min_time=MIN_TIME):
+    results = {}
+    for name, factory in _cases:
+        if filter_text and filter_text not in name:
+            continue
+        cleanup = None
+        try:
+            prepared = factory()
+            call, cleanup = prepared if isinstance(prepared, tuple) else (prepared, None)
+            # die Excel-Variante liest die ganze Mappe neu ein: ein Aufruf je Wiederholung reicht
+            slow = name.startswith("save_results[excel")
+            results[name] = measure(call, repeat=3 if slow else repeat, min_time=0 if slow else min_time)
+        except Skip as e:
+            results[name] = {"skipped": str(e)}
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            if cleanup is not None:
+                cleanup()
+        print(_format_line(name, results[name]))
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Vergleicht die Mediane; liefert die Namen der langsamer gewordenen Fälle"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name, {})
+        if "median_us" not in result or "median_us" not in base:
+            continue
+        ratio = result["median_us"] / base["median_us"] if base["median_us"] else 1.0
+        result["baseline_median_us"] = base["median_us"]
+        result["ratio"] = round(ratio, 3)
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def _format_line(name, result):
+    if "median_us" in result:
+        return f"{name:45} {result['median_us']:>14.1f} µs  (min {result['min_us']:.1f}, {result['loops']}x{result['repeat']})"
+    return f"{name:45} {result.get('skipped') or result.get('error')}"
+
+
+def machine_info():
+    import platform
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-Benchmarks der Memory-Test-Apps")
+    parser.add_argument("--filter", default=None, help="nur Fälle, deren Name diesen Text enthält")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Ergebnis als neue Baseline speichern")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="erlaubte Verlangsamung (0.2 = 20 %%)")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--json", default=None, help="Ergebnis als JSON speichern")
+    args = parser.parse_args(argv)
+
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    logging.disable(logging.WARNING)  # Streamlit warnt ohne laufenden Server bei jedem Aufruf
+
+    results = run(args.filter, repeat=args.repeat)
+    report = {"machine": machine_info(), "results": results}
+
+    exit_code = 0
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f).get("results", {})
+        baseline.update({k: v for k, v in results.items() if "median_us" in v})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"machine": report["machine"], "results": baseline}, f, indent=2, sort_keys=True)
+        print(f"\nBaseline gespeichert: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline.get("results", {}), args.threshold)
+        report["regressions"] = regressions
+        if regressions:
+            exit_code = 1
+            print(f"\n{len(regressions)} Verschlechterung(en) gegenüber {args.baseline} (> {args.threshold:.0%}):")
+            for name in regressions:
+                print(f"  {name}: {results[name]['ratio']}x")
+        else:
+            print(f"\nKeine Verschlechterung gegenüber {args.baseline}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+# clock.py
+"""Uhr für Merkphase, Eingabezeit und Feedback-Pausen.
+
+Die Apps haben time.time() und time.sleep() direkt aufgerufen; ein
+kompletter Durchlauf dauerte deshalb auch im Test Minuten (fünf Merkphasen
+zu 30 Sekunden, dazu die Pausen nach jedem Test). Jetzt fragen sie die
+prozessweite Uhr dieses Moduls:
+
+    clock.now()      # statt time.time()
+    clock.sleep(2)   # statt time.sleep(2)
+
+Standard ist die Systemuhr, und zwar monoton über time.perf_counter_ns():
+Merk- und Eingabezeiten springen also nicht mit Zeitumstellungen oder
+NTP-Korrekturen der Serveruhr. Für Zeitstempel in den Ergebnissen bleibt
+datetime.now() zuständig. Mit MEMORYTEST_CLOCK=virtual (oder set_clock())
+läuft eine simulierte Uhr: sleep() wartet nicht, sondern stellt sie nur vor,
+und ein Testtreiber lässt mit advance() Merk- und Denkzeit vergehen. Ein
+ganzer Durchlauf dauert so Millisekunden und liefert trotzdem realistische
+merk_times und response_times (siehe load_test.py --virtual-clock).
+"""
+import os
+import threading
+import time
+
+CLOCK = os.environ.get("MEMORYTEST_CLOCK", "system")  # "system" oder "virtual"
+
+
+class SystemClock:
+    """Echte Zeit (monoton, Nanosekunden-Auflösung)"""
+
+    virtual = False
+
+    def now(self):
+        return time.perf_counter_ns() / 1e9
+
+    def now_ns(self):
+        return time.perf_counter_ns()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Simulierte Zeit: startet bei start und läuft nur über sleep() und advance()"""
+
+    virtual = True
+
+    def __init__(self, start=None):
+        self._now = time.time() if start is None else start
+        self._lock = threading.Lock()
+
+    def now(self):
+        with self._lock:
+            return self._now
+
+    def now_ns(self):
+        return int(round(self.now() * 1e9))
+
+    def advance(self, seconds):
+        if seconds < 0:
+            raise ValueError("Die Uhr läuft nicht rückwärts")
+        with self._lock:
+            self._now += seconds
+            return self._now
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+
+_clock = VirtualClock() if CLOCK == "virtual" else SystemClock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(new_clock):
+    """Tauscht die Uhr aus (z.B. VirtualClock() in Tests) und gibt die bisherige zurück"""
+    global _clock
+    previous, _clock = _clock, new_clock
+    return previous
+
+
+def now():
+    """Sekunden seit einem beliebigen, festen Zeitpunkt (nur für Differenzen)"""
+    return _clock.now()
+
+
+def now_ns():
+    return _clock.now_ns()
+
+
+def sleep(seconds):
+    _clock.sleep(seconds)
+
+
+def advance(seconds):
+    """Stellt die simulierte Uhr vor; mit der Systemuhr ein Fehler"""
+    if not _clock.virtual:
+        raise RuntimeError("advance() geht nur mit der simulierten Uhr (MEMORYTEST_CLOCK=virtual)")
+    return _clock.advance(seconds)
@@ -0,0 +1,50 @@
+# countdown.py
+"""Client-seitiger Countdown für die Merkphase.
+
+Ersetzt das Polling per st_autorefresh (alle 100 ms ein kompletter Rerun):
+Countdown, Fortschrittsbalken und der Weiter-Button laufen im Browser
+(components/countdown/index.html). Der Server wird nur noch bei Ablauf der
+Zeit oder beim Klick auf den Button benachrichtigt.
+"""
+import os
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+_COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "countdown")
+_countdown = components.declare_component("memory_countdown", path=_COMPONENT_DIR)
+
+
+def memory_countdown(trial_id, remaining_seconds, total_seconds,
+                     label="verbleibende Merkzeit", button_label="Weiter", key=None):
+    """Zeigt den Countdown an.
+
+    Gibt None zurück, solange der Durchgang läuft, danach
+    {'event': 'expired' | 'continue', 'trial': trial_id, 'onset_ms': ..., 't_ms': ...}
+    mit Einblenden und Ende der Merkphase laut Browser (Millisekunden).
+    """
+    event = _countdown(
+        trial_id=trial_id,
+        remaining_ms=int(remaining_seconds * 1000),
+        total_ms=int(total_seconds * 1000),
+        label=label,
+        button_label=button_label,
+        key=key,
+        default=None,
+    )
+    # Werte eines früheren Durchgangs ignorieren
+    if event and event.get('trial') == trial_id:
+        return event
+    return None
+
+
+def countdown_event(trial_id, key):
+    """Letzte Meldung des Countdowns mit diesem key, ohne ihn neu zu zeichnen (None, wenn keine vorliegt).
+
+    Damit lässt sich die Meldung vor anderen Prüfungen auswerten: Bei Ablauf der
+    Merkzeit kommt sie immer erst, nachdem auch die Frist auf dem Server um ist.
+    """
+    event = st.session_state.get(key)
+    if event and event.get('trial') == trial_id:
+        return event
+    return None
@@ -1,10 +1,17 @@
 import tkinter as tk
 from tkinter import messagebox, scrolledtext, ttk
-import random
-import time
 import os
+import secrets
 from datetime import datetime
 
+import result_store
+import result_writer
+import clock
+import memory_engine
+import shape_geometry
+import variant_assignment
+import trial_plans
+
 # openpyxl optional
 try:
     from openpyxl import Workbook, load_workbook
@@ -15,24 +22,13 @@ except ImportError:
 # -----------------------
 # Konfiguration / Symbole
 # -----------------------
-SHAPES = [
-    "Kreis_f", "Quadrat_f", "Raute_f", "Stern_f",
-    "PfeilOben", "PfeilUnten", "PfeilLinks", "PfeilRechts",
-    "Dreieck_f", "Doppelpfeil_H", "Doppelpfeil_V",
-    "Kreis_h", "Quadrat_h", "Dreieck_h", "Stern_h", "Raute_h"
-]
-
-COLORS = [
-    "red", "blue", "green", "orange",
-    "purple", "brown", "cyan",
-    "magenta", "gold", "darkgreen", "darkblue",
-    "red", "blue", "gold", "magenta", "green"
-]
-
-TEST_SIZES = [3, 4, 5, 6, 7]
-MEMORY_LIMIT_MS = 30000  # 30 Sekunden
+# Symbole, Farben und Testgrößen gemeinsam für alle Frontends (siehe memory_engine.py)
+SHAPES = memory_engine.SHAPES
+COLORS = memory_engine.COLORS
+TEST_SIZES = memory_engine.TEST_SIZES
 
 EXCEL_FILENAME = "memorytest_results.xlsx"
+RESULTS_BACKEND = os.environ.get("MEMORYTEST_BACKEND", "jsonl")  # "jsonl", "sqlite" (siehe result_store.py) oder "excel"
 SHEET_COLOR = "FARBIG"
 SHEET_BW = "FARBLOS"
 SHEET_QUESTION = "QUESTIONNAIRE"
@@ -74,7 +70,9 @@ class MemoryTestApp:
         self.gender_var = tk.StringVar(value="M")
 
         # State
+        self.session_token = None
         self.test_variant = None
+        self.trial_plan = None
         self.current_test_index = 0
         self.sequence = []
         self.user_selections = []
@@ -145,7 +143,7 @@ class MemoryTestApp:
         tk.Radiobutton(gframe, text="W", variable=self.gender_var, value="W", bg="white").pack(side="left")
         tk.Radiobutton(gframe, text="D", variable=self.gender_var, value="D", bg="white").pack(side="left")
 
-        if not OPENPYXL_AVAILABLE:
+        if RESULTS_BACKEND == "excel" and not OPENPYXL_AVAILABLE:
             tk.Label(self.main, text="Hinweis: openpyxl nicht installiert. Excel-Speicherung deaktiviert.",
                      fg="red", bg="white").pack(pady=(6, 4))
 
@@ -202,7 +200,13 @@ class MemoryTestApp:
         self.participant_age = int(age)
         self.participant_gender = gender
 
-        self.test_variant = random.choice(["color", "bw"])
+        # je Teilnahme eine eigene Kennung; die Teilnehmer-ID ist nicht eindeutig
+        self.session_token = secrets.token_urlsafe(12)
+        # blockweise je Altersband und Geschlecht (variant_assignment.py)
+        self.test_variant = variant_assignment.assign_variant(
+            self.session_token, self.participant_id, self.participant_age, gender)
+        # positionsbalancierte Sequenzen aller Tests (trial_plans.py)
+        self.trial_plan = trial_plans.assign_plan(self.session_token, self.participant_id)
         self.current_test_index = 0
         self.merk_times = []
         self.response_times = []
@@ -292,9 +296,9 @@ class MemoryTestApp:
         self.clicked_overlays.clear()
 
         size = TEST_SIZES[self.current_test_index]
-        self.sequence = random.sample(SHAPES, size)
+        self.sequence = trial_plans.sequence(self.trial_plan, self.current_test_index)
         self.user_selections = []
-        self.memory_start = time.time()
+        self.memory_start = clock.now()
         self.memory_timer_id = None
 
         self.status_label.config(
@@ -309,7 +313,7 @@ class MemoryTestApp:
             c = self.display_canvases[i]
             c.grid(row=0, column=i, padx=8, pady=8)
             shape = self.sequence[i]
-            color = COLORS[SHAPES.index(shape)]
+            color = memory_engine.color_of(shape)
             draw_color = "black" if self.test_variant == "bw" else color
             self.draw_shape_display(c, shape, draw_color, gray=False)
 
@@ -318,24 +322,24 @@ class MemoryTestApp:
 
         # show continue button and start the timed progress
         self.continue_button.pack(pady=(6, 4))
-        self.memory_progress['maximum'] = MEMORY_LIMIT_MS / 1000.0
+        self.memory_progress['maximum'] = memory_engine.MEMORY_LIMIT_SECONDS
         self.memory_progress['value'] = 0
         self._start_memory_progress_updater()
-        self.memory_timer_id = self.root.after(MEMORY_LIMIT_MS, self.end_memory_phase)
+        self.memory_timer_id = self.root.after(int(memory_engine.MEMORY_LIMIT_SECONDS * 1000), self.end_memory_phase)
         # Fortschrittsbalken sichtbar machen
         self.memory_progress.pack(side="right", padx=(8, 0))
         self.memory_countdown_label.pack(side="left")
         
     def _start_memory_progress_updater(self):
         # update every 100 ms for smoothness
-        elapsed = time.time() - self.memory_start
+        elapsed = clock.now() - self.memory_start
         if elapsed < 0:
             elapsed = 0
-        remaining = max(0, MEMORY_LIMIT_MS / 1000.0 - elapsed)
+        remaining = max(0, memory_engine.MEMORY_LIMIT_SECONDS - elapsed)
         # progress shows elapsed time (increasing), label shows remaining seconds
         self.memory_progress['value'] = min(self.memory_progress['maximum'], elapsed)
         self.memory_countdown_label.config(text=f"Verbleibende Zeit: {int(round(remaining))} s")
-        if elapsed * 1000 >= MEMORY_LIMIT_MS:
+        if elapsed >= memory_engine.MEMORY_LIMIT_SECONDS:
             # stop updater; end_memory_phase will be called by timer
             self.memory_countdown_label.config(text=f"Verbleibende Zeit: 0 s")
             return
@@ -361,8 +365,7 @@ class MemoryTestApp:
                 pass
             self.memory_progress_update_id = None
 
-        merk_time = round(
-            min(time.time() - self.memory_start, MEMORY_LIMIT_MS / 1000.0), 3)
+        merk_time = memory_engine.merk_time(self.memory_start, clock.now())
         self.merk_times.append(merk_time)
         # Fortschrittsbalken ausblenden
         self.memory_progress.pack_forget()
@@ -399,7 +402,7 @@ class MemoryTestApp:
 
             c.bind("<Button-1>", lambda e, s=shape: self.on_input_click(s))
 
-        self.test_response_start = time.time()
+        self.test_response_start = clock.now()
         self.user_selections = []
 
     # -----------------------
@@ -440,12 +443,9 @@ class MemoryTestApp:
     # Finish test
     # -----------------------
     def finish_test(self):
-        self.response_times.append(round(time.time() - self.test_response_start, 3))
+        self.response_times.append(memory_engine.response_time(self.test_response_start, clock.now()))
 
-        correct = sum(
-            1 for a, b in zip(self.user_selections, self.sequence)
-            if a == b
-        )
+        correct = memory_engine.score(self.user_selections, self.sequence)
         self.correct_counts.append(correct)
 
         self.current_test_index += 1
@@ -453,11 +453,10 @@ class MemoryTestApp:
         if self.current_test_index < len(TEST_SIZES):
             self.root.after(700, self.start_test)
         else:
-            if OPENPYXL_AVAILABLE:
-                try:
-                    self.save_test_results_to_excel()
-                except Exception:
-                    pass
+            try:
+                self.save_test_results()
+            except Exception:
+                pass
 
             self.root.after(300, self.after_tests_show_questionnaire)
 
@@ -506,95 +505,20 @@ class MemoryTestApp:
         canvas.delete("all")
         w = int(canvas.winfo_reqwidth())
         h = int(canvas.winfo_reqheight())
-        s = min(w, h) / 100.0
-
-        def sc(coords):
-            return [coord * s for coord in coords]
-
-        # --- Kreis ---
-        if shape.startswith("Kreis"):
-            canvas.create_oval(10*s, 10*s, 90*s, 90*s, fill=fill,
-                               outline=outline, width=width)
-
-        # --- Quadrat ---
-        elif shape.startswith("Quadrat"):
-            canvas.create_rectangle(12*s, 12*s, 88*s, 88*s,
-                                    fill=fill, outline=outline, width=width)
-
-        # --- Raute ---
-        elif shape.startswith("Raute"):
-            coords = sc([50, 8, 88, 50, 50, 92, 12, 50])
-            canvas.create_polygon(coords, fill=fill,
-                                  outline=outline, width=width)
-
-        # --- Stern ---
-        elif shape.startswith("Stern"):
-            coords = sc([
-                50, 12, 58, 34, 80, 34, 62, 50,
-                68, 74, 50, 60, 32, 74, 38, 50,
-                20, 34, 42, 34
-            ])
-            canvas.create_polygon(coords, fill=fill,
-                                  outline=outline, width=width)
-
-        # --- Dreieck ---
-        elif shape.startswith("Dreieck"):
-            coords = sc([50, 10, 90, 80, 10, 80])
-            canvas.create_polygon(coords, fill=fill,
-                                  outline=outline, width=width)
-
-        # --- Pfeil Oben ---
-        elif shape == "PfeilOben":
-            coords = sc([
-                50, 10, 78, 50, 62, 50,
-                62, 90, 38, 90, 38, 50,
-                22, 50
-            ])
-            canvas.create_polygon(coords, fill=fill,
-                                  outline=outline, width=width)
-
-        # --- Pfeil Unten ---
-        elif shape == "PfeilUnten":
-            coords = sc([50, 90, 78, 50, 62, 50, 62, 10, 38, 10, 38, 50, 22, 50])
-            canvas.create_polygon(coords, fill=fill,
-                                  outline=outline, width=width)
-
-        # --- Pfeil Links ---
-        elif shape == "PfeilLinks":
-            coords = sc([10, 50, 50, 10, 50, 30, 90, 30,
-                         90, 70, 50, 70, 50, 90])
-            canvas.create_polygon(coords, fill=fill,
-                                  outline=outline, width=width)
-
-        # --- Pfeil Rechts ---
-        elif shape == "PfeilRechts":
-            coords = sc([90, 50, 50, 10, 50, 30, 10, 30,
-                         10, 70, 50, 70, 50, 90])
-            canvas.create_polygon(coords, fill=fill,
-                                  outline=outline, width=width)
-
-        # --- Doppelpfeil horizontal ---
-        elif shape == "Doppelpfeil_H":
-            canvas.create_line(18*s, 50*s, 82*s, 50*s,
-                               fill=outline, width=width)
-            canvas.create_polygon(sc([18, 50, 30, 40, 30, 60]),
-                                  fill=outline, outline=outline)
-            canvas.create_polygon(sc([82, 50, 70, 40, 70, 60]),
-                                  fill=outline, outline=outline)
-
-        # --- Doppelpfeil vertikal ---
-        elif shape == "Doppelpfeil_V":
-            canvas.create_line(50*s, 18*s, 50*s, 82*s,
-                               fill=outline, width=width)
-            canvas.create_polygon(sc([50, 18, 40, 30, 60, 30]),
-                                  fill=outline, outline=outline)
-            canvas.create_polygon(sc([50, 82, 40, 70, 60, 70]),
-                                  fill=outline, outline=outline)
-
-        # fallback
-        else:
-            canvas.create_oval(10*s, 10*s, 90*s, 90*s,
-                               fill=fill, outline=outline, width=width)
+        size = min(w, h)
+
+        # Geometrie aus der gemeinsamen Tabelle, je Größe skaliert und gecacht
+        for kind, coords in shape_geometry.scaled(shape, size):
+            if kind == "ellipse":
+                canvas.create_oval(*coords, fill=fill, outline=outline, width=width)
+            elif kind == "rect":
+                canvas.create_rectangle(*coords, fill=fill, outline=outline, width=width)
+            elif kind == "polygon":
+                canvas.create_polygon(coords, fill=fill, outline=outline, width=width)
+            elif kind == "line":
+                canvas.create_line(*coords, fill=outline, width=width)
+            elif kind == "head":
+                canvas.create_polygon(coords, fill=outline, outline=outline)
 
     # -----------------------
     # After all tests: Questionnaire intro
@@ -738,15 +662,11 @@ class MemoryTestApp:
         saved = False
         saved_path = None
 
-        if OPENPYXL_AVAILABLE:
-            try:
-                saved, saved_path = self.save_questionnaire_to_excel(answers, free_text)
-            except Exception as e:
-                messagebox.showwarning("Warnung",
-                                       f"Fehler beim Speichern des Fragebogens:\n{e}")
-        else:
-            # still proceed to show thanks page even without excel
-            pass
+        try:
+            saved, saved_path = self.save_questionnaire(answers, free_text)
+        except Exception as e:
+            messagebox.showwarning("Warnung",
+                                   f"Fehler beim Speichern des Fragebogens:\n{e}")
 
         # Show final thank-you screen including results table
         self.show_thank_you_screen(saved, saved_path)
@@ -783,6 +703,49 @@ class MemoryTestApp:
 
         tk.Button(self.main, text="Zurück zum Start", command=self.reset_to_start, bg=ACCENT, fg="white").pack(pady=(12, 6))
 
+    # -----------------------
+    # Save (Append-Only-Log bzw. SQLite, siehe result_store.py)
+    # -----------------------
+    def save_record(self, record):
+        # im Hintergrund schreiben (result_writer.py), die Oberfläche blockiert nicht
+        path = self.results_path(result_store.STORE_FILES[RESULTS_BACKEND])
+        return result_writer.save(RESULTS_BACKEND, record, path)
+
+    def results_path(self, filename):
+        base = next((d for d in [
+            os.path.join(os.path.expanduser("~"), "Documents"),
+            os.path.expanduser("~"), os.getcwd()
+        ] if os.path.isdir(d)), os.getcwd())
+        return os.path.join(base, filename)
+
+    def session_record(self, **parts):
+        participant = {
+            "id": self.participant_id,
+            "age": self.participant_age,
+            "gender": self.participant_gender,
+        }
+        return result_store.session_record("finaler_test_studie", participant, self.test_variant, **parts)
+
+    def save_test_results(self):
+        if RESULTS_BACKEND == "excel":
+            return OPENPYXL_AVAILABLE and self.save_test_results_to_excel()
+
+        record = self.session_record(trials=result_store.trial_rows(
+            TEST_SIZES, self.merk_times, self.response_times, self.correct_counts))
+        self.save_record(record)
+        return True
+
+    def save_questionnaire(self, answers, free_text):
+        if RESULTS_BACKEND == "excel":
+            if not OPENPYXL_AVAILABLE:
+                # still proceed to show thanks page even without excel
+                return False, None
+            return self.save_questionnaire_to_excel(answers, free_text)
+
+        record = self.session_record(questionnaire=result_store.questionnaire_row(answers, free_text))
+        path = self.save_record(record)
+        return True, path
+
     # -----------------------
     # Save Questionnaire
     # -----------------------
@@ -0,0 +1,158 @@
+# lazy_imports.py
+"""Verzögertes Laden der schweren Abhängigkeiten.
+
+HIFLE, STESTsd und ONLINER haben pandas und PIL beim Start importiert, obwohl
+pandas erst beim Speichern bzw. auf der Danke-Seite und PIL erst in der
+Merkphase gebraucht wird. Die Apps holen sich stattdessen Platzhalter:
+
+    pd = lazy_imports.lazy("pandas")
+    Image = lazy_imports.lazy("PIL.Image")
+
+Der eigentliche Import passiert beim ersten Attributzugriff (pd.DataFrame).
+Damit die Teilnehmenden darauf nicht warten, startet warm_up() nach dem
+ersten Seitenaufbau einen Hintergrund-Thread, der die Module lädt und die
+Symbole des Eingaberasters vorab in den Bild-Cache zeichnet (einmal je
+Serverprozess). Mit MEMORYTEST_WARMUP=0 wird nichts vorgeladen.
+
+Jeder tatsächliche Import wird mit Dauer und Auslöser protokolliert
+(import_report()). Vergleich kalter Start mit und ohne Lazy-Import:
+
+    python lazy_imports.py [HIFLE STESTsd ONLINER]
+"""
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+
+WARMUP = os.environ.get("MEMORYTEST_WARMUP", "1") == "1"
+WARMUP_DELAY = 0.5  # Sekunden; erst die Startseite ausliefern, dann vorladen
+HEAVY_MODULES = ["pandas", "PIL.Image", "PIL.ImageDraw", "openpyxl"]
+
+_report = []
+_reported = set()
+_warmups = set()
+_lock = threading.Lock()
+
+
+def load(name, trigger="demand"):
+    """Importiert name und protokolliert Dauer und Auslöser, falls es der erste Import ist"""
+    already = name in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - start
+    if not already:
+        with _lock:
+            if name not in _reported:
+                _reported.add(name)
+                _report.append({
+                    "module": name,
+                    "seconds": round(elapsed, 4),
+                    "trigger": trigger,
+                    "thread": threading.current_thread().name,
+                })
+    return module
+
+
+class LazyModule:
+    """Platzhalter, der das Modul beim ersten Attributzugriff importiert"""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = load(self._name)
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        # nur beim ersten Zugriff je Attribut; danach liegt es direkt im Platzhalter
+        value = getattr(self._load(), attr)
+        self.__dict__[attr] = value
+        return value
+
+    def __repr__(self):
+        state = "geladen" if self.__dict__["_module"] is not None else "noch nicht geladen"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy(name):
+    return LazyModule(name)
+
+
+def warm_up(key, modules, then=None, delay=WARMUP_DELAY):
+    """Lädt modules im Hintergrund und ruft danach then() auf (einmal je Prozess und key)"""
+    with _lock:
+        if not WARMUP or key in _warmups:
+            return False
+        _warmups.add(key)
+
+    def run():
+        time.sleep(delay)
+        for name in modules:
+            try:
+                load(name, "warmup")
+            except ImportError:
+                pass  # fehlt das Paket, meldet sich der Import beim ersten Gebrauch
+        if then is not None:
+            start = time.perf_counter()
+            try:
+                then()
+            except Exception:
+                return
+            with _lock:
+                _report.append({
+                    "module": f"{key}: Vorab-Rendering",
+                    "seconds": round(time.perf_counter() - start, 4),
+                    "trigger": "warmup",
+                    "thread": threading.current_thread().name,
+                })
+
+    threading.Thread(target=run, name=f"warmup-{key}", daemon=True).start()
+    return True
+
+
+def import_report():
+    """Alle bisher protokollierten Importe (Modul, Sekunden, Auslöser, Thread)"""
+    with _lock:
+        return list(_report)
+
+
+# -----------------------
+# Messung kalter Start
+# -----------------------
+_PROBE = """
+import sys, time, logging
+logging.disable(logging.WARNING)
+sys.path.insert(0, {app_dir!r})
+start = time.perf_counter()
+{eager}
+import {app}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def measure_cold_import(app, eager=False, python=sys.executable):
+    """Importzeit eines App-Moduls in einem frischen Prozess (Sekunden, geladene schwere Module)"""
+    code = _PROBE.format(
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        eager="import pandas, PIL.Image, PIL.ImageDraw" if eager else "",
+        app=app,
+        heavy=HEAVY_MODULES,
+    )
+    out = subprocess.run([python, "-c", code], capture_output=True, text=True, check=True).stdout.split()
+    return float(out[0]), out[1].split(",") if len(out) > 1 else []
+
+
+if __name__ == "__main__":
+    apps = sys.argv[1:] or ["HIFLE", "STESTsd", "ONLINER"]
+    for app in apps:
+        lazy_s, loaded = measure_cold_import(app)
+        eager_s, _ = measure_cold_import(app, eager=True)
+        print(f"{app}: {lazy_s * 1000:.0f} ms bis zur Startseite "
+              f"(mit pandas/PIL vorab: {eager_s * 1000:.0f} ms), beim Start geladen: {', '.join(loaded) or '-'}")
@@ -0,0 +1,402 @@
+# load_test.py
+"""Lasttest für die Streamlit-Apps mit simulierten Teilnehmenden.
+
+Jede simulierte Person durchläuft eine App headless über streamlit.testing
+(AppTest) komplett: Start -> Anleitung -> 5 Tests (Merk- und Eingabephase) ->
+Fragebogen -> Danke-Seite. Mehrere Personen laufen parallel in einem
+Prozess-Pool. Gemessen werden:
+
+- Latenz je Interaktion (Klick/Eingabe inkl. der dadurch ausgelösten Reruns)
+- CPU-Zeit und Wandzeit je Person
+- Latenz der Speicher-Interaktion je App und Flush-Latenz des result_writer
+  (über den ganzen Lauf)
+
+    python load_test.py --participants 200 --workers 8 --apps HIFLE.py stream.py
+    python load_test.py --participants 50 --backend sqlite --json report.json
+
+AppTest führt nur die Skripte aus, ohne Webserver und Browser. Die Zahlen
+zeigen also, wie viel Serverzeit die Reruns kosten, nicht die Netzwerklatenz.
+Die Merkphase wird nicht abgewartet: die Person klickt "Weiter"; in HIFLE
+(Countdown im Browser) wird die Startzeit zurückgesetzt, wie nach Ablauf.
+
+Mit --virtual-clock laufen die Apps auf der simulierten Uhr (clock.py): Merk-,
+Klick- und Denkzeiten werden nur vorgestellt statt abgewartet, die Pausen nach
+jedem Test kosten keine Wandzeit, und merk_times/response_times sehen trotzdem
+aus wie bei echten Personen.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APPS = ["HIFLE.py", "STESTsd.py", "ONLINER.py", "stream.py", "sdsd.py"]
+MAX_STEPS = 400
+RUN_TIMEOUT = 60  # Sekunden je Interaktion
+PERCENTILES = (50, 90, 95, 99)
+MERK_TIME_RANGE = (4.0, 30.0)   # Sekunden Merkzeit (simulierte Uhr)
+CLICK_TIME_RANGE = (0.4, 2.5)   # Sekunden je Symbolklick (simulierte Uhr)
+
+# Buttons, die auf den einzelnen Seiten weiterführen (erster Treffer gewinnt)
+FORWARD_LABELS = [
+    "Studie beginnen", "Test starten", "Ersten Test beginnen", "Test beginnen",
+    "Weiter zum Test", "Fragebogen starten", "Zum Fragebogen", "Weiter zu Teil B",
+    "Fragebogen abschließen", "Fragebogen absenden", "Fragebogen abschicken", "Weiter",
+]
+SAVE_LABELS = ("Fragebogen abschließen", "Fragebogen absenden", "Fragebogen abschicken")
+START_FORM = {"Mutter": "MA", "Vater": "RT", "Geburtsjahr": "1990", "Alter": "30"}
+
+
+# -----------------------
+# Zustand der Apps
+# -----------------------
+def _state(at, key, default=None):
+    return at.session_state[key] if key in at.session_state else default
+
+
+def app_phase(app, at):
+    """Liefert (phase, sequence, selections, test_index); phase ist memory/input/feedback/done/page"""
+    if app in ("stream.py", "sdsd.py"):
+        stage = _state(at, "stage")
+        if stage == "done":
+            return "done", None, None, None
+        if stage in ("memory", "input"):
+            return (stage, _state(at, "sequence"), _state(at, "user_selections"),
+                    _state(at, "current_test_index"))
+        return "page", None, None, None
+
+    page = _state(at, "page", "start")
+    if page == "thank_you":
+        return "done", None, None, None
+    if page == "test":
+        test_state = _state(at, "test_state", {})
+        if test_state.get("feedback"):
+            return "feedback", None, None, test_state["current_test"]
+        if test_state.get("memory_phase"):
+            return "memory", test_state["sequence"], None, test_state["current_test"]
+        if test_state.get("input_phase"):
+            return ("input", test_state["sequence"], test_state["user_selections"],
+                    test_state["current_test"])
+    return "page", None, None, None
+
+
+def symbol_key(app, shapes, shape, test_index):
+    i = shapes.index(shape)
+    if app == "HIFLE.py":
+        return f"shape1_{i}" if i < 8 else f"shape2_{i}"
+    if app in ("stream.py", "sdsd.py"):
+        return f"sel_{shape}_{test_index}"
+    return f"shape_{i}"
+
+
+def _find_button(at, label=None, key=None):
+    for button in at.button:
+        if button.disabled:
+            continue
+        if key is not None and button.key == key:
+            return button
+        if label is not None and label in button.label:
+            return button
+    return None
+
+
+# -----------------------
+# Eine simulierte Person
+# -----------------------
+def run_participant(app, seed, accuracy=0.8, think_time=0.0, virtual_clock=False):
+    """Führt eine Person durch die App und gibt die Messwerte zurück"""
+    from streamlit.testing.v1 import AppTest
+    import clock
+
+    rng = random.Random(seed)
+    shapes = None
+    latencies = []
+    save_ms = None
+    error = None
+    steps = 0
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    clock_start = clock.now()
+    at = None
+
+    def wait(seconds):
+        if virtual_clock:
+            clock.advance(seconds)
+        else:
+            time.sleep(seconds)
+
+    def timed(action, is_save=False):
+        nonlocal save_ms
+        start = time.perf_counter()
+        action()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        latencies.append(elapsed_ms)
+        if is_save:
+            save_ms = elapsed_ms
+
+    try:
+        at = AppTest.from_file(os.path.join(APP_DIR, app), default_timeout=RUN_TIMEOUT)
+        timed(at.run)
+        while steps < MAX_STEPS:
+            steps += 1
+            if at.exception:
+                error = at.exception[0].value
+                break
+
+            phase, sequence, selections, test_index = app_phase(app, at)
+            if phase == "done":
+                break
+            if think_time:
+                wait(rng.uniform(0, 2 * think_time))
+
+            if phase == "memory":
+                if virtual_clock:
+                    clock.advance(rng.uniform(*MERK_TIME_RANGE))
+                button = _find_button(at, label="Merkphase beenden")
+                if button is not None:
+                    timed(button.click().run)
+                elif virtual_clock:
+                    # Countdown läuft im Browser: bis zum Ablauf der Merkzeit vorstellen
+                    clock.advance(MERK_TIME_RANGE[1])
+                    timed(at.run)
+                else:
+                    # Countdown läuft im Browser: Ablauf der Merkzeit nachstellen
+                    at.session_state.test_state["timer_start"] -= 10 * 60
+                    timed(at.run)
+
+            elif phase == "feedback":
+                # Ergebnisanzeige nach dem Test: Anzeigedauer abwarten, dann läuft das Feedback-Fragment ab
+                wait(max(0, _state(at, "test_state")["feedback"]["until"] - clock.now()))
+                timed(at.run)
+
+            elif phase == "input":
+                if shapes is None:
+                    shapes = _app_shapes(app)
+                if len(selections) < len(sequence):
+                    wanted = sequence[len(selections)]
+                    # Fehler simulieren; ein früher falsch gewähltes Symbol ist nicht mehr anklickbar
+                    if wanted in selections or rng.random() > accuracy:
+                        wanted = rng.choice([s for s in shapes if s not in selections and s != wanted])
+                    button = _find_button(at, key=symbol_key(app, shapes, wanted, test_index))
+                else:
+                    button = _find_button(at, label="Eingabe bestätigen")
+                if button is None:
+                    error = f"Kein Button für die Eingabe gefunden (Test {test_index})"
+                    break
+                if virtual_clock:
+                    clock.advance(rng.uniform(*CLICK_TIME_RANGE))
+                timed(button.click().run)
+
+            else:
+                for text_input in at.text_input:
+                    for word, value in START_FORM.items():
+                        if word in text_input.label:
+                            text_input.input(value)
+                for radio in at.radio:
+                    if len(radio.options) > 1:
+                        radio.set_value(rng.choice(radio.options))
+                for text_area in at.text_area:
+                    text_area.input("keine")
+                button = next(
+                    (b for label in FORWARD_LABELS for b in [_find_button(at, label=label)] if b is not None),
+                    None,
+                )
+                if button is None:
+                    error = f"Kein Weiter-Button auf Seite {_state(at, 'page', _state(at, 'stage'))}"
+                    break
+                timed(button.click().run, is_save=any(label in button.label for label in SAVE_LABELS))
+        else:
+            error = f"Nach {MAX_STEPS} Schritten nicht fertig"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=3)}"
+
+    merk_times, response_times = _timings(app, at) if at is not None and error is None else ([], [])
+
+    writer_metrics = {}
+    try:
+        import result_writer
+        result_writer.flush_all(30)
+        writer_metrics = result_writer.writer_metrics()
+    except ImportError:
+        pass
+
+    return {
+        "app": app,
+        "pid": os.getpid(),
+        "completed": error is None,
+        "error": None if error is None else str(error),
+        "steps": steps,
+        "latencies_ms": latencies,
+        "save_ms": save_ms,
+        "cpu_s": time.process_time() - cpu_start,
+        "wall_s": time.perf_counter() - wall_start,
+        "clock_s": clock.now() - clock_start,
+        "merk_times": merk_times,
+        "response_times": response_times,
+        "writer": writer_metrics,
+    }
+
+
+def _timings(app, at):
+    """Gemessene Merk- und Eingabezeiten der Person aus dem Session State"""
+    if app in ("stream.py", "sdsd.py"):
+        return list(_state(at, "merk_times", [])), list(_state(at, "response_times", []))
+    test_state = _state(at, "test_state", {})
+    return list(test_state.get("merk_times", [])), list(test_state.get("response_times", []))
+
+
+def _app_shapes(app):
+    # Die Apps definieren SHAPES identisch; HIFLE lässt sich ohne Seiteneffekte importieren
+    import HIFLE
+    return HIFLE.SHAPES
+
+
+def _init_worker(workdir, backend, virtual_clock=False):
+    # Ergebnisdateien landen im Arbeitsverzeichnis, nicht im Repository
+    os.chdir(workdir)
+    if backend:
+        os.environ["MEMORYTEST_BACKEND"] = backend
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    if virtual_clock:
+        # AppTest führt die Apps in diesem Prozess aus, sie sehen also dieselbe Uhr
+        import clock
+        clock.set_clock(clock.VirtualClock())
+    # Hinweise der Apps (leere Labels, veraltete Parameter) nicht tausendfach ausgeben
+    logging.disable(logging.WARNING)
+
+
+# -----------------------
+# Auswertung
+# -----------------------
+def percentile(values, p):
+    """Perzentil nach Nearest-Rank"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _summary(values):
+    if not values:
+        return {}
+    result = {f"p{p}": round(percentile(values, p), 3) for p in PERCENTILES}
+    result["max"] = round(max(values), 3)
+    result["mean"] = round(sum(values) / len(values), 3)
+    return result
+
+
+def summarize(results):
+    report = {}
+    for app in sorted({r["app"] for r in results}):
+        runs = [r for r in results if r["app"] == app]
+        done = [r for r in runs if r["completed"]]
+        report[app] = {
+            "participants": len(runs),
+            "completed": len(done),
+            "errors": sorted({r["error"].splitlines()[0] for r in runs if r["error"]})[:5],
+            "interaction_ms": _summary([ms for r in runs for ms in r["latencies_ms"]]),
+            "cpu_s_per_participant": _summary([r["cpu_s"] for r in done]),
+            "wall_s_per_participant": _summary([r["wall_s"] for r in done]),
+            "clock_s_per_participant": _summary([r["clock_s"] for r in done]),
+            "merk_time_s": _summary([t for r in done for t in r["merk_times"] if t is not None]),
+            "response_time_s": _summary([t for r in done for t in r["response_times"] if t is not None]),
+            "save_interaction_ms": _summary([r["save_ms"] for r in done if r["save_ms"] is not None]),
+        }
+    return report
+
+
+def summarize_writers(results):
+    """Flush-Latenz der Writer über den ganzen Lauf.
+
+    Die Metriken eines Writers sind kumulativ über alle Personen, die sein
+    Prozess bearbeitet hat, egal mit welcher App; sie lassen sich deshalb
+    nicht einer App zuordnen. Gezählt wird der letzte (größte) Stand je Prozess und Datei.
+    """
+    writers = {}
+    for r in results:
+        for path, metrics in r["writer"].items():
+            last = writers.get((r["pid"], path))
+            if last is None or (metrics["submitted"], metrics["batches"]) > (last["submitted"], last["batches"]):
+                writers[(r["pid"], path)] = metrics
+    batches = sum(m["batches"] for m in writers.values())
+    total_ms = sum(m["total_flush_ms"] for m in writers.values())
+    return {
+        "batches": batches,
+        "mean": round(total_ms / batches, 3) if batches else 0.0,
+        "max": round(max((m["max_flush_ms"] for m in writers.values()), default=0.0), 3),
+        "failed": sum(m["failed"] for m in writers.values()),
+    }
+
+
+def print_report(report, writers, elapsed):
+    print(f"\nGesamtdauer: {elapsed:.1f} s")
+    print(f"writer_flush_ms (alle Apps) batches={writers['batches']}  mean={writers['mean']}  "
+          f"max={writers['max']}  failed={writers['failed']}")
+    for app, data in report.items():
+        print(f"\n{app}: {data['completed']}/{data['participants']} fertig")
+        for key in ("interaction_ms", "save_interaction_ms", "cpu_s_per_participant", "wall_s_per_participant",
+                    "clock_s_per_participant", "merk_time_s", "response_time_s"):
+            values = data[key]
+            if values:
+                print(f"  {key:24} " + "  ".join(f"{k}={v}" for k, v in values.items()))
+        for error in data["errors"]:
+            print(f"  Fehler: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lasttest der Memory-Test-Apps mit simulierten Teilnehmenden")
+    parser.add_argument("--participants", type=int, default=20, help="Personen je App")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="parallele Prozesse")
+    parser.add_argument("--apps", nargs="+", default=APPS, choices=APPS)
+    parser.add_argument("--backend", default=None, help="MEMORYTEST_BACKEND für die Apps (jsonl, sqlite, ...)")
+    parser.add_argument("--accuracy", type=float, default=0.8, help="Anteil richtig gewählter Symbole")
+    parser.add_argument("--think", type=float, default=0.0, help="mittlere Denkzeit je Aktion in Sekunden")
+    parser.add_argument("--virtual-clock", action="store_true",
+                        help="simulierte Uhr: Merk-, Klick- und Denkzeiten vergehen ohne Wartezeit")
+    parser.add_argument("--workdir", default=None, help="Verzeichnis für Ergebnisdateien (Standard: temporär)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="Bericht zusätzlich als JSON speichern")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="memorytest_load_")
+    tasks = [(app, args.seed * 100003 + i) for app in args.apps for i in range(args.participants)]
+    print(f"{len(tasks)} Durchläufe, {args.workers} Prozesse, Ergebnisdateien in {workdir}")
+
+    # AppTest ersetzt in den Worker-Prozessen __main__ durch das App-Skript,
+    # deshalb die Funktionen über den Modulnamen übergeben
+    import load_test
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=load_test._init_worker,
+                             initargs=(workdir, args.backend, args.virtual_clock)) as pool:
+        futures = [pool.submit(load_test.run_participant, app, seed, args.accuracy, args.think,
+                               args.virtual_clock)
+                   for app, seed in tasks]
+        for n, future in enumerate(as_completed(futures), start=1):
+            results.append(future.result())
+            if n % max(1, len(tasks) // 10) == 0:
+                print(f"  {n}/{len(tasks)}")
+    elapsed = time.perf_counter() - start
+
+    report = summarize(results)
+    writers = summarize_writers(results)
+    print_report(report, writers, elapsed)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"elapsed_s": round(elapsed, 3), "workers": args.workers, "apps": report,
+                       "writer_flush_ms": writers}, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# memory_engine.py
+"""Ablauf eines Memory-Tests unabhängig von der Oberfläche.
+
+Sequenz ziehen, Merk- und Eingabezeit messen, Auswahl prüfen und auswerten
+stand bisher sechsmal im Code (HIFLE, STESTsd, ONLINER, stream, sdsd und
+finaler_test_studie), jeweils mit kleinen Abweichungen. Die Frontends rufen
+jetzt die Funktionen hier auf und behalten nur die Darstellung und ihren
+Zustand (st.session_state bzw. Attribute der Tk-App).
+
+Alle Funktionen sind rein: Zeitpunkte (now) und Zufallsquelle (rng) werden
+übergeben, damit sich der Ablauf ohne Streamlit oder Tk testen und messen
+lässt (siehe benchmarks.py). Die Zeilen für die Ergebnisdateien baut
+result_store.trial_rows() aus den Listen merk_times, response_times und
+correct_counts im Zustand der Frontends.
+"""
+import random
+
+SHAPES = [
+    "Kreis_f", "Quadrat_f", "Raute_f", "Stern_f",
+    "PfeilOben", "PfeilUnten", "PfeilLinks", "PfeilRechts",
+    "Dreieck_f", "Doppelpfeil_H", "Doppelpfeil_V",
+    "Kreis_h", "Quadrat_h", "Dreieck_h", "Stern_h", "Raute_h"
+]
+
+COLORS = [
+    "red", "blue", "green", "orange",
+    "purple", "brown", "cyan",
+    "magenta", "gold", "darkgreen", "darkblue",
+    "red", "blue", "gold", "magenta", "green"
+]
+
+TEST_SIZES = [3, 4, 5, 6, 7]
+MEMORY_LIMIT_SECONDS = 30
+
+# statt SHAPES.index(shape) bei jedem Symbol jedes Reruns
+SHAPE_INDEX = {shape: i for i, shape in enumerate(SHAPES)}
+
+
+def color_of(shape):
+    return COLORS[SHAPE_INDEX[shape]]
+
+
+# -----------------------
+# Durchgang
+# -----------------------
+def generate_sequence(size, shapes=SHAPES, rng=random):
+    """size verschiedene Symbole in zufälliger Reihenfolge"""
+    return rng.sample(shapes, size)
+
+
+# -----------------------
+# Rückmeldung nach dem Durchgang
+# -----------------------
+def feedback_state(test_index, correct, size, now, duration):
+    """Ergebnis eines Durchgangs, das bis now + duration angezeigt wird"""
+    return {"test": test_index, "correct": correct, "size": size, "until": now + duration}
+
+
+def feedback_remaining(feedback, now):
+    return max(0, feedback["until"] - now)
+
+
+# -----------------------
+# Zeitstempel aus dem Browser
+# -----------------------
+# Die Komponenten (Countdown, Eingaberaster) melden performance.timeOrigin +
+# performance.now() in Millisekunden: Einblenden der Symbole, Ende der
+# Merkphase und jeden Klick. Daraus ergeben sich Merk- und Eingabezeit ohne
+# Netzwerk-Roundtrips und Wartezeit auf dem Server.
+def client_timing(timings, test_index):
+    """Zeitstempel-Dict eines Tests in der Liste timings (wird bei Bedarf angelegt)"""
+    while len(timings) <= test_index:
+        timings.append({})
+    return timings[test_index]
+
+
+def record_memory(timing, onset_ms, end_ms):
+    if onset_ms is not None and end_ms is not None:
+        timing["memory_onset"] = onset_ms
+        timing["memory_end"] = end_ms
+
+
+def record_click(timing, onset_ms, t_ms):
+    if onset_ms is None or t_ms is None:
+        return
+    timing.setdefault("input_onset", onset_ms)
+    timing.setdefault("clicks", []).append(t_ms)
+
+
+def client_durations(timing):
+    """(Merkzeit, Eingabezeit) in Sekunden aus den Browser-Zeitstempeln; None, wo sie fehlen"""
+    merk = response = None
+    if "memory_onset" in timing:
+        merk = round((timing["memory_end"] - timing["memory_onset"]) / 1000, 3)
+    if timing.get("clicks"):
+        response = round((timing["clicks"][-1] - timing["input_onset"]) / 1000, 3)
+    return merk, response
+
+
+def client_results(timings):
+    """Listen (Merkzeiten, Eingabezeiten) aus dem Browser für result_store.trial_rows"""
+    durations = [client_durations(timing) for timing in timings]
+    return [d[0] for d in durations], [d[1] for d in durations]
+
+
+# -----------------------
+# Zeit und Auswertung
+# -----------------------
+def merk_time(start, now, limit=MEMORY_LIMIT_SECONDS):
+    """Merkzeit in Sekunden, höchstens limit (auf ms gerundet)"""
+    return round(min(now - start, limit), 3)
+
+
+def remaining_time(start, now, limit=MEMORY_LIMIT_SECONDS):
+    return max(0, limit - (now - start))
+
+
+def memory_expired(start, now, limit=MEMORY_LIMIT_SECONDS):
+    return now - start >= limit
+
+
+def response_time(start, now):
+    """Eingabezeit in Sekunden (auf ms gerundet); 0.0, wenn kein Start gemessen wurde"""
+    return round(now - start, 3) if start else 0.0
+
+
+def score(selections, sequence):
+    """Anzahl der Symbole an der richtigen Position"""
+    return sum(1 for a, b in zip(selections, sequence) if a == b)
+
+
+def score_many(pairs):
+    """Auswertung vieler (Auswahl, Sequenz)-Paare auf einmal, z.B. für Nachauswertungen"""
+    return [score(selections, sequence) for selections, sequence in pairs]
@@ -0,0 +1,254 @@
+# rerun_profiler.py
+"""Messung der Server-Last je Rerun, aufgeschlüsselt nach Seite und Phase.
+
+Mit MEMORYTEST_PROFILE=1 wird jeder Rerun der Seitensteuerung vermessen
+(HIFLE, STESTsd und ONLINER: Aufruf der Seitenfunktion in main(); stream.py
+und sdsd.py: der Block der aktuellen Stufe):
+
+    wall_ms        Laufzeit des Reruns
+    cpu_ms         CPU-Zeit des Skript-Threads (time.thread_time)
+    elements       an den Browser geschickte Elemente (Delta-Nachrichten)
+    forward_bytes  Größe aller Nachrichten an den Browser
+    images         per st.image erzeugte Bilder und deren Bytes (image_bytes)
+    outcome        "ok", "rerun" (st.rerun), "stop" (st.stop) oder "error"
+
+Jeder Rerun wird als JSON-Zeile in ein rotierendes Protokoll geschrieben
+(MEMORYTEST_PROFILE_LOG, je PROFILE_LOG_BYTES, PROFILE_LOG_BACKUPS alte
+Dateien). Fragment-Reruns (z.B. der Feedback-Timer) laufen an der
+Seitensteuerung vorbei und werden nicht erfasst. Ohne MEMORYTEST_PROFILE
+ist profile_rerun() ein leerer Kontextmanager. Dieselbe Stelle markiert mit
+MEMORYTEST_SAMPLING=1 den Thread für den Stichproben-Profiler.
+
+Welche Seite die meiste Last erzeugt:
+
+    python rerun_profiler.py [rerun_profile.jsonl]
+"""
+import contextlib
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime
+
+import sampling_profiler
+
+PROFILE = os.environ.get("MEMORYTEST_PROFILE", "0") == "1"  # Reruns messen und protokollieren
+PROFILE_LOG = os.environ.get("MEMORYTEST_PROFILE_LOG", "rerun_profile.jsonl")
+PROFILE_LOG_BYTES = 5 * 1024 * 1024  # danach wird das Protokoll rotiert
+PROFILE_LOG_BACKUPS = 3
+
+_local = threading.local()
+_lock = threading.Lock()
+_media_hooked = False
+
+
+def _append(path, line):
+    """Hängt eine Zeile an; wird die Datei zu groß, rückt sie nach path.1, path.2, ..."""
+    data = (line + "\n").encode("utf-8")
+    with _lock:
+        if os.path.exists(path) and os.path.getsize(path) + len(data) > PROFILE_LOG_BYTES:
+            for i in range(PROFILE_LOG_BACKUPS - 1, 0, -1):
+                if os.path.exists(f"{path}.{i}"):
+                    os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+            os.replace(path, f"{path}.1")
+        with open(path, "ab") as f:
+            f.write(data)
+
+
+def _hook_media():
+    """Zählt die Bytes, die st.image dem MediaFileManager übergibt (einmal je Prozess)"""
+    global _media_hooked
+    with _lock:
+        if _media_hooked:
+            return
+        try:
+            from streamlit import runtime
+            if not runtime.exists():
+                return
+            manager = runtime.get_instance().media_file_mgr
+        except Exception:
+            return
+        add = manager.add
+
+        def counting_add(path_or_data, *args, **kwargs):
+            profile = getattr(_local, "profile", None)
+            if profile is not None and isinstance(path_or_data, (bytes, bytearray)):
+                profile.images += 1
+                profile.image_bytes += len(path_or_data)
+            return add(path_or_data, *args, **kwargs)
+
+        manager.add = counting_add
+        _media_hooked = True
+
+
+def _outcome(exc_type):
+    if exc_type is None:
+        return "ok"
+    name = exc_type.__name__
+    if name == "RerunException":
+        return "rerun"
+    if name == "StopException":
+        return "stop"
+    return "error"
+
+
+class RerunProfile:
+    """Kontextmanager um einen Rerun; schreibt beim Verlassen eine Zeile ins Protokoll"""
+
+    def __init__(self, app, page, phase=None, path=PROFILE_LOG):
+        self.app = app
+        self.page = page
+        self.phase = phase
+        self.path = path
+        self.elements = 0
+        self.forward_bytes = 0
+        self.images = 0
+        self.image_bytes = 0
+        self.record = None
+        self._ctx = None
+        self._enqueue = None
+
+    def _count(self, msg):
+        if msg.WhichOneof("type") == "delta":
+            self.elements += 1
+        self.forward_bytes += msg.ByteSize()
+        self._enqueue(msg)
+
+    def __enter__(self):
+        _hook_media()
+        try:
+            from streamlit.runtime.scriptrunner import get_script_run_ctx
+            self._ctx = get_script_run_ctx()
+        except Exception:
+            self._ctx = None
+        if self._ctx is not None:
+            # der Kontext gehört zu genau einer Session; nur deren Nachrichten werden gezählt
+            self._enqueue = self._ctx._enqueue
+            self._ctx._enqueue = self._count
+        _local.profile = self
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+        _local.profile = None
+        if self._ctx is not None:
+            self._ctx._enqueue = self._enqueue
+        self.record = {
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "app": self.app,
+            "page": self.page,
+            "phase": self.phase,
+            "wall_ms": round(wall * 1000, 3),
+            "cpu_ms": round(cpu * 1000, 3),
+            "elements": self.elements,
+            "forward_bytes": self.forward_bytes,
+            "images": self.images,
+            "image_bytes": self.image_bytes,
+            "outcome": _outcome(exc_type),
+            "pid": os.getpid(),
+        }
+        try:
+            _append(self.path, json.dumps(self.record, ensure_ascii=False))
+        except OSError:
+            pass  # die Messung darf den Test nie stören
+        return False
+
+
+@contextlib.contextmanager
+def _nested(managers):
+    with contextlib.ExitStack() as stack:
+        for manager in managers:
+            stack.enter_context(manager)
+        yield
+
+
+def profile_rerun(app, page, phase=None, enabled=None):
+    """RerunProfile mit MEMORYTEST_PROFILE=1 (oder enabled=True), sonst ein leerer Kontextmanager.
+
+    Mit MEMORYTEST_SAMPLING=1 wird der Thread außerdem für den Stichproben-Profiler
+    markiert (sampling_profiler.py).
+    """
+    managers = []
+    if sampling_profiler.ensure_started() is not None:
+        managers.append(sampling_profiler.tagged(app, page, phase))
+    if PROFILE if enabled is None else enabled:
+        managers.append(RerunProfile(app, page, phase))
+    if not managers:
+        return contextlib.nullcontext()
+    if len(managers) == 1:
+        return managers[0]
+    return _nested(managers)
+
+
+def test_phase(test_state):
+    """Phase innerhalb der Testseite (HIFLE, STESTsd, ONLINER)"""
+    if test_state.get('feedback'):
+        return "feedback"
+    if test_state.get('memory_phase'):
+        return "memory"
+    if test_state.get('input_phase'):
+        return "input"
+    return None
+
+
+# -----------------------
+# Auswertung
+# -----------------------
+def read_log(path=PROFILE_LOG):
+    """Alle Einträge inklusive der rotierten Dateien (älteste zuerst)"""
+    records = []
+    paths = [f"{path}.{i}" for i in range(PROFILE_LOG_BACKUPS, 0, -1)] + [path]
+    for p in paths:
+        if not os.path.exists(p):
+            continue
+        with open(p, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    return records
+
+
+def summarize(records):
+    """Kennzahlen je (App, Seite, Phase), sortiert nach Anteil an der gesamten Laufzeit"""
+    groups = {}
+    for record in records:
+        key = (record["app"], record["page"], record["phase"])
+        groups.setdefault(key, []).append(record)
+    total_wall = sum(r["wall_ms"] for r in records) or 1
+
+    rows = []
+    for (app, page, phase), group in groups.items():
+        wall = sorted(r["wall_ms"] for r in group)
+        rows.append({
+            "app": app,
+            "page": page,
+            "phase": phase,
+            "reruns": len(group),
+            "wall_ms_p50": round(statistics.median(wall), 3),
+            "wall_ms_p95": round(wall[min(len(wall) - 1, int(0.95 * len(wall)))], 3),
+            "wall_share": round(sum(wall) / total_wall, 4),
+            "cpu_ms_mean": round(statistics.fmean(r["cpu_ms"] for r in group), 3),
+            "elements_mean": round(statistics.fmean(r["elements"] for r in group), 1),
+            "forward_kb_mean": round(statistics.fmean(r["forward_bytes"] for r in group) / 1024, 2),
+            "image_kb_mean": round(statistics.fmean(r["image_bytes"] for r in group) / 1024, 2),
+        })
+    rows.sort(key=lambda row: row["wall_share"], reverse=True)
+    return rows
+
+
+if __name__ == "__main__":
+    rows = summarize(read_log(sys.argv[1] if len(sys.argv) > 1 else PROFILE_LOG))
+    if not rows:
+        print("Keine Einträge (läuft die App mit MEMORYTEST_PROFILE=1?)")
+    for row in rows:
+        where = f"{row['app']}:{row['page']}" + (f"/{row['phase']}" if row["phase"] else "")
+        print(f"{where:<32} {row['reruns']:>6} Reruns  {row['wall_share'] * 100:5.1f}% der Zeit  "
+              f"p50={row['wall_ms_p50']:.1f} ms  p95={row['wall_ms_p95']:.1f} ms  "
+              f"CPU={row['cpu_ms_mean']:.1f} ms  {row['elements_mean']:.0f} Elemente  "
+              f"{row['forward_kb_mean']:.1f} kB gesendet  {row['image_kb_mean']:.1f} kB Bilder")
@@ -0,0 +1,379 @@
+# result_store.py
+"""Speicherung der Studienergebnisse als Append-Only-Log.
+
+Bisher lädt jede Speicherung die komplette memorytest_results.xlsx mit
+openpyxl, hängt eine Zeile an und schreibt die ganze Datei neu; das wird mit
+jeder Teilnehmerin und jedem Teilnehmer langsamer. Stattdessen wird jede
+abgeschlossene Session als ein JSON-Datensatz (eine Zeile) an
+memorytest_results.jsonl angehängt, in konstanter Zeit.
+
+Alternativ (MEMORYTEST_BACKEND=sqlite) landen die Datensätze in einer
+SQLite-Datenbank im WAL-Modus (memorytest_results.db, Tabellen participants,
+trials und questionnaire_answers). Dort können beliebig viele Sessions
+gleichzeitig schreiben, ohne dass Zeilen verloren gehen oder sich vermischen.
+
+Die gewohnte Excel-Mappe (FARBIG / FARBLOS / QUESTIONNAIRE) wird bei Bedarf
+aus dem Log bzw. der Datenbank erzeugt:
+
+    python result_store.py export [memorytest_results.jsonl|.db] [memorytest_results.xlsx]
+"""
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+# openpyxl optional (nur für den Excel-Export nötig, wird erst dort importiert)
+OPENPYXL_AVAILABLE = importlib.util.find_spec("openpyxl") is not None
+
+RESULTS_LOG = "memorytest_results.jsonl"
+RESULTS_DB = "memorytest_results.db"
+STORE_FILES = {"jsonl": RESULTS_LOG, "sqlite": RESULTS_DB}
+EXCEL_FILENAME = "memorytest_results.xlsx"
+SHEET_COLOR = "FARBIG"
+SHEET_BW = "FARBLOS"
+SHEET_QUESTION = "QUESTIONNAIRE"
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+# -----------------------
+# Datensätze
+# -----------------------
+def trial_rows(test_sizes, merk_times, response_times, correct_counts,
+               client_merk_times=(), client_response_times=(), events=()):
+    """Ein Eintrag pro Test; nicht absolvierte Tests bekommen None.
+
+    client_* sind die im Browser gemessenen Zeiten (memory_engine.client_results),
+    events die kodierten Klickprotokolle (trial_events.encode_all), soweit das
+    Frontend sie liefert.
+    """
+    def at(values, i):
+        return values[i] if i < len(values) else None
+
+    return [
+        {
+            "size": size,
+            "merk_time": at(merk_times, i),
+            "response_time": at(response_times, i),
+            "correct": at(correct_counts, i),
+            "client_merk_time": at(client_merk_times, i),
+            "client_response_time": at(client_response_times, i),
+            "events": at(events, i),
+        }
+        for i, size in enumerate(test_sizes)
+    ]
+
+
+def questionnaire_row(answers, free_text):
+    return {"answers": list(answers), "text": free_text}
+
+
+def session_record(app, participant, variant, trials=None, questionnaire=None):
+    """Datensatz einer Session; trials und/oder questionnaire können fehlen"""
+    record = {
+        "app": app,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "participant": {
+            "id": participant.get("id"),
+            "age": participant.get("age"),
+            "gender": participant.get("gender"),
+        },
+        "variant": variant,
+    }
+    if trials is not None:
+        record["trials"] = trials
+    if questionnaire is not None:
+        record["questionnaire"] = questionnaire
+    return record
+
+
+# -----------------------
+# Log
+# -----------------------
+class ResultLog:
+    """Append-Only-JSONL-Datei; ein Datensatz pro Zeile"""
+
+    def __init__(self, path=RESULTS_LOG):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        self.append_many([record])
+        return self.path
+
+    def append_many(self, records):
+        data = "".join(
+            json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records
+        ).encode("utf-8")
+        # Ein einzelnes write() mit O_APPEND: Zeilen verschiedener Prozesse
+        # werden nicht ineinander geschrieben
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+
+    def records(self):
+        """Liest alle vollständigen Datensätze (eine abgebrochene letzte Zeile wird übersprungen)"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+# -----------------------
+# SQLite (WAL)
+# -----------------------
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS participants (
+    session_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    app            TEXT,
+    created        TEXT,
+    participant_id TEXT,
+    age            INTEGER,
+    gender         TEXT,
+    variant        TEXT
+);
+CREATE TABLE IF NOT EXISTS trials (
+    session_id    INTEGER NOT NULL REFERENCES participants(session_id),
+    trial_index   INTEGER NOT NULL,
+    size          INTEGER,
+    merk_time     REAL,
+    response_time REAL,
+    correct       INTEGER,
+    client_merk_time     REAL,
+    client_response_time REAL,
+    events               TEXT,
+    PRIMARY KEY (session_id, trial_index)
+);
+CREATE TABLE IF NOT EXISTS questionnaire_answers (
+    session_id INTEGER PRIMARY KEY REFERENCES participants(session_id),
+    answers    TEXT,
+    free_text  TEXT
+);
+"""
+
+
+class SQLiteResultStore:
+    """Ergebnis-Datenbank im WAL-Modus mit einer Verbindung pro Thread.
+
+    Gleiche Schnittstelle wie ResultLog (append, append_many, records).
+    """
+
+    def __init__(self, path=RESULTS_DB, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: Transaktionen werden unten explizit gesteuert
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            self._local.conn = conn
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SQLITE_SCHEMA)
+                    self._migrate(conn)
+                    self._schema_ready = True
+        return conn
+
+    def _migrate(self, conn):
+        # ältere Datenbanken um die später hinzugekommenen Spalten ergänzen
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(trials)")}
+        for column, sql_type in (("client_merk_time", "REAL"), ("client_response_time", "REAL"), ("events", "TEXT")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE trials ADD COLUMN {column} {sql_type}")
+
+    def append(self, record):
+        self.append_many([record])
+        return self.path
+
+    def append_many(self, records):
+        """Schreibt alle Datensätze in einer Transaktion"""
+        conn = self._connection()
+        # IMMEDIATE: Schreibsperre gleich zu Beginn holen statt mitten in der Transaktion
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            trials = []
+            answers = []
+            for record in records:
+                participant = record["participant"]
+                cur = conn.execute(
+                    "INSERT INTO participants (app, created, participant_id, age, gender, variant) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (record["app"], record["timestamp"], participant["id"], participant["age"],
+                     participant["gender"], record["variant"]),
+                )
+                session_id = cur.lastrowid
+                for i, trial in enumerate(record.get("trials") or []):
+                    trials.append((session_id, i, trial["size"], trial["merk_time"],
+                                   trial["response_time"], trial["correct"],
+                                   trial.get("client_merk_time"), trial.get("client_response_time"),
+                                   trial.get("events")))
+                questionnaire = record.get("questionnaire")
+                if questionnaire is not None:
+                    answers.append((session_id, json.dumps(questionnaire["answers"]), questionnaire["text"]))
+            conn.executemany(
+                "INSERT INTO trials (session_id, trial_index, size, merk_time, response_time, correct, "
+                "client_merk_time, client_response_time, events) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                trials,
+            )
+            conn.executemany("INSERT INTO questionnaire_answers VALUES (?, ?, ?)", answers)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def records(self):
+        """Setzt die Datensätze wieder im Format von session_record zusammen"""
+        if not os.path.exists(self.path):
+            return
+        conn = self._connection()
+        trials = {}
+        for row in conn.execute(
+            "SELECT session_id, size, merk_time, response_time, correct, client_merk_time, client_response_time, events "
+            "FROM trials ORDER BY session_id, trial_index"
+        ):
+            trials.setdefault(row[0], []).append({
+                "size": row[1], "merk_time": row[2], "response_time": row[3], "correct": row[4],
+                "client_merk_time": row[5], "client_response_time": row[6], "events": row[7],
+            })
+        questionnaires = {
+            row[0]: questionnaire_row(json.loads(row[1]), row[2])
+            for row in conn.execute("SELECT session_id, answers, free_text FROM questionnaire_answers")
+        }
+        for row in conn.execute(
+            "SELECT session_id, app, created, participant_id, age, gender, variant "
+            "FROM participants ORDER BY session_id"
+        ).fetchall():
+            session_id = row[0]
+            record = {
+                "app": row[1],
+                "timestamp": row[2],
+                "participant": {"id": row[3], "age": row[4], "gender": row[5]},
+                "variant": row[6],
+            }
+            if session_id in trials:
+                record["trials"] = trials[session_id]
+            if session_id in questionnaires:
+                record["questionnaire"] = questionnaires[session_id]
+            yield record
+
+
+def open_store(path):
+    """Wählt das Backend anhand der Dateiendung (.db/.sqlite = SQLite, sonst JSONL)"""
+    if path.endswith((".db", ".sqlite", ".sqlite3")):
+        return SQLiteResultStore(path)
+    return ResultLog(path)
+
+
+def get_store(backend="jsonl", path=None):
+    """Prozessweiter Store je Backend und Datei (teilt sich Locks/Verbindungen über alle Sessions)"""
+    path = os.path.abspath(path or STORE_FILES[backend])
+    with _stores_lock:
+        store = _stores.get((backend, path))
+        if store is None:
+            store = SQLiteResultStore(path) if backend == "sqlite" else ResultLog(path)
+            _stores[(backend, path)] = store
+        return store
+
+
+# -----------------------
+# Excel-Export
+# -----------------------
+def _value(v):
+    return "" if v is None else v
+
+
+def test_sheet_row(record):
+    participant = record["participant"]
+    row = {
+        "ID": participant["id"],
+        "Alter": participant["age"],
+        "Geschlecht": participant["gender"],
+        "Testvariante": record["variant"],
+        "Datum": record["timestamp"].replace("T", " "),
+    }
+    for i, trial in enumerate(record["trials"]):
+        row[f"Test_{i+1}_Symbole"] = trial["size"]
+        row[f"Test_{i+1}_Merkzeit"] = _value(trial["merk_time"])
+        row[f"Test_{i+1}_Eingabezeit"] = _value(trial["response_time"])
+        row[f"Test_{i+1}_Korrekt"] = _value(trial["correct"])
+        # im Browser gemessene Zeiten nur, wenn das Frontend sie geliefert hat
+        if trial.get("client_merk_time") is not None:
+            row[f"Test_{i+1}_Merkzeit_Browser"] = trial["client_merk_time"]
+        if trial.get("client_response_time") is not None:
+            row[f"Test_{i+1}_Eingabezeit_Browser"] = trial["client_response_time"]
+        if trial.get("events") is not None:
+            row[f"Test_{i+1}_Ereignisse"] = trial["events"]
+    return row
+
+
+def questionnaire_sheet_row(record):
+    questionnaire = record["questionnaire"]
+    row = {
+        "ID": record["participant"]["id"],
+        "Testvariante": record["variant"],
+        "Datum": record["timestamp"].replace("T", " "),
+    }
+    for i, answer in enumerate(questionnaire["answers"]):
+        row[f"Q{i+1}"] = answer
+    row["Q8_Freitext"] = questionnaire["text"]
+    return row
+
+
+def export_workbook(log_path=RESULTS_LOG, excel_path=EXCEL_FILENAME):
+    """Erzeugt die Excel-Mappe neu aus Log bzw. Datenbank und gibt die Anzahl Zeilen je Blatt zurück"""
+    sheets = {SHEET_COLOR: [], SHEET_BW: [], SHEET_QUESTION: []}
+    for record in open_store(log_path).records():
+        if record.get("trials") is not None:
+            sheet_name = SHEET_COLOR if record["variant"] == "color" else SHEET_BW
+            sheets[sheet_name].append(test_sheet_row(record))
+        if record.get("questionnaire") is not None:
+            sheets[SHEET_QUESTION].append(questionnaire_sheet_row(record))
+
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for sheet_name, rows in sheets.items():
+        if not rows:
+            continue
+        # Spalten in der Reihenfolge ihres ersten Auftretens
+        header = list(dict.fromkeys(key for row in rows for key in row))
+        ws = wb.create_sheet(sheet_name)
+        ws.append(header)
+        for row in rows:
+            ws.append([row.get(key, "") for key in header])
+    wb.save(excel_path)
+    return {sheet_name: len(rows) for sheet_name, rows in sheets.items()}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "export":
+        print("Aufruf: python result_store.py export [log.jsonl|ergebnisse.db] [ausgabe.xlsx]")
+        sys.exit(1)
+    if not OPENPYXL_AVAILABLE:
+        print("openpyxl nicht installiert, Excel-Export nicht möglich.")
+        sys.exit(1)
+    log_path = sys.argv[2] if len(sys.argv) > 2 else RESULTS_LOG
+    excel_path = sys.argv[3] if len(sys.argv) > 3 else EXCEL_FILENAME
+    counts = export_workbook(log_path, excel_path)
+    print(f"{excel_path}: " + ", ".join(f"{name} {n} Zeilen" for name, n in counts.items()))
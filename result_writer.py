@@ -0,0 +1,181 @@
+# result_writer.py
+"""Write-Behind-Queue für die Ergebnisspeicherung.
+
+Bisher wartet die Teilnehmerin bzw. der Teilnehmer nach dem Absenden des
+Fragebogens, bis save_results() fertig geschrieben hat, erst dann erscheint
+die Danke-Seite. Stattdessen nimmt ein prozessweiter Hintergrund-Thread die
+Datensätze über eine begrenzte Queue entgegen: submit() kehrt sofort zurück,
+der Thread schreibt gesammelt (append_many) in den Store aus result_store.py.
+
+- Schreibfehler werden mit wachsender Pause erneut versucht; scheitert ein
+  Batch endgültig, landen die Datensätze in memorytest_results.failed.jsonl.
+- Ist die Queue voll, wird kurz gewartet und notfalls direkt geschrieben,
+  es geht also kein Datensatz verloren.
+- Beim Beenden des Prozesses wird die Queue noch geleert (atexit).
+
+Mit MEMORYTEST_WRITE_BEHIND=0 wird wie bisher synchron geschrieben.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+import result_store
+
+WRITE_BEHIND = os.environ.get("MEMORYTEST_WRITE_BEHIND", "1") == "1"
+QUEUE_MAXSIZE = 1000
+BATCH_SIZE = 50
+MAX_RETRIES = 5
+RETRY_DELAY = 0.2      # Sekunden, verdoppelt sich je Versuch
+SUBMIT_TIMEOUT = 2.0   # so lange wartet submit() bei voller Queue
+FAILED_LOG = "memorytest_results.failed.jsonl"
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+class BackgroundWriter:
+    """Hintergrund-Thread, der Datensätze gesammelt in einen Store schreibt"""
+
+    def __init__(self, store, maxsize=QUEUE_MAXSIZE, batch_size=BATCH_SIZE,
+                 max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY):
+        self.store = store
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._metrics_lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.batches = 0
+        self.sync_writes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, record, timeout=SUBMIT_TIMEOUT):
+        """Reiht den Datensatz ein und kehrt sofort zurück"""
+        with self._metrics_lock:
+            self.submitted += 1
+        try:
+            self._queue.put(record, timeout=timeout)
+        except queue.Full:
+            # Rückstau: lieber einmal warten als einen Datensatz verlieren
+            self._write_batch([record])
+            with self._metrics_lock:
+                self.sync_writes += 1
+        return self.store.path
+
+    def flush(self, timeout=None):
+        """Wartet, bis alle eingereihten Datensätze geschrieben sind"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception:
+                pass  # bereits in failed gezählt, der Thread muss weiterlaufen
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch):
+        start = time.perf_counter()
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.store.append_many(batch)
+                break
+            except Exception:
+                if attempt == self.max_retries:
+                    self._dead_letter(batch)
+                    return
+                with self._metrics_lock:
+                    self.retries += 1
+                time.sleep(delay)
+                delay *= 2
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._metrics_lock:
+            self.written += len(batch)
+            self.batches += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+
+    def _dead_letter(self, batch):
+        """Endgültig gescheiterte Datensätze neben dem Store ablegen"""
+        path = os.path.join(os.path.dirname(self.store.path), FAILED_LOG)
+        try:
+            result_store.get_store("jsonl", path).append_many(batch)
+        finally:
+            with self._metrics_lock:
+                self.failed += len(batch)
+
+    def metrics(self):
+        with self._metrics_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "submitted": self.submitted,
+                "written": self.written,
+                "failed": self.failed,
+                "retries": self.retries,
+                "batches": self.batches,
+                "sync_writes": self.sync_writes,
+                "last_flush_ms": round(self.last_flush_ms, 3),
+                "max_flush_ms": round(self.max_flush_ms, 3),
+                "avg_flush_ms": round(self._total_flush_ms / self.batches, 3) if self.batches else 0.0,
+                "total_flush_ms": round(self._total_flush_ms, 3),
+            }
+
+
+def get_writer(backend="jsonl", path=None):
+    """Prozessweiter Writer je Store (wird beim ersten Aufruf gestartet)"""
+    store = result_store.get_store(backend, path)
+    with _writers_lock:
+        writer = _writers.get(store.path)
+        if writer is None:
+            writer = BackgroundWriter(store)
+            _writers[store.path] = writer
+        return writer
+
+
+def save(backend, record, path=None):
+    """Speichert einen Datensatz (im Hintergrund oder, falls abgeschaltet, sofort) und gibt den Pfad zurück"""
+    if WRITE_BEHIND:
+        return get_writer(backend, path).submit(record)
+    return result_store.get_store(backend, path).append(record)
+
+
+def flush_all(timeout=None):
+    with _writers_lock:
+        writers = list(_writers.values())
+    return all(writer.flush(timeout) for writer in writers)
+
+
+def writer_metrics():
+    """Queue-Tiefe, Durchsatz und Flush-Latenz aller Writer"""
+    with _writers_lock:
+        writers = dict(_writers)
+    return {path: writer.metrics() for path, writer in writers.items()}
+
+
+atexit.register(flush_all, 10.0)
@@ -0,0 +1,216 @@
+# sampling_profiler.py
+"""Stichproben-Profiler für den Studienbetrieb.
+
+cProfile verlangsamt jeden Funktionsaufruf und taugt deshalb nicht für echte
+Sitzungen. Mit MEMORYTEST_SAMPLING=1 läuft stattdessen ein Hintergrund-Thread,
+der SAMPLING_HZ-mal pro Sekunde die Stacks der Streamlit-Skript-Threads
+abliest (sys._current_frames), aber nur solange diese gerade eine Seite
+aufbauen. Welche Seite und Phase das ist, meldet rerun_profiler.profile_rerun()
+über tagged(); die Apps brauchen dafür keinen eigenen Aufruf.
+
+Die Stichproben werden je App, Seite und Phase gezählt und alle
+FLUSH_SECONDS als Collapsed-Stack-Dateien geschrieben, eine Zeile je Stack:
+
+    HIFLE;test/input;show_test_page (HIFLE.py);show_input_phase (HIFLE.py);... 42
+
+Die Dateien (SAMPLING_DIR/<app>_<seite>[_<phase>].<pid>.collapsed) lassen
+sich direkt an flamegraph.pl oder speedscope übergeben. Einen Überblick, ob
+create_shape_image, das Stylesheet oder pandas die Zeit kostet, gibt
+
+    python sampling_profiler.py [profiles]
+"""
+import atexit
+import contextlib
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+SAMPLING = os.environ.get("MEMORYTEST_SAMPLING", "0") == "1"  # Stichproben-Profiler starten
+SAMPLING_HZ = float(os.environ.get("MEMORYTEST_SAMPLING_HZ", "50"))
+SAMPLING_DIR = os.environ.get("MEMORYTEST_SAMPLING_DIR", "profiles")
+FLUSH_SECONDS = float(os.environ.get("MEMORYTEST_SAMPLING_FLUSH", "30"))  # und beim Beenden des Prozesses
+MAX_DEPTH = 64  # tiefere Stacks werden an der Wurzel abgeschnitten
+
+_tags = {}           # Thread-ID -> (App, Seite, Phase) während eines Seitenaufbaus
+_tags_lock = threading.Lock()
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def tag_name(app, page, phase=None):
+    return f"{app};{page}/{phase}" if phase else f"{app};{page}"
+
+
+@contextlib.contextmanager
+def tagged(app, page, phase=None):
+    """Markiert den aktuellen Thread für die Dauer des Blocks als Seitenaufbau"""
+    ident = threading.get_ident()
+    with _tags_lock:
+        _tags[ident] = tag_name(app, page, phase)
+    try:
+        yield
+    finally:
+        with _tags_lock:
+            _tags.pop(ident, None)
+
+
+def _label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)})"
+
+
+def collapse(frame, max_depth=MAX_DEPTH):
+    """Stack als "äußere;...;innere" Funktion, beginnend beim App-Skript"""
+    codes = []
+    while frame is not None and len(codes) < max_depth:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    # Thread-Start, Script-Runner und exec() oberhalb des Skripts sind bei jeder Stichprobe gleich
+    start = next((i for i, code in enumerate(codes) if code.co_name == "<module>"), 0)
+    return ";".join(_label(code) for code in codes[start:])
+
+
+class Sampler:
+    """Hintergrund-Thread, der die markierten Threads abtastet"""
+
+    def __init__(self, hz=SAMPLING_HZ, out_dir=SAMPLING_DIR, flush_seconds=FLUSH_SECONDS):
+        self.interval = 1.0 / hz
+        self.out_dir = out_dir
+        self.flush_seconds = flush_seconds
+        self.counts = {}          # Tag -> Counter(Stack -> Stichproben)
+        self.samples = 0
+        self.overhead_s = 0.0     # Zeit, die das Abtasten selbst gekostet hat
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+    def sample(self):
+        start = time.perf_counter()
+        with _tags_lock:
+            tags = dict(_tags)
+        if tags:
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, tag in tags.items():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    self.counts.setdefault(tag, Counter())[collapse(frame)] += 1
+                    self.samples += 1
+        self.overhead_s += time.perf_counter() - start
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop.wait(self.interval):
+            self.sample()
+            if time.monotonic() - last_flush >= self.flush_seconds:
+                self.flush()
+                last_flush = time.monotonic()
+
+    def flush(self):
+        """Schreibt alle bisherigen Stichproben (kumuliert) als Collapsed-Stack-Dateien"""
+        with self._lock:
+            snapshot = {tag: dict(counter) for tag, counter in self.counts.items()}
+        if not snapshot:
+            return []
+        paths = []
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            for tag, stacks in snapshot.items():
+                name = tag.replace(";", "_").replace("/", "_")
+                path = os.path.join(self.out_dir, f"{name}.{os.getpid()}.collapsed")
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+                        f.write(f"{tag};{stack} {count}\n")
+                os.replace(tmp_path, path)
+                paths.append(path)
+        except OSError:
+            pass  # der Profiler darf die Studie nie stören
+        return paths
+
+    def stats(self):
+        with self._lock:
+            return {
+                "samples": self.samples,
+                "tags": {tag: sum(counter.values()) for tag, counter in self.counts.items()},
+                "overhead_ms_per_sample": round(self.overhead_s * 1000 / self.samples, 4) if self.samples else 0.0,
+            }
+
+
+def ensure_started():
+    """Startet den Profiler einmal je Prozess, falls MEMORYTEST_SAMPLING=1"""
+    global _sampler
+    if not SAMPLING:
+        return None
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = Sampler().start()
+        return _sampler
+
+
+def get_sampler():
+    return _sampler
+
+
+# -----------------------
+# Auswertung
+# -----------------------
+def read_collapsed(out_dir=SAMPLING_DIR):
+    """Alle Collapsed-Stack-Dateien eines Verzeichnisses als Counter(Stack -> Stichproben)"""
+    stacks = Counter()
+    if not os.path.isdir(out_dir):
+        return stacks
+    for name in sorted(os.listdir(out_dir)):
+        if not name.endswith(".collapsed"):
+            continue
+        with open(os.path.join(out_dir, name), encoding="utf-8") as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack:
+                    stacks[stack] += int(count)
+    return stacks
+
+
+def hotspots(stacks, top=8):
+    """Je Tag (App;Seite/Phase) die Funktionen mit den meisten Stichproben (inklusive aufgerufener Funktionen).
+
+    Was in jeder Stichprobe steht (Modul, main), sagt nichts aus und fällt weg.
+    """
+    totals, inclusive = Counter(), {}
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        tag = ";".join(frames[:2])
+        totals[tag] += count
+        functions = inclusive.setdefault(tag, Counter())
+        for function in set(frames[2:]):
+            functions[function] += count
+    return {
+        tag: {
+            "samples": total,
+            "functions": [(f, c) for f, c in inclusive[tag].most_common() if c < total][:top],
+        }
+        for tag, total in totals.most_common()
+    }
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else SAMPLING_DIR
+    report = hotspots(read_collapsed(directory))
+    if not report:
+        print(f"Keine Stichproben in {directory} (läuft die App mit MEMORYTEST_SAMPLING=1?)")
+    for tag, entry in report.items():
+        print(f"{tag.replace(';', ':')}  {entry['samples']} Stichproben")
+        for function, count in entry["functions"]:
+            print(f"  {count / entry['samples'] * 100:5.1f}%  {function}")
@@ -0,0 +1,218 @@
+# session_checkpoint.py
+"""Wiederaufnahme nach Neuladen der Seite.
+
+Ein Reload (oder ein Reconnect, nach dem Streamlit eine neue Session anlegt)
+leert st.session_state; die Teilnehmenden landeten wieder auf der Startseite
+und mussten den laufenden Test wiederholen. Jetzt bekommt jede Session ein
+Resume-Token im Query-Parameter ?resume=..., und bei jedem Phasenwechsel
+(Start der Merkphase, end_memory_phase, finish_test, Wechsel der Seite bzw.
+Stufe) wird der Zustand als Checkpoint unter diesem Token gespeichert.
+
+Die Apps rufen dafür in main() bzw. am Skriptanfang nur zwei Funktionen auf:
+
+    session_checkpoint.resume("HIFLE")                  # beim ersten Lauf: Stand zum Token laden
+    session_checkpoint.save_on_transition("HIFLE", CHECKPOINT_KEYS, marker)
+
+save_on_transition() vergleicht nur den Marker (Seite, Test, Phase) mit dem
+zuletzt gespeicherten und schreibt nur, wenn er sich geändert hat. Das
+geschieht einmal im ersten Rerun nach einem Wechsel, nicht bei jedem Klick.
+Die Checkpoints liegen gepickelt in einer SQLite-Datenbank (WAL, eine
+Verbindung je Thread). Sie verfallen nach CHECKPOINT_TTL Sekunden. Abgelaufene
+Einträge werden alle EVICT_EVERY Schreibvorgänge gelöscht.
+
+Die Zeitpunkte im Zustand stammen von clock.now() (monoton, systemweit), so
+dass Merk- und Eingabezeit nach einem Reload einfach weiterlaufen. Mit
+MEMORYTEST_CHECKPOINTS=0 ist alles abgeschaltet.
+"""
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+CHECKPOINTS = os.environ.get("MEMORYTEST_CHECKPOINTS", "1") == "1"  # Resume-Token und Checkpoints
+CHECKPOINT_DB = os.environ.get("MEMORYTEST_CHECKPOINT_DB", "memorytest_checkpoints.db")
+CHECKPOINT_TTL = float(os.environ.get("MEMORYTEST_CHECKPOINT_TTL", str(6 * 3600)))  # Sekunden
+EVICT_EVERY = 200  # Schreibvorgänge zwischen zwei Aufräumläufen
+TOKEN_PARAM = "resume"
+
+CHECKPOINT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    token   TEXT PRIMARY KEY,
+    app     TEXT NOT NULL,
+    updated REAL NOT NULL,
+    state   BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS checkpoints_updated ON checkpoints (updated);
+"""
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class CheckpointStore:
+    """Checkpoints je Token; updated ist Wanduhrzeit (time.time), damit die TTL Neustarts übersteht"""
+
+    def __init__(self, path=CHECKPOINT_DB, ttl=CHECKPOINT_TTL, timeout=30.0):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._writes = 0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(CHECKPOINT_SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def save(self, token, app, state, now=None):
+        now = time.time() if now is None else now
+        data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO checkpoints (token, app, updated, state) VALUES (?, ?, ?, ?)",
+            (token, app, now, data),
+        )
+        self._writes += 1
+        if self._writes % EVICT_EVERY == 0:
+            self.evict(now)
+        return len(data)
+
+    def load(self, token, app, now=None):
+        """Gespeicherter Zustand oder None (unbekannt, andere App oder abgelaufen)"""
+        now = time.time() if now is None else now
+        row = self._connection().execute(
+            "SELECT state FROM checkpoints WHERE token = ? AND app = ? AND updated >= ?",
+            (token, app, now - self.ttl),
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def delete(self, token):
+        self._connection().execute("DELETE FROM checkpoints WHERE token = ?", (token,))
+
+    def evict(self, now=None):
+        """Löscht abgelaufene Checkpoints und gibt ihre Anzahl zurück"""
+        now = time.time() if now is None else now
+        return self._connection().execute(
+            "DELETE FROM checkpoints WHERE updated < ?", (now - self.ttl,)
+        ).rowcount
+
+
+def get_store(path=CHECKPOINT_DB):
+    """Prozessweiter Store je Datei"""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = CheckpointStore(path)
+            _stores[path] = store
+        return store
+
+
+# -----------------------
+# Anbindung an st.session_state
+# -----------------------
+def test_marker(page, test_state):
+    """Marker für HIFLE, STESTsd und ONLINER: Seite, Test und Phase innerhalb des Tests"""
+    return (
+        page,
+        test_state.get('current_test'),
+        bool(test_state.get('test_started')),
+        bool(test_state.get('memory_phase')),
+        bool(test_state.get('input_phase')),
+        bool(test_state.get('feedback')),
+    )
+
+
+def resume(app):
+    """Beim ersten Lauf einer Session: Zustand zum Token aus der URL laden oder ein neues Token vergeben.
+
+    Gibt True zurück, wenn ein Checkpoint wiederhergestellt wurde.
+    """
+    if not CHECKPOINTS or "_checkpoint_token" in st.session_state:
+        return False
+    token = st.query_params.get(TOKEN_PARAM)
+    state = None
+    if token:
+        try:
+            state = get_store().load(token, app)
+        except (sqlite3.Error, pickle.UnpicklingError):
+            state = None
+    if state is None:
+        token = secrets.token_urlsafe(12)
+        st.query_params[TOKEN_PARAM] = token
+    else:
+        for key, value in state.items():
+            st.session_state[key] = value
+    st.session_state._checkpoint_token = token
+    st.session_state._checkpoint_marker = None
+    return state is not None
+
+
+def session_token():
+    """Eindeutige Kennung der laufenden Teilnahme: das Resume-Token, ohne Checkpoints eine eigene Zufalls-ID.
+
+    Für variant_assignment und trial_plans; die Teilnehmer-ID aus Initialen und
+    Geburtsjahr kann bei zwei Personen gleich sein. "Neuen Test starten" vergibt
+    eine neue Kennung.
+    """
+    token = st.session_state.get("_checkpoint_token")
+    if token is None:
+        if "_session_token" not in st.session_state:
+            st.session_state._session_token = secrets.token_urlsafe(12)
+        token = st.session_state._session_token
+    return token
+
+
+def reset():
+    """Für "Neuen Test starten": Checkpoint der bisherigen Teilnahme löschen und ein neues Token vergeben.
+
+    Nach dem Zurücksetzen von st.session_state aufrufen; ohne das stünde das alte
+    Token noch in der URL, und resume() würde im nächsten Lauf den abgeschlossenen
+    Test wiederherstellen. Auch session_token() liefert danach eine neue Kennung,
+    damit die nächste Person eine eigene Variante und einen eigenen Testplan bekommt.
+    """
+    if "_session_token" in st.session_state:
+        del st.session_state["_session_token"]
+    if not CHECKPOINTS:
+        return
+    token = st.session_state.get("_checkpoint_token") or st.query_params.get(TOKEN_PARAM)
+    if token:
+        try:
+            get_store().delete(token)
+        except sqlite3.Error:
+            pass  # läuft nach CHECKPOINT_TTL ohnehin ab
+    if TOKEN_PARAM in st.query_params:
+        del st.query_params[TOKEN_PARAM]
+    token = secrets.token_urlsafe(12)
+    st.query_params[TOKEN_PARAM] = token
+    st.session_state._checkpoint_token = token
+    st.session_state._checkpoint_marker = None
+
+
+def save_on_transition(app, keys, marker):
+    """Speichert die Schlüssel keys aus st.session_state, wenn sich marker seit dem letzten Checkpoint geändert hat"""
+    if not CHECKPOINTS:
+        return False
+    token = st.session_state.get("_checkpoint_token")
+    if token is None or st.session_state.get("_checkpoint_marker") == marker:
+        return False
+    state = {key: st.session_state[key] for key in keys if key in st.session_state}
+    try:
+        get_store().save(token, app, state)
+    except sqlite3.Error:
+        return False  # ohne Checkpoint geht die Studie trotzdem weiter
+    st.session_state._checkpoint_marker = marker
+    return True
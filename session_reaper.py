@@ -0,0 +1,262 @@
+# session_reaper.py
+"""Aufräumen verlassener Sessions und Speicherbilanz je Session.
+
+Schließt jemand mitten im Test den Tab, bleiben test_state, Fragebogen-
+antworten und vorgerenderte Symbole (sequence_markup) im Speicher, bis
+Streamlit die Session irgendwann verwirft. Die Apps melden deshalb bei jedem
+Lauf ihre Session an:
+
+    session_reaper.track("HIFLE", CHECKPOINT_KEYS, phase, partial_record)
+
+Ein Hintergrund-Thread prüft alle SCAN_SECONDS:
+
+- wie groß der Zustand jeder Session ist (rekursiv über die angegebenen
+  Schlüssel, bei Dicts wie test_state auch je Eintrag: sequence,
+  user_selections, merk_times, ...),
+- welche Sessions länger als IDLE_SECONDS in der Merk- oder Eingabephase
+  stehen. Von diesen wird mit partial_record(zustand) ein Teil-Datensatz
+  der bis dahin absolvierten Tests geschrieben (status "abandoned", eigene
+  Datei PARTIAL_LOG, damit er die vollständigen Ergebnisse nicht
+  vermischt), danach werden die Schlüssel aus dem Session State gelöscht.
+
+Kommt die Person doch zurück, stellt session_checkpoint.resume() den Stand
+aus dem letzten Checkpoint wieder her (das Resume-Token wird mit gelöscht).
+
+Wird der Tab geschlossen, verwirft Streamlit die getrennte Session schon nach
+etwa zwei Minuten, lange vor IDLE_SECONDS. Solche Sessions werden vergessen;
+standen sie in der Merk- oder Eingabephase, wird vorher ebenfalls der
+Teil-Datensatz geschrieben (der Zustand ist über die gemerkte Referenz noch
+lesbar). Löschen ist dann nicht mehr nötig. Läuft unter demselben
+Resume-Token schon eine neue Session (Reload), entfällt der Teil-Datensatz.
+
+summary() liefert die Bilanz (Sessions, Bytes je Session, aufgeräumte
+Sessions und freigegebene Bytes). Mit MEMORYTEST_REAPER=0 ist alles aus.
+"""
+import os
+import sys
+import threading
+import time
+
+import result_writer
+
+REAPER = os.environ.get("MEMORYTEST_REAPER", "1") == "1"  # verlassene Sessions aufräumen
+IDLE_SECONDS = float(os.environ.get("MEMORYTEST_IDLE_SECONDS", str(15 * 60)))
+SCAN_SECONDS = 60
+REAP_PHASES = ("memory", "input")
+PARTIAL_BACKEND = os.environ.get("MEMORYTEST_PARTIAL_BACKEND", "jsonl")  # "jsonl" oder "sqlite"
+PARTIAL_LOG = os.environ.get("MEMORYTEST_PARTIAL_LOG", "memorytest_partial.jsonl")
+# werden mit gelöscht, damit resume() nach der Rückkehr den Checkpoint lädt
+CHECKPOINT_STATE_KEYS = ("_checkpoint_token", "_checkpoint_marker")
+
+_sessions = {}
+_lock = threading.Lock()
+_monitor = None
+_totals = {"reaped": 0, "forgotten": 0, "bytes_reclaimed": 0, "partial_records": 0}
+
+
+def deep_sizeof(obj, seen=None):
+    """Speicherbedarf von obj inklusive enthaltener Dicts, Listen, Tupel und Mengen"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+class TrackedSession:
+    __slots__ = ("session_id", "app", "state", "keys", "phase", "partial_record", "last_seen")
+
+    def __init__(self, session_id, app, state, keys, phase, partial_record, last_seen):
+        self.session_id = session_id
+        self.app = app
+        self.state = state
+        self.keys = keys
+        self.phase = phase
+        self.partial_record = partial_record
+        self.last_seen = last_seen
+
+    def snapshot(self):
+        return {key: self.state[key] for key in self.keys if key in self.state}
+
+    def sizes(self):
+        """Bytes je Schlüssel; Dicts zusätzlich je Eintrag (z.B. test_state.sequence)"""
+        parts = {}
+        for key, value in self.snapshot().items():
+            parts[key] = deep_sizeof(value)
+            if isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    parts[f"{key}.{sub_key}"] = deep_sizeof(sub_value)
+        return parts
+
+
+def track(app, keys, phase, partial_record=None):
+    """Meldet die laufende Session an (einmal je Lauf; kostet nur einen Dict-Eintrag)"""
+    if not REAPER:
+        return
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except ImportError:
+        return
+    if ctx is None:
+        return
+    with _lock:
+        _sessions[ctx.session_id] = TrackedSession(
+            ctx.session_id, app, ctx.session_state, list(keys), phase, partial_record, time.monotonic()
+        )
+    _ensure_monitor()
+
+
+def _session_alive(session_id):
+    try:
+        from streamlit import runtime
+        if not runtime.exists():
+            return True
+        return runtime.get_instance()._session_mgr.get_session_info(session_id) is not None
+    except Exception:
+        return True
+
+
+def _write_partial(session, snapshot):
+    if session.partial_record is None:
+        return
+    record = session.partial_record(snapshot)
+    if record is not None:
+        record["status"] = "abandoned"
+        record["abandoned_phase"] = session.phase
+        result_writer.save(PARTIAL_BACKEND, record, PARTIAL_LOG)
+        with _lock:
+            _totals["partial_records"] += 1
+
+
+def _resumed_elsewhere(session):
+    """True, wenn eine andere angemeldete Session mit demselben Resume-Token läuft (Reload statt geschlossener Tab)"""
+    try:
+        token = session.state["_checkpoint_token"]
+    except (KeyError, RuntimeError):
+        return False
+    with _lock:
+        others = [other for other in _sessions.values() if other is not session]
+    for other in others:
+        try:
+            if other.state["_checkpoint_token"] == token:
+                return True
+        except (KeyError, RuntimeError):
+            continue
+    return False
+
+
+def _reap(session):
+    """Schreibt den Teil-Datensatz und löscht den Zustand; gibt die freigegebenen Bytes zurück"""
+    snapshot = session.snapshot()
+    size = deep_sizeof(snapshot)
+    _write_partial(session, snapshot)
+    for key in list(snapshot) + list(CHECKPOINT_STATE_KEYS):
+        try:
+            del session.state[key]
+        except KeyError:
+            pass
+    return size
+
+
+def scan(now=None, idle_seconds=IDLE_SECONDS):
+    """Ein Prüflauf; gibt die Liste der aufgeräumten Sessions zurück (auch geschlossene Tabs mitten im Test)"""
+    now = time.monotonic() if now is None else now
+    with _lock:
+        sessions = list(_sessions.values())
+    reaped = []
+    for session in sessions:
+        if not _session_alive(session.session_id):
+            with _lock:
+                if _sessions.get(session.session_id) is not session:
+                    continue
+                del _sessions[session.session_id]
+                _totals["forgotten"] += 1
+            if session.phase in REAP_PHASES and not _resumed_elsewhere(session):
+                # Tab geschlossen: Streamlit hat die Session verworfen, bevor IDLE_SECONDS um waren
+                try:
+                    snapshot = session.snapshot()
+                    _write_partial(session, snapshot)
+                except RuntimeError:
+                    continue
+                reaped.append({"session": session.session_id, "app": session.app,
+                               "phase": session.phase, "bytes": deep_sizeof(snapshot), "closed": True})
+            continue
+        if session.phase not in REAP_PHASES or now - session.last_seen < idle_seconds:
+            continue
+        with _lock:
+            # in der Zwischenzeit wieder aktiv geworden?
+            if _sessions.get(session.session_id) is not session:
+                continue
+            del _sessions[session.session_id]
+        try:
+            reclaimed = _reap(session)
+        except RuntimeError:
+            continue  # Zustand wurde gerade verändert; die Session ist also nicht verlassen
+        with _lock:
+            _totals["reaped"] += 1
+            _totals["bytes_reclaimed"] += reclaimed
+        reaped.append({"session": session.session_id, "app": session.app,
+                       "phase": session.phase, "bytes": reclaimed, "closed": False})
+    return reaped
+
+
+def _run():
+    while True:
+        time.sleep(SCAN_SECONDS)
+        try:
+            scan()
+        except Exception:
+            pass  # der nächste Lauf versucht es wieder
+
+
+def _ensure_monitor():
+    global _monitor
+    with _lock:
+        if _monitor is None:
+            _monitor = threading.Thread(target=_run, name="session-reaper", daemon=True)
+            _monitor.start()
+
+
+def session_sizes(now=None):
+    """Größe und Leerlauf jeder angemeldeten Session, größte zuerst"""
+    now = time.monotonic() if now is None else now
+    with _lock:
+        sessions = list(_sessions.values())
+    rows = []
+    for session in sessions:
+        try:
+            parts = session.sizes()
+        except RuntimeError:
+            continue
+        rows.append({
+            "session": session.session_id,
+            "app": session.app,
+            "phase": session.phase,
+            "idle_s": round(now - session.last_seen, 1),
+            "bytes": deep_sizeof(session.snapshot()),
+            "parts": parts,
+        })
+    rows.sort(key=lambda row: row["bytes"], reverse=True)
+    return rows
+
+
+def summary(now=None):
+    """Bilanz: angemeldete Sessions, belegte und freigegebene Bytes"""
+    rows = session_sizes(now)
+    sizes = [row["bytes"] for row in rows]
+    with _lock:
+        totals = dict(_totals)
+    return {
+        "sessions": len(rows),
+        "bytes_total": sum(sizes),
+        "bytes_max": max(sizes, default=0),
+        "bytes_mean": round(sum(sizes) / len(sizes)) if sizes else 0,
+        "idle_in_test": sum(1 for row in rows if row["phase"] in REAP_PHASES and row["idle_s"] >= IDLE_SECONDS),
+        **totals,
+    }
@@ -0,0 +1,113 @@
+# shape_cache.py
+"""Prozessweiter LRU-Cache für gerenderte Symbolbilder.
+
+Die Streamlit-Apps (HIFLE, STESTsd, ONLINER) zeichnen bei jedem Rerun alle
+16 Symbole des Eingaberasters und die Merksequenz neu. Streamlit führt das
+App-Skript bei jedem Rerun komplett neu aus, deshalb lebt der Cache in diesem
+importierten Modul: er wird einmal pro Serverprozess angelegt und von allen
+Sessions gemeinsam genutzt.
+"""
+import io
+import threading
+from collections import OrderedDict
+
+# 16 Symbole x 2 Varianten x 2 Zustände x 3-4 Größen passen bequem hinein
+DEFAULT_MAXSIZE = 256
+
+_caches = {}
+_registry_lock = threading.Lock()
+
+
+class ShapeImageCache:
+    """Begrenzter, thread-sicherer Cache für (Bild, PNG-Bytes) je Symbol.
+
+    Schlüssel ist (shape, color, size, variant, selected). ``render`` ist die
+    create_shape_image-Funktion der jeweiligen App.
+    """
+
+    def __init__(self, render, maxsize=DEFAULT_MAXSIZE):
+        self._render = render
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _entry(self, shape, color, size, variant, selected):
+        key = (shape, color, size, variant, selected)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Zeichnen außerhalb des Locks, damit andere Sessions nicht warten
+        if selected:
+            img = self._render(shape, color, size=size, variant=variant, selected=True)
+        else:
+            img = self._render(shape, color, size=size, variant=variant)
+        buffered = io.BytesIO()
+        img.save(buffered, format="PNG")
+        entry = (img, buffered.getvalue())
+
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                # Eine andere Session war schneller
+                return existing
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def get_image(self, shape, color, size=80, variant="color", selected=False):
+        """Gibt das (nicht zu verändernde) PIL-Bild zurück"""
+        return self._entry(shape, color, size, variant, selected)[0]
+
+    def get_png(self, shape, color, size=80, variant="color", selected=False):
+        """Gibt die fertig kodierten PNG-Bytes zurück"""
+        return self._entry(shape, color, size, variant, selected)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def get_cache(name, render, maxsize=DEFAULT_MAXSIZE):
+    """Liefert den prozessweiten Cache für eine App (wird beim ersten Aufruf angelegt).
+
+    Ändert sich der Code der Render-Funktion (z.B. nach einem Hot-Reload der
+    App-Datei), wird der Cache geleert, damit keine veralteten Bilder ausgeliefert werden.
+    """
+    with _registry_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = ShapeImageCache(render, maxsize)
+            _caches[name] = cache
+        elif cache._render.__code__ != render.__code__:
+            cache._render = render
+            cache.clear()
+        return cache
+
+
+def cache_stats():
+    """Hit/Miss/Eviction-Zähler aller registrierten Caches"""
+    with _registry_lock:
+        caches = dict(_caches)
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -0,0 +1,88 @@
+# shape_geometry.py
+"""Gemeinsame Geometrie der 16 Symbole für alle Renderer.
+
+Die Koordinaten standen bisher dreimal im Code: in create_shape_image (PIL),
+svg_for_shape (stream.py / sdsd.py) und MemoryTestApp._draw_shape (tkinter),
+jeweils hinter einer langen if/elif-Kette. Hier steht jedes Symbol einmal als
+Liste von Grundelementen auf einem 100x100-Raster:
+
+    ("ellipse", (x0, y0, x1, y1))   Kreis über Bounding-Box
+    ("rect",    (x0, y0, x1, y1))
+    ("polygon", (x, y, x, y, ...))  Fläche mit Füll- und Randfarbe
+    ("line",    (x0, y0, x1, y1))   Linie in Randfarbe
+    ("head",    (x, y, x, y, ...))  Pfeilspitze, ganz in Randfarbe
+
+Die Renderer schlagen nur noch nach; die skalierten Koordinaten werden je
+Ausgabegröße einmal berechnet und gecacht.
+"""
+from functools import lru_cache
+
+GRID = 100
+
+GEOMETRY = {
+    "Kreis": (("ellipse", (10, 10, 90, 90)),),
+    "Quadrat": (("rect", (12, 12, 88, 88)),),
+    "Raute": (("polygon", (50, 8, 88, 50, 50, 92, 12, 50)),),
+    "Stern": (("polygon", (50, 12, 58, 34, 80, 34, 62, 50, 68, 74, 50, 60, 32, 74, 38, 50, 20, 34, 42, 34)),),
+    "Dreieck": (("polygon", (50, 10, 90, 80, 10, 80)),),
+    "PfeilOben": (("polygon", (50, 10, 78, 50, 62, 50, 62, 90, 38, 90, 38, 50, 22, 50)),),
+    "PfeilUnten": (("polygon", (50, 90, 78, 50, 62, 50, 62, 10, 38, 10, 38, 50, 22, 50)),),
+    "PfeilLinks": (("polygon", (10, 50, 50, 10, 50, 30, 90, 30, 90, 70, 50, 70, 50, 90)),),
+    "PfeilRechts": (("polygon", (90, 50, 50, 10, 50, 30, 10, 30, 10, 70, 50, 70, 50, 90)),),
+    "Doppelpfeil_H": (
+        ("line", (18, 50, 82, 50)),
+        ("head", (18, 50, 30, 40, 30, 60)),
+        ("head", (82, 50, 70, 40, 70, 60)),
+    ),
+    "Doppelpfeil_V": (
+        ("line", (50, 18, 50, 82)),
+        ("head", (50, 18, 40, 30, 60, 30)),
+        ("head", (50, 82, 40, 70, 60, 70)),
+    ),
+}
+
+# Formen mit gefüllter (_f) und hohler (_h) Variante
+FAMILIES = ("Kreis", "Quadrat", "Raute", "Stern", "Dreieck")
+FALLBACK = "Kreis"
+
+
+@lru_cache(maxsize=None)
+def primitives(shape):
+    """Grundelemente eines Symbols (unbekannte Symbole werden als Kreis gezeichnet)"""
+    if shape in GEOMETRY:
+        return GEOMETRY[shape]
+    for family in FAMILIES:
+        if shape.startswith(family):
+            return GEOMETRY[family]
+    return GEOMETRY[FALLBACK]
+
+
+@lru_cache(maxsize=1024)
+def scaled(shape, size):
+    """Grundelemente mit Koordinaten für eine Ausgabe von size x size Pixeln"""
+    return tuple(
+        (kind, tuple(c * size / GRID for c in coords))
+        for kind, coords in primitives(shape)
+    )
+
+
+@lru_cache(maxsize=512)
+def svg_elements(shape, fill, stroke, stroke_width):
+    """SVG-Elemente im viewBox 0 0 100 100 (ohne umschließendes <svg>)"""
+    paint = f'fill="{fill}" stroke="{stroke}" stroke-width="{stroke_width}"'
+    parts = []
+    for kind, coords in primitives(shape):
+        if kind == "ellipse":
+            x0, y0, x1, y1 = coords
+            parts.append(f'<circle cx="{(x0 + x1) // 2}" cy="{(y0 + y1) // 2}" r="{(x1 - x0) // 2}" {paint} />')
+        elif kind == "rect":
+            x0, y0, x1, y1 = coords
+            parts.append(f'<rect x="{x0}" y="{y0}" width="{x1 - x0}" height="{y1 - y0}" {paint} />')
+        elif kind == "line":
+            x0, y0, x1, y1 = coords
+            parts.append(f'<line x1="{x0}" y1="{y0}" x2="{x1}" y2="{y1}" stroke="{stroke}" stroke-width="{stroke_width}"/>')
+        else:
+            # polygon und head: im SVG wie bisher mit Füll- und Randfarbe
+            points = " ".join(f"{coords[i]},{coords[i+1]}" for i in range(0, len(coords), 2))
+            parts.append(f'<polygon points="{points}" {paint} />')
+    return "".join(parts)
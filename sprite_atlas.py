@@ -0,0 +1,171 @@
+# sprite_atlas.py
+"""Sprite-Atlas für die 16 Symbole.
+
+Build-Schritt (einmal vor dem Start des Studienservers):
+
+    python sprite_atlas.py
+
+rendert alle Kombinationen SHAPES x Variante (color/bw) x Zustand
+(normal/selected/grayed) in static/sprites.png und schreibt dazu das
+Offset-Manifest static/sprites.json und das Stylesheet static/sprites.css.
+Streamlit liefert den Ordner static/ aus (server.enableStaticServing in
+.streamlit/config.toml), der Browser lädt den Atlas also nur einmal.
+
+Im Sprite-Modus (MEMORYTEST_RENDER_MODE=sprites) verweisen die Apps pro Symbol
+nur noch per CSS-Klasse auf den Atlas statt ein Bild bzw. SVG zu senden.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "app/static"
+
+ATLAS_PNG = "sprites.png"
+ATLAS_CSS = "sprites.css"
+ATLAS_MANIFEST = "sprites.json"
+
+CELL_SIZE = 140  # größte verwendete Darstellung, kleinere werden per CSS skaliert
+VARIANTS = ["color", "bw"]
+STATES = ["normal", "selected", "grayed"]
+
+GRAY_FILL = (187, 187, 187, 255)  # wie "#BBBBBB" in svg_for_shape
+HIGHLIGHT_FILL = (72, 124, 218, 30)
+HIGHLIGHT_OUTLINE = (72, 124, 218, 100)
+
+_manifest = None
+_manifest_mtime = None
+_manifest_lock = threading.Lock()
+
+
+def sprite_key(shape, variant, state):
+    return f"{shape}|{variant}|{state}"
+
+
+# -----------------------
+# Build
+# -----------------------
+def _selected_image(render, shape, color, variant):
+    """Symbol auf hervorgehobenem Hintergrundkreis (wie create_shape_image mit selected=True)"""
+    from PIL import Image, ImageDraw
+
+    img = Image.new('RGBA', (CELL_SIZE, CELL_SIZE), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse([4, 4, CELL_SIZE - 4, CELL_SIZE - 4], fill=HIGHLIGHT_FILL, outline=HIGHLIGHT_OUTLINE, width=2)
+    shape_img = render(shape, color, size=CELL_SIZE - 8, variant=variant)
+    img.alpha_composite(shape_img, (4, 4))
+    return img
+
+
+def _grayed_image(base):
+    """Einheitlich graues Symbol (wie gray=True in svg_for_shape)"""
+    from PIL import Image
+
+    img = Image.new('RGBA', base.size, GRAY_FILL)
+    img.putalpha(base.getchannel("A"))
+    return img
+
+
+def build_atlas(shapes, colors, render, static_dir=STATIC_DIR):
+    """Rendert den Atlas und schreibt PNG, Manifest und Stylesheet nach static_dir"""
+    from PIL import Image
+
+    cols = len(shapes)
+    rows = len(VARIANTS) * len(STATES)
+    atlas = Image.new('RGBA', (cols * CELL_SIZE, rows * CELL_SIZE), (255, 255, 255, 0))
+
+    positions = {}
+    for col, shape in enumerate(shapes):
+        color = colors[col]
+        for v, variant in enumerate(VARIANTS):
+            normal = render(shape, color, size=CELL_SIZE, variant=variant)
+            images = {
+                "normal": normal,
+                "selected": _selected_image(render, shape, color, variant),
+                "grayed": _grayed_image(normal),
+            }
+            for s, state in enumerate(STATES):
+                row = v * len(STATES) + s
+                atlas.alpha_composite(images[state], (col * CELL_SIZE, row * CELL_SIZE))
+                positions[sprite_key(shape, variant, state)] = (col, row)
+
+    buffered = io.BytesIO()
+    atlas.save(buffered, format="PNG", optimize=True)
+    png = buffered.getvalue()
+    version = hashlib.sha1(png).hexdigest()[:10]
+
+    sprites = {}
+    css = [
+        f".sprite{{display:block;margin:0 auto;background-image:url({ATLAS_PNG}?v={version});"
+        f"background-size:{cols * 100}% {rows * 100}%;background-repeat:no-repeat}}"
+    ]
+    for key, (col, row) in positions.items():
+        shape, variant, state = key.split("|")
+        css_class = f"sp-{col}-{variant[0]}{state[0]}"
+        x = col / (cols - 1) * 100 if cols > 1 else 0
+        y = row / (rows - 1) * 100 if rows > 1 else 0
+        css.append(f".{css_class}{{background-position:{x:.4f}% {y:.4f}%}}")
+        sprites[key] = {"class": css_class, "x": col * CELL_SIZE, "y": row * CELL_SIZE}
+
+    manifest = {
+        "version": version,
+        "cell_size": CELL_SIZE,
+        "columns": cols,
+        "rows": rows,
+        "image": ATLAS_PNG,
+        "stylesheet": ATLAS_CSS,
+        "sprites": sprites,
+    }
+
+    os.makedirs(static_dir, exist_ok=True)
+    with open(os.path.join(static_dir, ATLAS_PNG), "wb") as f:
+        f.write(png)
+    with open(os.path.join(static_dir, ATLAS_CSS), "w", encoding="utf-8") as f:
+        f.write("\n".join(css))
+    with open(os.path.join(static_dir, ATLAS_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    return manifest
+
+
+# -----------------------
+# Laufzeit (Apps)
+# -----------------------
+def load_manifest(static_dir=STATIC_DIR):
+    """Liest das Manifest (gecacht, neu geladen wenn der Atlas neu gebaut wurde)"""
+    global _manifest, _manifest_mtime
+    path = os.path.join(static_dir, ATLAS_MANIFEST)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _manifest_lock:
+        if _manifest is None or mtime != _manifest_mtime:
+            with open(path, encoding="utf-8") as f:
+                _manifest = json.load(f)
+            _manifest_mtime = mtime
+        return _manifest
+
+
+def available():
+    return load_manifest() is not None
+
+
+def stylesheet_link():
+    """<link> auf das Sprite-Stylesheet; der Browser cached es über die Version"""
+    manifest = load_manifest()
+    return f'<link rel="stylesheet" href="{STATIC_URL}/{manifest["stylesheet"]}?v={manifest["version"]}">'
+
+
+def sprite_html(shape, variant="color", state="normal", size=80):
+    """Markup für ein Symbol aus dem Atlas (wenige Bytes statt eines Bildes)"""
+    sprite = load_manifest()["sprites"][sprite_key(shape, variant, state)]
+    return f'<span class="sprite {sprite["class"]}" style="width:{size}px;height:{size}px"></span>'
+
+
+if __name__ == "__main__":
+    from HIFLE import SHAPES, COLORS, create_shape_image
+
+    manifest = build_atlas(SHAPES, COLORS, create_shape_image)
+    print(f"{len(manifest['sprites'])} Sprites geschrieben nach {STATIC_DIR} (Version {manifest['version']})")
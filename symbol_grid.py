@@ -0,0 +1,121 @@
+# symbol_grid.py
+"""Eingaberaster der Symbole als ein einziges Element.
+
+show_input_phase baut das 2x8-Raster bisher aus st.columns auf: je Symbol ein
+st.button, ein Bild und mehrere st.markdown, zusammen gut 60 Elemente pro
+Rerun. Im Composite-Modus (MEMORYTEST_INPUT_GRID=composite) wird das ganze
+Raster samt Hervorhebung und "Position n"-Markierung als ein SVG gerendert und
+in einer Komponente angezeigt (components/symbol_grid/index.html). Der Browser
+meldet nur die Klickkoordinate im SVG, index_at() rechnet sie auf das Symbol
+zurück. Ein Klick ändert damit genau ein Element.
+"""
+import os
+from functools import lru_cache
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+import memory_engine
+import shape_geometry
+
+_COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "symbol_grid")
+_symbol_grid = components.declare_component("symbol_grid", path=_COMPONENT_DIR)
+
+COLUMNS = 8
+CELL = 100        # Breite/Höhe einer Zelle im viewBox
+PADDING = 8       # Abstand des Symbols zum Zellrand
+BADGE_HEIGHT = 24  # Platz für "✓ Position n" unter jeder Reihe
+ROW_HEIGHT = CELL + BADGE_HEIGHT
+
+HIGHLIGHT_FILL = "rgba(72, 124, 218, 0.12)"   # wie create_shape_image mit selected=True
+HIGHLIGHT_STROKE = "rgba(72, 124, 218, 0.4)"
+BADGE_COLOR = "#28a745"
+
+
+def grid_size(count, columns=COLUMNS):
+    """Breite und Höhe des viewBox für count Symbole"""
+    rows = (count + columns - 1) // columns
+    return columns * CELL, rows * ROW_HEIGHT
+
+
+def index_at(x, y, count, columns=COLUMNS):
+    """Index des Symbols unter der Koordinate (x, y) im viewBox oder None"""
+    if x < 0 or y < 0:
+        return None
+    col = int(x // CELL)
+    row = int(y // ROW_HEIGHT)
+    # Klicks auf die Markierung unter dem Symbol zählen nicht
+    if col >= columns or y - row * ROW_HEIGHT > CELL:
+        return None
+    index = row * columns + col
+    return index if index < count else None
+
+
+@lru_cache(maxsize=512)
+def _cell_svg(shape, color, variant, selected):
+    """SVG einer Zelle (Hervorhebung und Symbol) in Zellkoordinaten"""
+    is_hollow = shape.endswith("_h")
+    draw_color = "black" if variant == "bw" else color
+    fill = "white" if is_hollow else draw_color
+    stroke_width = 4 if is_hollow else 2
+    scale = (CELL - 2 * PADDING) / shape_geometry.GRID
+
+    parts = []
+    if selected:
+        parts.append(
+            f'<circle cx="{CELL / 2}" cy="{CELL / 2}" r="{CELL / 2 - 2}" '
+            f'fill="{HIGHLIGHT_FILL}" stroke="{HIGHLIGHT_STROKE}" stroke-width="2" />'
+        )
+    parts.append(
+        f'<g transform="translate({PADDING},{PADDING}) scale({scale})">'
+        f'{shape_geometry.svg_elements(shape, fill, draw_color, stroke_width)}</g>'
+    )
+    return "".join(parts)
+
+
+def grid_svg(shapes, colors, variant, selections, columns=COLUMNS):
+    """Das ganze Raster als SVG; ausgewählte Symbole mit Hervorhebung und Position"""
+    width, height = grid_size(len(shapes), columns)
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="100%">']
+    for i, (shape, color) in enumerate(zip(shapes, colors)):
+        x = (i % columns) * CELL
+        y = (i // columns) * ROW_HEIGHT
+        selected = shape in selections
+        css = "cell selected" if selected else "cell"
+        parts.append(f'<g class="{css}" transform="translate({x},{y})">{_cell_svg(shape, color, variant, selected)}</g>')
+        if selected:
+            parts.append(
+                f'<text x="{x + CELL / 2}" y="{y + CELL + 17}" text-anchor="middle" font-size="14" '
+                f'font-weight="bold" fill="{BADGE_COLOR}">✓ Position {selections.index(shape) + 1}</text>'
+            )
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def symbol_grid(shapes, colors, variant, selections, trial_id, key=None, timing=None):
+    """Zeigt das Raster an und gibt den Index des angeklickten Symbols zurück.
+
+    Jeder Klick wird genau einmal geliefert; Klicks aus einem früheren
+    Durchgang (anderer trial_id) werden ignoriert. Ist timing ein Dict
+    (memory_engine.client_timing), kommen die Browser-Zeitstempel des
+    Klicks dort hinein.
+    """
+    event = _symbol_grid(
+        svg=grid_svg(tuple(shapes), tuple(colors), variant, list(selections)),
+        trial_id=trial_id,
+        key=key,
+        default=None,
+    )
+    if not event or event.get('trial') != trial_id:
+        return None
+
+    # der Komponentenwert bleibt über Reruns stehen: nur neue Klicks auswerten
+    handled = st.session_state.setdefault("symbol_grid_clicks", {})
+    last_trial, last_click = handled.get(key, (None, 0))
+    if last_trial == trial_id and event['click'] <= last_click:
+        return None
+    handled[key] = (trial_id, event['click'])
+    index = index_at(event['x'], event['y'], len(shapes))
+    if index is not None and timing is not None:
+        memory_engine.record_click(timing, event.get('onset_ms'), event.get('t_ms'))
+    return index
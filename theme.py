@@ -0,0 +1,116 @@
+# theme.py
+"""Stylesheets der Apps als statische Datei.
+
+HIFLE.main() und STESTsd.main() haben bisher bei jedem Rerun den kompletten
+<style>-Block (mehrere Kilobyte) per st.markdown geschickt. Jetzt wird das CSS
+beim ersten Aufruf im Prozess einmal minifiziert und nach static/<name>.css
+geschrieben (server.enableStaticServing, wie beim Sprite-Atlas). Pro Rerun
+geht nur noch ein <link> mit Versionsparameter raus; die Datei selbst lädt der
+Browser einmal pro Sitzung und nimmt danach seinen Cache.
+
+Den <link> selbst muss jeder Rerun weiterhin ausgeben: Streamlit entfernt
+Elemente, die beim nächsten Lauf fehlen, und damit auch das Stylesheet.
+
+Lässt sich static/ nicht beschreiben, wird das minifizierte CSS inline gesendet.
+
+    python theme.py      # Stylesheets vorab schreiben und Einsparung ausgeben
+"""
+import hashlib
+import os
+import re
+import threading
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "app/static"
+
+_compiled = {}
+_lock = threading.Lock()
+
+_STYLE_TAGS = re.compile(r"</?style>")
+_COMMENTS = re.compile(r"/\*.*?\*/", re.S)
+_WHITESPACE = re.compile(r"\s+")
+_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+_COLON = re.compile(r"\s*:\s+")
+
+
+def minify(css):
+    """Entfernt <style>-Tags, Kommentare und überflüssige Leerzeichen"""
+    css = _STYLE_TAGS.sub("", css)
+    css = _COMMENTS.sub("", css)
+    css = _WHITESPACE.sub(" ", css)
+    css = _PUNCTUATION.sub(r"\1", css)
+    # nur Leerzeichen nach dem Doppelpunkt ("color: red"), "a :hover" bleibt unverändert
+    css = _COLON.sub(":", css)
+    return css.replace(";}", "}").strip()
+
+
+def compile_stylesheet(name, css, static_dir=STATIC_DIR):
+    """Minifiziert css und schreibt es nach static_dir/<name>.css (einmal je Prozess und Inhalt)"""
+    with _lock:
+        compiled = _compiled.get(name)
+        if compiled is not None and compiled["source"] == css:
+            return compiled
+
+        minified = minify(css)
+        version = hashlib.sha1(minified.encode("utf-8")).hexdigest()[:12]
+        filename = f"{name.lower()}.css"
+        path = os.path.join(static_dir, filename)
+        try:
+            os.makedirs(static_dir, exist_ok=True)
+            current = None
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    current = f.read()
+            if current != minified:
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(minified)
+                os.replace(tmp_path, path)
+            tag = f'<link rel="stylesheet" href="{STATIC_URL}/{filename}?v={version}">'
+        except OSError:
+            path = None
+            tag = f"<style>{minified}</style>"
+
+        compiled = {
+            "source": css,
+            "version": version,
+            "path": path,
+            "tag": tag,
+            "inline_bytes": len(css.encode("utf-8")),
+            "minified_bytes": len(minified.encode("utf-8")),
+            "tag_bytes": len(tag.encode("utf-8")),
+        }
+        _compiled[name] = compiled
+        return compiled
+
+
+def stylesheet_tag(name, css):
+    """Markup für st.markdown: <link> auf die statische Datei (oder inline als Notlösung)"""
+    return compile_stylesheet(name, css)["tag"]
+
+
+def stylesheet_stats():
+    """Bytes je Rerun vorher (inline) und nachher (<link>) für alle kompilierten Stylesheets"""
+    with _lock:
+        return {
+            name: {
+                "inline_bytes": c["inline_bytes"],
+                "minified_bytes": c["minified_bytes"],
+                "tag_bytes": c["tag_bytes"],
+                "saved_per_rerun": c["inline_bytes"] - c["tag_bytes"],
+                "path": c["path"],
+            }
+            for name, c in _compiled.items()
+        }
+
+
+if __name__ == "__main__":
+    import HIFLE
+    import STESTsd
+
+    compile_stylesheet("HIFLE", HIFLE.APP_CSS)
+    compile_stylesheet("STESTsd", STESTsd.APP_CSS)
+    for name, stats in stylesheet_stats().items():
+        print(f"{name}: {stats['inline_bytes']} Bytes inline -> {stats['tag_bytes']} Bytes <link> "
+              f"({stats['saved_per_rerun']} Bytes je Rerun gespart), Datei {stats['path']} "
+              f"mit {stats['minified_bytes']} Bytes")
@@ -0,0 +1,132 @@
+# trial_events.py
+"""Ereignisprotokoll der Eingabephase.
+
+Bisher blieb von der Eingabe nur die Gesamtzeit je Test übrig. Jetzt wird
+jeder Klick mit Zeitpunkt festgehalten: Symbol wählen, "Auswahl
+zurücksetzen", "Test überspringen" und "Eingabe bestätigen". Die Position
+eines gewählten Symbols ergibt sich beim Dekodieren aus der Reihenfolge
+(Auswahl hängt an, Zurücksetzen leert).
+
+Im Klickpfad kostet ein Ereignis zwei Anhänge an vorab angelegte Spalten:
+
+    codes   bytearray, ein Byte je Ereignis: Art (obere 4 Bit) | Symbolindex (untere 4 Bit)
+    times   array('I'), Millisekunden seit Beginn der Eingabephase
+
+Erst beim Speichern macht encode() daraus eine kurze Zeichenkette
+"1:<codes base64>:<Zeitabstände als Varints, base64>", die als Feld
+"events" in den Testzeilen landet (JSONL, SQLite; in der Excel-Mappe als
+Spalte Test_<n>_Ereignisse). Ein Test mit sieben
+Klicks braucht so rund 30 Zeichen. decode() liefert die Ereignisse wieder
+als Dicts, inter_response_times() die Abstände zwischen den Auswahlen.
+"""
+import base64
+from array import array
+
+SELECT = 0
+RESET = 1
+SKIP = 2
+CONFIRM = 3
+KINDS = ["select", "reset", "skip", "confirm"]
+
+VERSION = "1"
+
+
+def new_log(start):
+    """Leeres Protokoll; start ist der Beginn der Eingabephase (clock.now())"""
+    return {"start": start, "codes": bytearray(), "times": array("I")}
+
+
+def start(logs, test_index, now):
+    """Legt das Protokoll für Test test_index in der Liste logs an"""
+    while len(logs) <= test_index:
+        logs.append(None)
+    logs[test_index] = new_log(now)
+    return logs[test_index]
+
+
+def record(log, kind, now, shape_index=0):
+    if log is None:
+        return
+    log["codes"].append(kind << 4 | shape_index)
+    log["times"].append(max(0, round((now - log["start"]) * 1000)))
+
+
+# -----------------------
+# Kodierung
+# -----------------------
+def _varints(values):
+    out = bytearray()
+    for value in values:
+        while value >= 0x80:
+            out.append(value & 0x7F | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def _read_varints(data):
+    values, value, shift = [], 0, 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value, shift = 0, 0
+    return values
+
+
+def encode(log):
+    """Kompakte Zeichenkette eines Protokolls; None ohne Protokoll"""
+    if log is None:
+        return None
+    deltas, previous = [], 0
+    for t in log["times"]:
+        deltas.append(t - previous)
+        previous = t
+    return ":".join((
+        VERSION,
+        base64.b64encode(bytes(log["codes"])).decode("ascii"),
+        base64.b64encode(_varints(deltas)).decode("ascii"),
+    ))
+
+
+def encode_all(logs):
+    """Eine Zeichenkette je Test, in der Form, die result_store.trial_rows erwartet"""
+    return [encode(log) for log in logs]
+
+
+def decode(encoded, shapes=None):
+    """Ereignisse als Dicts (kind, shape, position, t_ms); shapes übersetzt den Index in den Namen"""
+    if not encoded:
+        return []
+    version, codes, deltas = encoded.split(":")
+    if version != VERSION:
+        raise ValueError(f"Unbekannte Version des Ereignisprotokolls: {version}")
+    codes = base64.b64decode(codes)
+    deltas = _read_varints(base64.b64decode(deltas))
+
+    events, t, selected = [], 0, 0
+    for code, delta in zip(codes, deltas):
+        t += delta
+        kind, shape = code >> 4, code & 0x0F
+        event = {"kind": KINDS[kind], "t_ms": t}
+        if kind == SELECT:
+            selected += 1
+            event["shape"] = shapes[shape] if shapes is not None else shape
+            event["position"] = selected
+        elif kind == RESET:
+            selected = 0
+        events.append(event)
+    return events
+
+
+def inter_response_times(events):
+    """Sekunden bis zu jeder Auswahl, gemessen ab Beginn der Eingabe bzw. der vorigen Auswahl oder Zurücksetzung"""
+    times, previous = [], 0
+    for event in events:
+        if event["kind"] == "select":
+            times.append(round((event["t_ms"] - previous) / 1000, 3))
+        if event["kind"] in ("select", "reset"):
+            previous = event["t_ms"]
+    return times
@@ -0,0 +1,301 @@
+# trial_plans.py
+"""Vorab erzeugte, positionsbalancierte Testpläne.
+
+start_test() hat bisher für jeden Test unabhängig random.sample(SHAPES, size)
+gezogen. Dadurch stand manches Symbol viel öfter an Position 1 als ein
+anderes, und für Auswertungen je Symbol und Position brauchte es deutlich
+mehr Teilnehmende. Jetzt bekommt jede Teilnahme beim Start einen fertigen
+Plan mit den Sequenzen aller TEST_SIZES.
+
+Die Pläne werden stapelweise erzeugt, je Testgröße aus lateinischen
+Quadraten der Ordnung len(SHAPES): Zeile r, Spalte c enthält das Symbol
+sigma[(rho[r] + gamma[c]) % n] mit zufälligen Permutationen sigma (Symbole),
+rho (Zeilen) und gamma (Spalten). Die ersten size Spalten sind die
+Positionen des Tests. In jedem Quadrat steht jedes Symbol genau einmal an
+jeder Position, und innerhalb einer Zeile kommt kein Symbol doppelt vor.
+Je len(SHAPES) aufeinanderfolgende Pläne sind damit für jede Testgröße
+exakt ausgeglichen. Weil jedes Quadrat neu gemischt wird, wechseln die
+Nachbarschaften der Symbole von Quadrat zu Quadrat.
+
+Ein Plan sind die Symbolindizes aller Tests hintereinander, ein Byte je
+Symbol (bei TEST_SIZES 3..7 also 25 Bytes). Ein Stapel von BATCH_PLANS
+Plänen liegt als ein BLOB in einer SQLite-Datenbank (MEMORYTEST_PLANS_DB)
+und wird im Prozess zwischengespeichert. Die Vergabe erhöht nur einen
+Zähler in einer BEGIN IMMEDIATE-Transaktion und schneidet den Plan aus dem
+Stapel; erst wenn ein Stapel aufgebraucht ist, wird der nächste erzeugt.
+Wiederholte Aufrufe derselben Session (session_checkpoint.session_token())
+bekommen denselben Plan. Jeder Neustart im selben Tab ("Neuen Test starten",
+"Zurück zum Start") ruft session_checkpoint.reset() auf und holt damit den
+nächsten Plan. Die Teilnehmer-ID ist dafür nicht eindeutig genug:
+Zwei Personen mit demselben Pseudonym bekämen sonst dieselbe Zeile eines
+Quadrats. Sie wird mitgespeichert; über sie lässt sich der Plan und damit
+jede gezeigte Sequenz für die Auswertung wiederherstellen (plans_for()).
+
+Mit MEMORYTEST_PLANS=0, oder wenn die Datenbank nicht erreichbar ist, wird
+wie früher je Test gelost.
+
+    python trial_plans.py generate 10000   # Pläne vorab erzeugen
+    python trial_plans.py                  # Häufigkeiten je Symbol und Position
+"""
+import os
+import random
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+import memory_engine
+
+PLANS = os.environ.get("MEMORYTEST_PLANS", "1") == "1"  # vorab erzeugte Testpläne verwenden
+PLANS_DB = os.environ.get("MEMORYTEST_PLANS_DB", "memorytest_plans.db")
+BATCH_SQUARES = 256  # lateinische Quadrate je Stapel; BATCH_SQUARES * len(SHAPES) Pläne
+
+PLANS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    layout TEXT NOT NULL,
+    batch  INTEGER NOT NULL,
+    plans  BLOB NOT NULL,
+    PRIMARY KEY (layout, batch)
+);
+CREATE TABLE IF NOT EXISTS cursors (
+    layout TEXT PRIMARY KEY,
+    next   INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS handouts (
+    session     TEXT NOT NULL,
+    layout      TEXT NOT NULL,
+    participant TEXT,
+    plan        INTEGER NOT NULL,
+    assigned    TEXT NOT NULL,
+    PRIMARY KEY (session, layout)
+);
+CREATE INDEX IF NOT EXISTS handouts_participant ON handouts (participant);
+"""
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def layout(test_sizes=memory_engine.TEST_SIZES, n_shapes=len(memory_engine.SHAPES)):
+    """Kennung des Planformats; ändern sich TEST_SIZES oder SHAPES, gibt es neue Stapel"""
+    return ",".join(str(size) for size in test_sizes) + f"/{n_shapes}"
+
+
+def generate_plans(squares, test_sizes=memory_engine.TEST_SIZES, n_shapes=len(memory_engine.SHAPES), rng=random):
+    """squares * n_shapes Pläne als bytes, je Plan sum(test_sizes) Symbolindizes"""
+    plan_len = sum(test_sizes)
+    out = bytearray(squares * n_shapes * plan_len)
+    symbols = list(range(n_shapes))
+    for square in range(squares):
+        base = square * n_shapes
+        offset = 0
+        for size in test_sizes:
+            sigma = rng.sample(symbols, n_shapes)
+            rho = rng.sample(symbols, n_shapes)
+            gamma = rng.sample(symbols, size)
+            for r in range(n_shapes):
+                pos = (base + r) * plan_len + offset
+                out[pos:pos + size] = bytes(sigma[(rho[r] + g) % n_shapes] for g in gamma)
+            offset += size
+    return bytes(out)
+
+
+def sequence(plan, index, test_sizes=memory_engine.TEST_SIZES, shapes=memory_engine.SHAPES):
+    """Symbole des Tests index aus dem Plan; ohne Plan wie bisher zufällig gezogen"""
+    size = test_sizes[index]
+    if plan is None:
+        return memory_engine.generate_sequence(size, shapes)
+    start = sum(test_sizes[:index])
+    return [shapes[i] for i in plan[start:start + size]]
+
+
+def position_counts(plans, test_sizes=memory_engine.TEST_SIZES, n_shapes=len(memory_engine.SHAPES)):
+    """{Testgröße: counts[Position][Symbolindex]} über alle Pläne (bytes oder Liste von Plänen)"""
+    plan_len = sum(test_sizes)
+    if not isinstance(plans, (bytes, bytearray)):
+        plans = b"".join(plans)
+    result = {}
+    offset = 0
+    for size in test_sizes:
+        counts = [[0] * n_shapes for _ in range(size)]
+        for start in range(offset, len(plans), plan_len):
+            for position, symbol in enumerate(plans[start:start + size]):
+                counts[position][symbol] += 1
+        result[size] = counts
+        offset += size
+    return result
+
+
+class PlanStore:
+    """Stapel, Vergabezähler und vergebene Pläne in SQLite (WAL, eine Verbindung je Thread)"""
+
+    def __init__(self, path=PLANS_DB, test_sizes=memory_engine.TEST_SIZES,
+                 n_shapes=len(memory_engine.SHAPES), timeout=30.0):
+        self.path = path
+        self.test_sizes = list(test_sizes)
+        self.n_shapes = n_shapes
+        self.layout = layout(self.test_sizes, n_shapes)
+        self.plan_len = sum(self.test_sizes)
+        self.batch_plans = BATCH_SQUARES * n_shapes
+        self.timeout = timeout
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._batches = {}  # Stapelnummer -> bytes; Stapel ändern sich nach dem Schreiben nicht mehr
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            self._local.conn = conn
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self._migrate(conn)
+                    conn.executescript(PLANS_SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def _migrate(self, conn):
+        # frühere Datenbanken waren nach Teilnehmer-ID geschlüsselt; die Tabelle bleibt zur Auswertung erhalten
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(handouts)")}
+        if columns and "session" not in columns:
+            conn.execute("ALTER TABLE handouts RENAME TO handouts_by_participant")
+
+    def _ensure_batch(self, conn, batch, rng=random):
+        """Legt den Stapel an, falls er fehlt (innerhalb der laufenden Transaktion)"""
+        if batch in self._batches:
+            return
+        row = conn.execute(
+            "SELECT 1 FROM batches WHERE layout = ? AND batch = ?", (self.layout, batch)
+        ).fetchone()
+        if row is None:
+            conn.execute(
+                "INSERT INTO batches (layout, batch, plans) VALUES (?, ?, ?)",
+                (self.layout, batch, generate_plans(BATCH_SQUARES, self.test_sizes, self.n_shapes, rng)),
+            )
+
+    def _batch(self, batch):
+        data = self._batches.get(batch)
+        if data is None:
+            row = self._connection().execute(
+                "SELECT plans FROM batches WHERE layout = ? AND batch = ?", (self.layout, batch)
+            ).fetchone()
+            data = self._batches[batch] = bytes(row[0])
+        return data
+
+    def plan(self, plan_id):
+        """Plan plan_id als bytes"""
+        batch, slot = divmod(plan_id, self.batch_plans)
+        start = slot * self.plan_len
+        return self._batch(batch)[start:start + self.plan_len]
+
+    def assign(self, session_id, participant_id=None, rng=random):
+        """(plan_id, Plan) für die Session session_id; beim ersten Aufruf der nächste freie Plan"""
+        conn = self._connection()
+        # IMMEDIATE: Schreibsperre vor dem Lesen des Zählers, sonst vergeben zwei Prozesse denselben Plan
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = None
+            if session_id:
+                row = conn.execute(
+                    "SELECT plan FROM handouts WHERE session = ? AND layout = ?",
+                    (session_id, self.layout),
+                ).fetchone()
+            if row:
+                plan_id = row[0]
+            else:
+                row = conn.execute("SELECT next FROM cursors WHERE layout = ?", (self.layout,)).fetchone()
+                plan_id = row[0] if row else 0
+                self._ensure_batch(conn, plan_id // self.batch_plans, rng)
+                conn.execute(
+                    "INSERT OR REPLACE INTO cursors (layout, next) VALUES (?, ?)", (self.layout, plan_id + 1)
+                )
+                if session_id:
+                    conn.execute(
+                        "INSERT INTO handouts (session, layout, participant, plan, assigned) VALUES (?, ?, ?, ?, ?)",
+                        (session_id, self.layout, participant_id, plan_id,
+                         datetime.now().isoformat(timespec="seconds")),
+                    )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return plan_id, self.plan(plan_id)
+
+    def pregenerate(self, count, rng=random):
+        """Erzeugt Stapel, bis count Pläne ab dem Zählerstand bereitliegen; gibt die Zahl neuer Stapel zurück"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT next FROM cursors WHERE layout = ?", (self.layout,)).fetchone()
+            first = (row[0] if row else 0) // self.batch_plans
+            last = ((row[0] if row else 0) + max(count, 1) - 1) // self.batch_plans
+            existing = {batch for (batch,) in conn.execute(
+                "SELECT batch FROM batches WHERE layout = ?", (self.layout,))}
+            created = 0
+            for batch in range(first, last + 1):
+                if batch not in existing:
+                    self._ensure_batch(conn, batch, rng)
+                    created += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return created
+
+    def plans_for(self, participant_id):
+        """Vergebene Pläne zu einer Teilnehmer-ID (für die Auswertung), älteste zuerst.
+
+        Mehrere Einträge, wenn sich Personen ein Pseudonym teilen oder jemand neu gestartet hat.
+        """
+        rows = self._connection().execute(
+            "SELECT plan FROM handouts WHERE participant = ? AND layout = ? ORDER BY plan",
+            (participant_id, self.layout),
+        )
+        return [self.plan(plan_id) for (plan_id,) in rows]
+
+    def handed_out(self):
+        """Alle bisher vergebenen Pläne (auch ohne Teilnehmer-ID) als bytes"""
+        row = self._connection().execute("SELECT next FROM cursors WHERE layout = ?", (self.layout,)).fetchone()
+        return b"".join(self.plan(plan_id) for plan_id in range(row[0] if row else 0))
+
+
+def get_store(path=PLANS_DB):
+    """Prozessweiter Store je Datei"""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = PlanStore(path)
+            _stores[path] = store
+        return store
+
+
+def assign_plan(session_id, participant_id=None):
+    """Testplan für eine neue Teilnahme (bytes) oder None, dann wird je Test gelost; session_id siehe
+    session_checkpoint.session_token()"""
+    if not PLANS:
+        return None
+    try:
+        return get_store().assign(session_id, participant_id)[1]
+    except sqlite3.Error:
+        # ohne Datenbank lieber losen als die Studie anzuhalten
+        return None
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["generate"]:
+        store = get_store(args[2] if len(args) > 2 else PLANS_DB)
+        count = int(args[1]) if len(args) > 1 else store.batch_plans
+        print(f"{store.pregenerate(count)} neue Stapel mit je {store.batch_plans} Plänen ({store.layout})")
+    else:
+        store = get_store(args[0] if args else PLANS_DB)
+        plans = store.handed_out()
+        print(f"{len(plans) // store.plan_len} vergebene Pläne ({store.layout})")
+        for size, counts in position_counts(plans, store.test_sizes, store.n_shapes).items():
+            spread = [max(row) - min(row) for row in counts]
+            print(f"{size} Symbole: je Position min/max " + "  ".join(
+                f"{min(row)}/{max(row)}" for row in counts) + f"  (größte Abweichung {max(spread)})")
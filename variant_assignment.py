@@ -0,0 +1,207 @@
+# variant_assignment.py
+"""Ausgeglichene Zuteilung der Testvariante (farbig / schwarz-weiß).
+
+Bisher hat jede App mit random.choice(["color", "bw"]) gelost; die Gruppen
+FARBIG und FARBLOS liefen dadurch auseinander, und es brauchte zusätzliche
+Teilnehmende, bis beide Zellen voll waren. Jetzt wird blockweise randomisiert,
+getrennt nach Schicht (Altersband x Geschlecht): Jede Schicht arbeitet einen
+gemischten Block aus BLOCK_SIZE Plätzen ab (je zur Hälfte color und bw);
+ist er aufgebraucht, wird der nächste gemischt. Innerhalb jeder Schicht
+unterscheiden sich die Gruppen damit nie um mehr als BLOCK_SIZE / 2.
+
+Der Stand liegt in einer SQLite-Datenbank (MEMORYTEST_ASSIGNMENT_DB). Jede
+Zuteilung läuft in einer BEGIN IMMEDIATE-Transaktion, damit mehrere
+Serverprozesse oder Replikas mit derselben Datei keine Plätze doppelt
+vergeben. Die Zählerstände je Schicht und Variante stehen in einer eigenen
+Tabelle und lassen sich mit einem Primärschlüssel-Zugriff abfragen
+(counts()). Wiederholte Aufrufe derselben Session (session_checkpoint.
+session_token(), z.B. nach einem Reload vor dem ersten Checkpoint) bekommen
+ihre bisherige Variante. Die Teilnehmer-ID (Initialen der Eltern und
+Geburtsjahr) ist dafür nicht eindeutig genug: Zwei Personen mit demselben
+Pseudonym würden sonst eine Variante teilen, ohne einen Platz im Block zu
+verbrauchen. Sie wird nur mitgespeichert.
+
+Mit MEMORYTEST_ASSIGNMENT=random wird wie früher gelost; das passiert auch
+dann, wenn die Datenbank nicht erreichbar ist.
+
+    python variant_assignment.py      # Zählerstände je Schicht
+"""
+import os
+import random
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+VARIANTS = ["color", "bw"]
+BLOCK_SIZE = 4  # Plätze je Block, gleich viele je Variante
+AGE_BANDS = [25, 35, 50]  # Obergrenzen; darüber "51+"
+
+ASSIGNMENT = os.environ.get("MEMORYTEST_ASSIGNMENT", "balanced")  # "balanced" oder "random"
+ASSIGNMENT_DB = os.environ.get("MEMORYTEST_ASSIGNMENT_DB", "memorytest_assignment.db")
+
+ASSIGNMENT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assignments (
+    session     TEXT PRIMARY KEY,
+    participant TEXT,
+    stratum     TEXT NOT NULL,
+    variant     TEXT NOT NULL,
+    assigned    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    stratum  TEXT PRIMARY KEY,
+    block    TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counts (
+    stratum TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    n       INTEGER NOT NULL,
+    PRIMARY KEY (stratum, variant)
+);
+"""
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def age_band(age):
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return "?"
+    lower = 0
+    for upper in AGE_BANDS:
+        if age <= upper:
+            return f"bis {upper}" if lower == 0 else f"{lower}-{upper}"
+        lower = upper + 1
+    return f"{lower}+"
+
+
+def stratum(age, gender):
+    """Schicht aus Altersband und Geschlecht ("M", "W", "D"; "Männlich" usw. werden gekürzt)"""
+    gender = (gender or "?").strip()[:1].upper() or "?"
+    return f"{age_band(age)}|{gender}"
+
+
+def new_block(rng=random, block_size=BLOCK_SIZE):
+    block = [VARIANTS[i % len(VARIANTS)] for i in range(block_size)]
+    rng.shuffle(block)
+    return block
+
+
+class AssignmentStore:
+    """Zuteilungen, offene Blöcke und Zählerstände in SQLite (WAL, eine Verbindung je Thread)"""
+
+    def __init__(self, path=ASSIGNMENT_DB, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            self._local.conn = conn
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self._migrate(conn)
+                    conn.executescript(ASSIGNMENT_SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def _migrate(self, conn):
+        # frühere Datenbanken waren nach Teilnehmer-ID geschlüsselt; die Tabelle bleibt zur Auswertung erhalten
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(assignments)")}
+        if columns and "session" not in columns:
+            conn.execute("ALTER TABLE assignments RENAME TO assignments_by_participant")
+
+    def assign(self, session_id, participant_id, age, gender, rng=random):
+        """Variante für die Session session_id; beim ersten Aufruf aus dem Block der Schicht gezogen"""
+        conn = self._connection()
+        key = stratum(age, gender)
+        # IMMEDIATE: Schreibsperre vor dem Lesen des Blocks, sonst ziehen zwei Prozesse denselben Platz
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if session_id:
+                row = conn.execute(
+                    "SELECT variant FROM assignments WHERE session = ?", (session_id,)
+                ).fetchone()
+                if row:
+                    conn.execute("COMMIT")
+                    return row[0]
+
+            row = conn.execute("SELECT block, position FROM blocks WHERE stratum = ?", (key,)).fetchone()
+            if row is None or row[1] >= len(row[0].split(",")):
+                block, position = new_block(rng), 0
+            else:
+                block, position = row[0].split(","), row[1]
+            variant = block[position]
+
+            conn.execute(
+                "INSERT OR REPLACE INTO blocks (stratum, block, position) VALUES (?, ?, ?)",
+                (key, ",".join(block), position + 1),
+            )
+            conn.execute(
+                "INSERT INTO counts (stratum, variant, n) VALUES (?, ?, 1) "
+                "ON CONFLICT (stratum, variant) DO UPDATE SET n = n + 1",
+                (key, variant),
+            )
+            if session_id:
+                conn.execute(
+                    "INSERT INTO assignments (session, participant, stratum, variant, assigned) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, participant_id, key, variant, datetime.now().isoformat(timespec="seconds")),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return variant
+
+    def counts(self, stratum_key=None):
+        """{Variante: Anzahl} einer Schicht bzw. {Schicht: {Variante: Anzahl}} für alle"""
+        conn = self._connection()
+        if stratum_key is not None:
+            rows = conn.execute("SELECT variant, n FROM counts WHERE stratum = ?", (stratum_key,))
+            return {variant: n for variant, n in rows}
+        result = {}
+        for key, variant, n in conn.execute("SELECT stratum, variant, n FROM counts ORDER BY stratum"):
+            result.setdefault(key, {})[variant] = n
+        return result
+
+    def totals(self):
+        conn = self._connection()
+        return {variant: n for variant, n in conn.execute("SELECT variant, SUM(n) FROM counts GROUP BY variant")}
+
+
+def get_store(path=ASSIGNMENT_DB):
+    """Prozessweiter Store je Datei"""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = AssignmentStore(path)
+            _stores[path] = store
+        return store
+
+
+def assign_variant(session_id, participant_id, age, gender):
+    """Testvariante für eine neue Teilnahme ("color" oder "bw"); session_id siehe session_checkpoint.session_token()"""
+    if ASSIGNMENT == "random":
+        return random.choice(VARIANTS)
+    try:
+        return get_store().assign(session_id, participant_id, age, gender)
+    except sqlite3.Error:
+        # ohne Datenbank lieber losen als die Studie anzuhalten
+        return random.choice(VARIANTS)
+
+
+if __name__ == "__main__":
+    store = get_store(sys.argv[1] if len(sys.argv) > 1 else ASSIGNMENT_DB)
+    for key, counts in store.counts().items():
+        print(f"{key:<12} " + "  ".join(f"{variant}={counts.get(variant, 0)}" for variant in VARIANTS))
+    print("gesamt       " + "  ".join(f"{variant}={store.totals().get(variant, 0)}" for variant in VARIANTS))